@@ -12,37 +12,43 @@ Output: anes_cdf_abridged.csv
     The output file is a CSV containing only data on survey respondents from
     presidential election years 2000, 2004, 2008, and 2012. Certain features
     are also removed from the data, as documented below.
+
+The raw file is streamed in chunks, so memory use does not grow with the number of survey
+waves in the CDF. Row filters are applied to each chunk and the feature filter is decided from
+running non-null counts.
 """
 
-import pandas as pd
+from helpers.filtering import filter_csv
 
 ############################
 ### RESPONDENT FILTERING ###
 ############################
 
-# Read in full ANES CDF survey
-full_df = pd.read_csv('../data/anes_cdf_raw.csv', encoding = 'utf-8')
-    # full_df contains 55674 respondents and 953 features
-
-# Keep responses from presidential election years 2000 and later
-df = full_df[full_df.VCF0004 >= 2000]
-    # removes 42908 respondents, df shape: (12766, 953)
-df = df[df.VCF0004 != 2002]
-    # removes 1511 respondents, df shape: (11255, 953)
-
-# Drop all respondents for which no post-election interview data is present
-df = df[df.VCF0013.str.contains('1')]
-df = df.drop('VCF0013', axis = 1) 
-    # removes 1022 respondents and 1 feature, df shape: (10233, 952)
-
-# Drop all respondents with abbreviated pre-election interviews
-df = df[df.VCF0015a.str.startswith('0')]
-df = df.drop('VCF0015a', axis = 1)
-    # removes 836 repsondents and 1 feature, df shape: (9397, 951)
-    
-# Drop all respondents with no data on whether they voted
-df = df[~df.VCF0702.str.startswith('0')]
-    # removes 23 respondents, df shape: (9374, 951)
+# The full ANES CDF survey contains 55674 respondents and 953 features
+
+def keep_respondents(df):
+    # Keep responses from presidential election years 2000 and later
+    keep = df.VCF0004 >= 2000
+        # removes 42908 respondents, shape: (12766, 953)
+    keep &= df.VCF0004 != 2002
+        # removes 1511 respondents, shape: (11255, 953)
+
+    # Drop all respondents for which no post-election interview data is present
+    keep &= df.VCF0013.str.contains('1', na = False)
+        # removes 1022 respondents, shape: (10233, 953)
+
+    # Drop all respondents with abbreviated pre-election interviews
+    keep &= df.VCF0015a.str.startswith('0', na = False)
+        # removes 836 repsondents, shape: (9397, 953)
+
+    # Drop all respondents with no data on whether they voted
+    keep &= ~df.VCF0702.str.startswith('0', na = True)
+        # removes 23 respondents, shape: (9374, 953)
+    return keep
+
+# Columns used only to filter respondents
+filter_columns = ['VCF0013', 'VCF0015a']
+    # removes 2 features, shape: (9374, 951)
 
 #########################
 ### FEATURE FILTERING ###
@@ -54,9 +60,8 @@ df = df[~df.VCF0702.str.startswith('0')]
 # are the same for respondents interviewed in 2000 and later, we keep
 # only one set of full sample weights.
 
-columns = ['VCF0009x','VCF0009y','VCF0009z', 'VCF0010x','VCF0010y',
-                'VCF0010z','VCF0011x','VCF0011y']
-df = df.drop(columns, axis = 1)
+weight_columns = ['VCF0009x','VCF0009y','VCF0009z', 'VCF0010x','VCF0010y',
+                  'VCF0010z','VCF0011x','VCF0011y']
     # removes 8 features, df shape: (9374, 943)
     
 # The following features are dropped due to lack of relevance or
@@ -64,7 +69,6 @@ df = df.drop(columns, axis = 1)
 # Unnamed: 0 - Interviewee ID number
 # Version - Version release number
 # VCF0006 - Study respondent number
-# VCF0006a - Unique respondent number
 # VCF0012 - Form/interview type of paper questionnaire
 # VCF0012a - CAI Question selection (pre)
 # VCF0012b - CAI Question selection (post)
@@ -87,18 +91,21 @@ df = df.drop(columns, axis = 1)
 # VCF0103 - Cohort
 # VCF0106 - Race summary, 3-category
 # VCF0109 - Ethnicity (too any categories)
+# VCF0006a (unique respondent number) is kept as the key of the respondents, e.g. in the
+# prediction store of helpers.predictions
 
-columns = ['Unnamed: 0', 'Version','VCF0006','VCF0006a','VCF0012','VCF0012a',
-           'VCF0012b', 'VCF0015b','VCF0016','VCF0019','VCF0070a','VCF0070b',
-           'VCF0071a','VCF0071b','VCF0071c','VCF0071d','VCF0072a','VCF0072b',
-           'VCF0106','VCF0109','VCF0102','VCF0103','VCF0014','VCF0018a',
-           'VCF0018b','VCF0017']
-df = df.drop(columns, axis = 1)
-    # removes 22 features, df shape: (9397, 917)
-
-# Drop all features with substantial amounts of missing data
-df = df.loc[:, df.notnull().sum(axis = 0) >= 6000]
-    # removes 654 features, df shape: (9374, 263)
-
+irrelevant_columns = ['Unnamed: 0', 'Version','VCF0006','VCF0012','VCF0012a',
+                      'VCF0012b', 'VCF0015b','VCF0016','VCF0019','VCF0070a','VCF0070b',
+                      'VCF0071a','VCF0071b','VCF0071c','VCF0071d','VCF0072a','VCF0072b',
+                      'VCF0106','VCF0109','VCF0102','VCF0103','VCF0014','VCF0018a',
+                      'VCF0018b','VCF0017']
+    # removes 21 features, df shape: (9397, 918)
 
-df.to_csv('../data/anes_cdf_abridged.csv')
\ No newline at end of file
+# Drop all features with substantial amounts of missing data (fewer than 6000 responses)
+    # removes 654 features, df shape: (9374, 264)
+num_rows, columns = filter_csv('../data/anes_cdf_raw.csv', '../data/anes_cdf_abridged.csv',
+                               keep_respondents,
+                               filter_columns + weight_columns + irrelevant_columns,
+                               min_count = 6000,
+                               dtype = {'VCF0013': str, 'VCF0015a': str, 'VCF0702': str})
+print('Abridged data shape:', (num_rows, len(columns)))
\ No newline at end of file
@@ -11,227 +11,268 @@ OUTPUT:
 -   anes_cdf_converted.csv: A CSV with all features encoded as numerical values. Additionally,
     all feature are grouped by type (numerical, binary, ordinal, and categorical) for ease of
     mass data analysis later.
+-   encoding.pkl: The expanded encoding rules, the data-dependent encoding decisions and the
+    mean age, used by helpers.scoring to encode new respondents exactly like the survey data.
+-   encoding_report.json / encoding_report.html: Value counts before and after encoding, 'Don't
+    know' counts and added missing values of every feature (see helpers.verification). The
+    script stops before writing the encoded data if a response code is not expected by the
+    codebook. Codes a binary rule leaves outside 0 and 1 are listed as 'unmapped'.
 
-This module will build the output CSV by appending onto a new DataFrame rather than converting
-one in place.
+Every feature is encoded according to a rule in the table below. The output CSV is built from
+the abridged data in one pass by helpers.cleaning.encode rather than by appending one column
+at a time.
+
+With --jobs N, the rules are encoded in N worker processes, one block of columns of the same
+kind at a time, from a memory-mapped columnar copy of the abridged data (see
+helpers.cleaning.encode); the output is the same. The workers only pay off for large data:
+below helpers.cleaning.PARALLEL_MIN_ROWS respondents, which the abridged data of the CDF is,
+the rules are encoded serially anyway.
+
+Set ANES_TRACE to a path to record the time and memory of every step (see helpers.profiling).
 
 @author: derekzhao
 """
 
+import argparse
 import pandas as pd
 import numpy as np
-import re
+import pickle as pkl
 import helpers.cleaning as cln
+import helpers.columnar as col
+import helpers.profiling as prof
+import helpers.verification as ver
+from helpers.codebook import Codebook
 
-# Turn off verification plots for faster performance
-cln.print_verification = True
+parser = argparse.ArgumentParser(description = 'Encode the abridged ANES data.')
+parser.add_argument('--jobs', type = int, default = 1,
+                    help = 'number of worker processes encoding blocks of columns')
+args = parser.parse_args()
 
 # Read file. Due to unknown bug, '01 Data Filtering.py' may fail to remove column 'Unnamed: 0'.
-clean_df = pd.read_csv('../data/anes_cdf_abridged.csv')
+with prof.stage('read_abridged'):
+    if args.jobs == 1:
+        clean_df = pd.read_csv('../data/anes_cdf_abridged.csv')
+    else:
+        # The workers memory-map the columnar cache of the abridged data
+        clean_df = col.read_cached_csv('../data/anes_cdf_abridged.csv')
 if clean_df.columns[0] == 'Unnamed: 0':
     clean_df = clean_df.drop('Unnamed: 0', axis = 1)
     
-# Initialize new DataFrame for processed feature accumulation.
-final_df = pd.DataFrame()
-
-##################
-### BASIC INFO ###
-##################
-
-# Add basic information with new features names
-final_df['year'] = clean_df.VCF0004
-final_df['age'] = clean_df.VCF0101
-final_df.age = final_df.age.replace(0, final_df.age.mean()) # Replace ages of 0 with mean age
-final_df['congressional_district'] = clean_df.VCF0900c
-final_df['state'] = clean_df.VCF0901b      
-final_df['gender'] = clean_df.VCF0104.apply(lambda x: int(x[0])-1)
-final_df['weight'] = clean_df.VCF0011z
-final_df['final_vote'] = clean_df.VCF0704.apply(lambda x: int(x[0]))
-
-#######################
-### BINARY FEATURES ###
-#######################
-
-cln.convert_binary(final_df, clean_df, 'VCF0108', [2, 8, 9], [0, np.nan, np.nan])
-cln.convert_binary(final_df, clean_df, 'VCF0113', [2],[0])
-cln.convert_binary(final_df, clean_df, 'VCF0127', [2],[0])
-cln.convert_binary(final_df, clean_df, 'VCF0143', [8,9,5],[np.nan, np.nan, 0], fillna = '9')
-cln.convert_binary(final_df, clean_df, 'VCF0146', [8,9,2],[np.nan, np.nan, 0], 0, '9')
-cln.convert_binary(final_df, clean_df, 'VCF0311', [-1],[np.nan], -1, '0')
-cln.convert_binary_batch(final_df, clean_df, 'VCF0346', 'VCF0373', [0,2,8,9],
-                         [np.nan, 0, np.nan, np.nan], offset = 0, fillna = '9')
-cln.convert_binary_batch(final_df, clean_df, 'VCF0374', 'VCF0392', [0,5,8,9],
-                         [np.nan, 0, np.nan, np.nan], offset = 0, fillna = '9')
-cln.convert_binary_batch(final_df, clean_df, 'VCF0475', 'VCF0493', [0,5,8,9],
-                         [np.nan, 0, np.nan, np.nan], offset = 0, fillna = '9')
-cln.convert_binary(final_df, clean_df, 'VCF0450', [0,8,2],[np.nan,np.nan,0], 0, '8')
-cln.convert_binary(final_df, clean_df, 'VCF0501', [0,8,9,1,2],[np.nan,np.nan,np.nan,0,1], 0, '9')
-cln.convert_binary(final_df, clean_df, 'VCF0702', [0,1,2], [np.nan, 0, 1], 0, '0')
-cln.convert_binary(final_df, clean_df, 'VCF0704a', [2,0], [0,np.nan], 0, '0')
-cln.convert_binary(final_df, clean_df, 'VCF0707', [2,0], [0,np.nan], 0, '0')
-cln.convert_binary(final_df, clean_df, 'VCF0708', [2,0], [0,np.nan], 0, '0')
-cln.convert_binary_batch(final_df, clean_df, 'VCF0717', 'VCF0721', [-1],
-                         [np.nan], offset = -1, fillna = '0')
-cln.convert_binary(final_df, clean_df, 'VCF0724', [-1], [np.nan], -1, '0')
-cln.convert_binary(final_df, clean_df, 'VCF0729', [-1], [np.nan], -1, '0')
-cln.convert_binary(final_df, clean_df, 'VCF0731', [8,9,5],[np.nan, np.nan, 0], 0, '9')
-cln.convert_binary_batch(final_df, clean_df, 'VCF0740', 'VCF0742', [0,2], [np.nan,0],
-                         offset = 0, fillna = '0')
-cln.convert_binary(final_df, clean_df, 'VCF0846', [8,0,2],[np.nan, np.nan, 0], 0, '0')
-cln.convert_binary(final_df, clean_df, 'VCF0878', [0,8,9,5],[np.nan, np.nan, np.nan, 0], 0, '9')
-cln.convert_binary(final_df, clean_df, 'VCF0905', [1,2,9],[0,1,np.nan], 0, '9')
-cln.convert_binary(final_df, clean_df, 'VCF9021', [8,9,5],[np.nan, np.nan, 0], 0, '9')
-cln.convert_binary(final_df, clean_df, 'VCF9029', [8,9,3],[np.nan, np.nan, 0], 0, '9')
-cln.convert_binary_batch(final_df, clean_df, 'VCF9030a', 'VCF9031', [8,9,2,5],
-                         [np.nan,np.nan,0,0], offset = 0, fillna = '9')
-
-##########################
-### NUMERICAL FEATURES ###
-##########################
-
-cln.convert_numerical_batch(final_df, clean_df, 'VCF0204', 'VCF0291', scale = 10, fillna = 99)
-cln.convert_numerical_batch(final_df, clean_df, 'VCF0412', 'VCF0429', scale = 10, fillna = 99,
-                            correction = True)
-final_df.VCF0414 = final_df.VCF0414.replace(995.0, np.nan)
-cln.convert_numerical(final_df, clean_df, 'VCF0471', scale = 10, fillna = 99)
-cln.convert_numerical_batch(final_df, clean_df, 'VCF0906', 'VCF0909', scale = 10, fillna = 99)
-cln.convert_numerical(final_df, clean_df, 'VCF9005', scale = 10, fillna = 99)
-cln.convert_numerical_batch(final_df, clean_df, 'VCF9056', 'VCF9057', scale = 10, fillna = 99)
-cln.convert_numerical_batch(final_df, clean_df, 'VCF0648', 'VCF0656', scale = 10, fillna = 99)
-cln.convert_numerical(final_df, clean_df, 'VCF0801', scale = 10, fillna = 99)
-
-clean_df.VCF0138 = clean_df.VCF0138.fillna('0').apply(lambda x: int(x[0]))
-cln.convert_numerical(final_df, clean_df, 'VCF0138', scale = 1, fillna = 99)
-cln.convert_numerical(final_df, clean_df, 'VCF0723', scale = 1, fillna = 99)
-
-clean_df.VCF0733 = clean_df.VCF0733.fillna('0').apply(lambda x: int(x[0]))
-cln.convert_numerical(final_df, clean_df, 'VCF0733', scale = 1, fillna = 99)
-cln.convert_numerical(final_df, clean_df, 'VCF1015', scale = 1, fillna = 99)
-cln.convert_numerical(final_df, clean_df, 'VCF1016', scale = 1, fillna = 99)
-
-cln.add_range(final_df, clean_df.VCF0114, 'VCF0114')
-
-########################
-### ORDINAL FEATURES ###
-########################
-
-cln.convert_ordinal(final_df, clean_df, 'VCF0503', [8,0], np.nan, fillna = '0', dk = 8,
-                    offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0504', [8,0], np.nan, fillna = '0', dk = 8,
-                    offset = 0, parse_string = True)
-cln.convert_ordinal_batch(final_df, clean_df, 'VCF0513','VCF0550', [0,9,8], np.nan, fillna = 0,
-                          dk = 8, offset = 0, parse_string = False)
-cln.convert_ordinal(final_df, clean_df, 'VCF0803', [9,0], [4,np.nan], fillna = 0, dk = 9,
-                    offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0804', [8,9,0], np.nan, fillna = 0, dk = 9,
-                    offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0806', [8,9,0], np.nan, fillna = 0, dk = 9,
-                    offset = 0, parse_string = False)
-cln.convert_ordinal(final_df, clean_df, 'VCF0830', [8,9,0], np.nan, fillna = 0, dk = 9,
-                    offset = 0, parse_string = False)
-cln.convert_ordinal_batch(final_df, clean_df, 'VCF9081','VCF9087', [0,9,8], np.nan, fillna = 9,
-                          dk = 8, offset = 0, parse_string = False)
-cln.convert_ordinal_batch(final_df, clean_df, 'VCF9089','VCF9095', [0,9,8], np.nan, fillna = 9,
-                          dk = 8, offset = 0, parse_string = False)
-cln.convert_ordinal_batch(final_df, clean_df, 'VCF0886','VCF0894', [0,9,8], np.nan, fillna = '9',
-                          dk = 8, offset = 0, parse_string = True)
-cln.convert_ordinal_batch(final_df, clean_df, 'VCF9047','VCF9049', [0,9,8,7],
-                          [np.nan,np.nan,np.nan,3], fillna = '9', dk = 8, offset = 0,
-                          parse_string = True)
-cln.convert_ordinal_batch(final_df, clean_df, 'VCF0851','VCF0854', [8,9],
-                          np.nan, fillna = '9', dk = 8, offset = 0, parse_string = True)
-cln.convert_ordinal_batch(final_df, clean_df, 'VCF9013','VCF9018', [8,9],
-                          np.nan, fillna = '9', dk = 8, offset = 0, parse_string = True)
-cln.convert_ordinal_batch(final_df, clean_df, 'VCF9039','VCF9042', [8,9],
-                          np.nan, fillna = '9', dk = 8, offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0110', 0, np.nan, fillna = 0, dk = 8,
-                    offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0140a', [8,9], np.nan, fillna = 0, dk = 8,
-                    offset = 0, parse_string = True)
+# Table of encoding rules, one rule per feature or per group of consecutive features.
+rules = [
+    ##################
+    ### BASIC INFO ###
+    ##################
+    
+    # Add basic information with new features names
+    cln.copy_rule('VCF0004', 'year'),
+    cln.copy_rule('VCF0006a', 'respondent'),
+    cln.copy_rule('VCF0101', 'age'),
+    cln.copy_rule('VCF0900c', 'congressional_district'),
+    cln.copy_rule('VCF0901b', 'state'),
+    cln.binary_rule('VCF0104', None, None, offset = -1, fillna = None, name = 'gender'),
+    cln.copy_rule('VCF0011z', 'weight'),
+    cln.binary_rule('VCF0704', None, None, fillna = None, name = 'final_vote'),
+    
+    #######################
+    ### BINARY FEATURES ###
+    #######################
+    
+    cln.binary_rule('VCF0108', [2, 8, 9], [0, np.nan, np.nan]),
+    cln.binary_rule('VCF0113', [2],[0]),
+    cln.binary_rule('VCF0127', [2],[0]),
+    cln.binary_rule('VCF0143', [8,9,5],[np.nan, np.nan, 0], fillna = '9'),
+    cln.binary_rule('VCF0146', [8,9,2],[np.nan, np.nan, 0], 0, '9'),
+    cln.binary_rule('VCF0311', [-1],[np.nan], -1, '0'),
+    cln.binary_rule('VCF0346', [0,2,8,9], [np.nan, 0, np.nan, np.nan], offset = 0, fillna = '9',
+                    end_column = 'VCF0373'),
+    cln.binary_rule('VCF0374', [0,5,8,9], [np.nan, 0, np.nan, np.nan], offset = 0, fillna = '9',
+                    end_column = 'VCF0392'),
+    cln.binary_rule('VCF0475', [0,5,8,9], [np.nan, 0, np.nan, np.nan], offset = 0, fillna = '9',
+                    end_column = 'VCF0493'),
+    cln.binary_rule('VCF0450', [0,8,2],[np.nan,np.nan,0], 0, '8'),
+    cln.binary_rule('VCF0501', [0,8,9,1,2],[np.nan,np.nan,np.nan,0,1], 0, '9'),
+    cln.binary_rule('VCF0702', [0,1,2], [np.nan, 0, 1], 0, '0'),
+    cln.binary_rule('VCF0704a', [2,0], [0,np.nan], 0, '0'),
+    cln.binary_rule('VCF0707', [2,0], [0,np.nan], 0, '0'),
+    cln.binary_rule('VCF0708', [2,0], [0,np.nan], 0, '0'),
+    cln.binary_rule('VCF0717', [-1], [np.nan], offset = -1, fillna = '0', end_column = 'VCF0721'),
+    cln.binary_rule('VCF0724', [-1], [np.nan], -1, '0'),
+    cln.binary_rule('VCF0729', [-1], [np.nan], -1, '0'),
+    cln.binary_rule('VCF0731', [8,9,5],[np.nan, np.nan, 0], 0, '9'),
+    cln.binary_rule('VCF0740', [0,2], [np.nan,0], offset = 0, fillna = '0', end_column = 'VCF0742'),
+    cln.binary_rule('VCF0846', [8,0,2],[np.nan, np.nan, 0], 0, '0'),
+    cln.binary_rule('VCF0878', [0,8,9,5],[np.nan, np.nan, np.nan, 0], 0, '9'),
+    cln.binary_rule('VCF0905', [1,2,9],[0,1,np.nan], 0, '9'),
+    cln.binary_rule('VCF9021', [8,9,5],[np.nan, np.nan, 0], 0, '9'),
+    cln.binary_rule('VCF9029', [8,9,3],[np.nan, np.nan, 0], 0, '9'),
+    cln.binary_rule('VCF9030a', [8,9,2,5], [np.nan,np.nan,0,0], offset = 0, fillna = '9',
+                    end_column = 'VCF9031'),
+    
+    ##########################
+    ### NUMERICAL FEATURES ###
+    ##########################
+    
+    cln.numerical_rule('VCF0204', scale = 10, fillna = 99, end_column = 'VCF0291'),
+    cln.numerical_rule('VCF0412', scale = 10, fillna = 99, correction = True,
+                       end_column = 'VCF0413'),
+    cln.numerical_rule('VCF0414', scale = 10, fillna = 99, correction = True,
+                       replace_value = 995.0, replace_with = np.nan),
+    cln.numerical_rule('VCF0415', scale = 10, fillna = 99, correction = True,
+                       end_column = 'VCF0429'),
+    cln.numerical_rule('VCF0471', scale = 10, fillna = 99),
+    cln.numerical_rule('VCF0906', scale = 10, fillna = 99, end_column = 'VCF0909'),
+    cln.numerical_rule('VCF9005', scale = 10, fillna = 99),
+    cln.numerical_rule('VCF9056', scale = 10, fillna = 99, end_column = 'VCF9057'),
+    cln.numerical_rule('VCF0648', scale = 10, fillna = 99, end_column = 'VCF0656'),
+    cln.numerical_rule('VCF0801', scale = 10, fillna = 99),
+    
+    cln.numerical_rule('VCF0138', scale = 1, fillna = '0', parse_string = True),
+    cln.numerical_rule('VCF0723', scale = 1, fillna = 99),
+    
+    cln.numerical_rule('VCF0733', scale = 1, fillna = '0', parse_string = True),
+    cln.numerical_rule('VCF1015', scale = 1, fillna = 99),
+    cln.numerical_rule('VCF1016', scale = 1, fillna = 99),
+    
+    cln.range_rule('VCF0114'),
+    
+    ########################
+    ### ORDINAL FEATURES ###
+    ########################
+    
+    cln.ordinal_rule('VCF0503', [8,0], np.nan, fillna = '0', dk = 8, offset = 0,
+                     parse_string = True),
+    cln.ordinal_rule('VCF0504', [8,0], np.nan, fillna = '0', dk = 8, offset = 0,
+                     parse_string = True),
+    cln.ordinal_rule('VCF0513', [0,9,8], np.nan, fillna = 0, dk = 8, offset = 0,
+                     parse_string = False, end_column = 'VCF0550'),
+    cln.ordinal_rule('VCF0803', [9,0], [4,np.nan], fillna = 0, dk = 9, offset = 0,
+                     parse_string = True),
+    cln.ordinal_rule('VCF0804', [8,9,0], np.nan, fillna = 0, dk = 9, offset = 0,
+                     parse_string = True),
+    cln.ordinal_rule('VCF0806', [8,9,0], np.nan, fillna = 0, dk = 9, offset = 0,
+                     parse_string = False),
+    cln.ordinal_rule('VCF0830', [8,9,0], np.nan, fillna = 0, dk = 9, offset = 0,
+                     parse_string = False),
+    cln.ordinal_rule('VCF9081', [0,9,8], np.nan, fillna = 9, dk = 8, offset = 0,
+                     parse_string = False, end_column = 'VCF9087'),
+    cln.ordinal_rule('VCF9089', [0,9,8], np.nan, fillna = 9, dk = 8, offset = 0,
+                     parse_string = False, end_column = 'VCF9095'),
+    cln.ordinal_rule('VCF0886', [0,9,8], np.nan, fillna = '9', dk = 8, offset = 0,
+                     parse_string = True, end_column = 'VCF0894'),
+    cln.ordinal_rule('VCF9047', [0,9,8,7], [np.nan,np.nan,np.nan,3], fillna = '9', dk = 8,
+                     offset = 0, parse_string = True, end_column = 'VCF9049'),
+    cln.ordinal_rule('VCF0851', [8,9], np.nan, fillna = '9', dk = 8, offset = 0,
+                     parse_string = True, end_column = 'VCF0854'),
+    cln.ordinal_rule('VCF9013', [8,9], np.nan, fillna = '9', dk = 8, offset = 0,
+                     parse_string = True, end_column = 'VCF9018'),
+    cln.ordinal_rule('VCF9039', [8,9], np.nan, fillna = '9', dk = 8, offset = 0,
+                     parse_string = True, end_column = 'VCF9042'),
+    cln.ordinal_rule('VCF0110', 0, np.nan, fillna = 0, dk = 8, offset = 0, parse_string = True),
+    cln.ordinal_rule('VCF0140a', [8,9], np.nan, fillna = 0, dk = 8, offset = 0,
+                     parse_string = True),
+    
+    cln.ordinal_rule('VCF0127a', [0, 11, 12, 13, 21, 99, 22, 23, 31], [0, 3, 2, 1, 6, 0, 5, 4, 7],
+                     fillna = None, dk = None, pattern = r'(\d+)'),
+    
+    cln.ordinal_rule('VCF0130', [8,9,1,2,4,5], [np.nan,np.nan,5,4,2,1], fillna = 0, dk = 8,
+                     offset = 0, parse_string = True),
+    cln.ordinal_rule('VCF0148', 10, np.nan, fillna = '9', dk = 8, offset = 1, parse_string = True),
+    cln.ordinal_rule('VCF0301', 0, np.nan, fillna = 0, dk = 8, offset = 0, parse_string = True),
+    cln.ordinal_rule('VCF0303', 0, np.nan, fillna = 0, dk = 8, offset = 0, parse_string = True),
+    cln.ordinal_rule('VCF0305', 0, np.nan, fillna = 0, dk = 8, offset = 0, parse_string = True),
+    cln.ordinal_rule('VCF0310', [0,9], np.nan, fillna = 0, dk = 8, offset = 0,
+                     parse_string = True),
+    cln.ordinal_rule('VCF0451', [0,8,1,2,3,4], [np.nan,np.nan,4,3,2,1], fillna = '8', dk = 8,
+                     offset = 0, parse_string = True),
+    cln.ordinal_rule('VCF0502', [2,9,0],[3,2,np.nan], fillna = '0', dk = 8, offset = 0,
+                     parse_string = True),
+    cln.ordinal_rule('VCF0604', [0,9], np.nan, fillna = '0', dk = 8, offset = 0,
+                     parse_string = True),
+    cln.ordinal_rule('VCF0605', [0,9,2], [np.nan,2,3], fillna = '0', dk = 8, offset = 0,
+                     parse_string = True),
+    cln.ordinal_rule('VCF0606', [0,9], np.nan, fillna = '0', dk = 9, offset = 0,
+                     parse_string = True),
+    cln.ordinal_rule('VCF0624', [0,9], np.nan, fillna = '0', dk = 9, offset = 0,
+                     parse_string = True),
+    cln.ordinal_rule('VCF0703', 0, np.nan, fillna = '0', dk = 9, offset = 0, parse_string = True),
+    cln.ordinal_rule('VCF0838', [0,9], np.nan, fillna = '0', dk = 9, offset = 0,
+                     parse_string = True),
+    cln.ordinal_rule('VCF0847', [8,0,5], [np.nan,np.nan,0], fillna = '0', dk = 8, offset = 0,
+                     parse_string = True),
+    cln.ordinal_rule('VCF0850', [0,9], np.nan, fillna = '0', dk = 9, offset = 0,
+                     parse_string = True),
+    cln.ordinal_rule('VCF0867a', [4,5,7,8,9], [3,4,np.nan,np.nan,np.nan], fillna = '9', dk = 7,
+                     offset = 0, parse_string = True),
+    cln.ordinal_rule('VCF0870', [1,3,5,8,9,0], [1,2,3,np.nan,np.nan,np.nan], fillna = '9', dk = 8,
+                     offset = 0, parse_string = True),
+    cln.ordinal_rule('VCF0871', [8,9,0], np.nan, fillna = '9', dk = 0, offset = 0,
+                     parse_string = True),
+    cln.ordinal_rule('VCF0872', [1,3,5,8,9,0], [1,2,3,np.nan,np.nan,np.nan], fillna = '9', dk = 8,
+                     offset = 0, parse_string = True),
+    cln.ordinal_rule('VCF0879', [8,9,0], np.nan, fillna = '9', dk = 8, offset = 0,
+                     parse_string = True),
+    cln.ordinal_rule('VCF0880a', [8,9,0], np.nan, fillna = '9', dk = 8, offset = 0,
+                     parse_string = True),
+    cln.ordinal_rule('VCF0881', [8,9,0], np.nan, fillna = '9', dk = 9, offset = 0,
+                     parse_string = True),
+    cln.ordinal_rule('VCF9009', [9,8], [np.nan,3], fillna = '9', dk = 8, offset = 0,
+                     parse_string = True),
+    cln.ordinal_rule('VCF9032', [9,8,0,1,3,5], [np.nan,np.nan,1,4,3,2], fillna = '9', dk = 8,
+                     offset = 0, parse_string = True),
+    cln.ordinal_rule('VCF9045', [9,8,3,5], [np.nan,np.nan,2,3], fillna = '9', dk = 8, offset = 0,
+                     parse_string = True),
+    
+    ############################
+    ### CATEGORICAL FEATURES ###
+    ############################
+    
+    cln.onehot_rule('VCF0105a', 9, 0, fillna = '0'),
+    cln.onehot_rule('VCF0107', [7,8,9], [5,6,0], fillna = '0'),
+    cln.onehot_rule('VCF0112', None, None, fillna = '0'),
+    cln.onehot_rule('VCF0116', [4,5,6,7,8,9], [3,4,5,6,7,0], fillna = '0'),
+    cln.onehot_rule('VCF0128', None, None, fillna = '0'),
+    cln.onehot_rule('VCF0147', [9,8], [0,1], fillna = '0'),
+    cln.onehot_rule('VCF0149', [5,9,6], 0, fillna = '0'),
+    cln.onehot_rule('VCF0302', [8,9], 0, fillna = '0'),
+    cln.onehot_rule('VCF0704', None, None, fillna = '0'),
+    cln.onehot_rule('VCF0709', None, None, fillna = '0'),
+    cln.onehot_rule('VCF0710', None, None, fillna = '0'),
+    cln.onehot_rule('VCF0713', 9, 5, fillna = '0'),
+    cln.onehot_rule('VCF0714', 9, 0, fillna = '0'),
+    cln.onehot_rule('VCF0734', None, None, fillna = '0'),
+    cln.onehot_rule('VCF0736', [5,7], [2,3], fillna = '0'),
+    cln.onehot_rule('VCF0804', 9, 4, fillna = '0'),
+    cln.onehot_rule('VCF0823', 9, 3, fillna = '0'),
+    cln.onehot_rule('VCF0904', [9,0], [0,3], fillna = '0'),
+    cln.onehot_rule('VCF1004', 9, 0, fillna = '0'),
+    cln.onehot_rule('VCF9030', [6,8], 7, fillna = '0'),
+    cln.onehot_rule('VCF9131', [8,9], [3,0], fillna = '0'),
+    cln.onehot_rule('VCF9132', [8,9], [3,0], fillna = '0'),
+    cln.onehot_rule('VCF9133', [8,9], [3,0], fillna = '0'),
+]
 
-column = clean_df.VCF0127a.apply(lambda x: int(re.search(r'(\d+)',x).group(1)))
-column = column.replace([0, 11, 12, 13, 21, 99, 22, 23, 31], [0, 3, 2, 1, 6, 0, 5, 4, 7])
-final_df['VCF0127a'] = column
+final_df = cln.encode(clean_df, rules, n_jobs = args.jobs,
+                      source = col.cache_path('../data/anes_cdf_abridged.csv')
+                      if args.jobs != 1 else None)
 
-cln.convert_ordinal(final_df, clean_df, 'VCF0130', [8,9,1,2,4,5], [np.nan,np.nan,5,4,2,1],
-                    fillna = 0, dk = 8, offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0148', 10, np.nan, fillna = '9', dk = 8,
-                    offset = 1, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0301', 0, np.nan, fillna = 0, dk = 8,
-                    offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0303', 0, np.nan, fillna = 0, dk = 8,
-                    offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0305', 0, np.nan, fillna = 0, dk = 8,
-                    offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0310', [0,9], np.nan, fillna = 0, dk = 8,
-                    offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0451', [0,8,1,2,3,4], [np.nan,np.nan,4,3,2,1], 
-                    fillna = '8', dk = 8, offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0502', [2,9,0],[3,2,np.nan], 
-                    fillna = '0', dk = 8, offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0604', [0,9], np.nan, 
-                    fillna = '0', dk = 8, offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0605', [0,9,2], [np.nan,2,3], 
-                    fillna = '0', dk = 8, offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0606', [0,9], np.nan, 
-                    fillna = '0', dk = 9, offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0624', [0,9], np.nan, 
-                    fillna = '0', dk = 9, offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0703', 0, np.nan, 
-                    fillna = '0', dk = 9, offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0838', [0,9], np.nan, 
-                    fillna = '0', dk = 9, offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0847', [8,0,5], [np.nan,np.nan,0], 
-                    fillna = '0', dk = 8, offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0850', [0,9], np.nan, 
-                    fillna = '0', dk = 9, offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0867a', [4,5,7,8,9], [3,4,np.nan,np.nan,np.nan], 
-                    fillna = '9', dk = 7, offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0870', [1,3,5,8,9,0], [1,2,3,np.nan,np.nan,np.nan], 
-                    fillna = '9', dk = 8, offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0871', [8,9,0], np.nan, 
-                    fillna = '9', dk = 0, offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0872', [1,3,5,8,9,0], [1,2,3,np.nan,np.nan,np.nan], 
-                    fillna = '9', dk = 8, offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0879', [8,9,0], np.nan, 
-                    fillna = '9', dk = 8, offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0880a', [8,9,0], np.nan, 
-                    fillna = '9', dk = 8, offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF0881', [8,9,0], np.nan, 
-                    fillna = '9', dk = 9, offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF9009', [9,8], [np.nan,3], 
-                    fillna = '9', dk = 8, offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF9032', [9,8,0,1,3,5], [np.nan,np.nan,1,4,3,2], 
-                    fillna = '9', dk = 8, offset = 0, parse_string = True)
-cln.convert_ordinal(final_df, clean_df, 'VCF9045', [9,8,3,5], [np.nan,np.nan,2,3], 
-                    fillna = '9', dk = 8, offset = 0, parse_string = True)
+# Verify the encoding before anything is written
+report = ver.verify_encoding(clean_df, final_df, rules, codebook = Codebook())
+ver.write_report(report, '../data/encoding_report.json')
+ver.write_report(report, '../data/encoding_report.html')
+ver.check_report(report)
 
-############################
-### CATEGORICAL FEATURES ###
-############################
+age_mean = final_df.age.mean()
+final_df.age = final_df.age.replace(0, age_mean) # Replace ages of 0 with mean age
 
-cln.add_onehot(final_df, clean_df, 'VCF0105a', 9, 0, fillna = '0')
-cln.add_onehot(final_df, clean_df, 'VCF0107', [7,8,9], [5,6,0], fillna = '0')
-cln.add_onehot(final_df, clean_df, 'VCF0112', None, None, fillna = '0')
-cln.add_onehot(final_df, clean_df, 'VCF0116', [4,5,6,7,8,9], [3,4,5,6,7,0], fillna = '0')
-cln.add_onehot(final_df, clean_df, 'VCF0128', None, None, fillna = '0')
-cln.add_onehot(final_df, clean_df, 'VCF0147', [9,8], [0,1], fillna = '0')
-cln.add_onehot(final_df, clean_df, 'VCF0149', [5,9,6], 0, fillna = '0')
-cln.add_onehot(final_df, clean_df, 'VCF0302', [8,9], 0, fillna = '0')
-cln.add_onehot(final_df, clean_df, 'VCF0704', None, None, fillna = '0')
-cln.add_onehot(final_df, clean_df, 'VCF0709', None, None, fillna = '0')
-cln.add_onehot(final_df, clean_df, 'VCF0710', None, None, fillna = '0')
-cln.add_onehot(final_df, clean_df, 'VCF0713', 9, 5, fillna = '0')
-cln.add_onehot(final_df, clean_df, 'VCF0714', 9, 0, fillna = '0')
-cln.add_onehot(final_df, clean_df, 'VCF0734', None, None, fillna = '0')
-cln.add_onehot(final_df, clean_df, 'VCF0736', [5,7], [2,3], fillna = '0')
-cln.add_onehot(final_df, clean_df, 'VCF0804', 9, 4, fillna = '0')
-cln.add_onehot(final_df, clean_df, 'VCF0823', 9, 3, fillna = '0')
-cln.add_onehot(final_df, clean_df, 'VCF0904', [9,0], [0,3], fillna = '9')
-cln.add_onehot(final_df, clean_df, 'VCF1004', 9, 0, fillna = '9')
-cln.add_onehot(final_df, clean_df, 'VCF9030', [6,8], 7, fillna = '9')
-cln.add_onehot(final_df, clean_df, 'VCF9131', [8,9], [3,0], fillna = '9')
-cln.add_onehot(final_df, clean_df, 'VCF9132', [8,9], [3,0], fillna = '9')
-cln.add_onehot(final_df, clean_df, 'VCF9133', [8,9], [3,0], fillna = '9')
+# Thermometers are multiples of 10 and are stored compactly in the columnar cache
+thermometers = [rule.column for rule in cln.expand_rules(clean_df, rules)
+                if rule.kind == 'numerical' and rule.scale == 10]
+col.to_cached_csv(final_df, '../data/anes_cdf_converted.csv', float32_columns = thermometers)
 
-final_df.to_csv('../data/anes_cdf_converted.csv')
+# Save what is needed to encode new respondents the same way (see helpers.scoring)
+encoding = {'rules': cln.expand_rules(clean_df, rules),
+            'schema': cln.encoding_schema(clean_df, rules),
+            'age_mean': age_mean}
+with open('../data/encoding.pkl', 'wb') as f:
+    pkl.dump(encoding, f)
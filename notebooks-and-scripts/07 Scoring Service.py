@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+INPUT
+-   scoring_model.pkl: A helpers.scoring.ScoringModel saved by the last cell of
+    '05a Model Tuning and Evaluation.ipynb'.
+-   Batches of raw ANES-coded respondents (columns as in anes_cdf_abridged.csv) in CSV, JSONL
+    or Arrow IPC stream format, read from stdin or from a local socket.
+
+OUTPUT:
+-   One JSON object per batch holding the non-voter probability of every respondent and the
+    weighted survey, model and expected vote shares (see helpers.scoring.vote_shares).
+
+The model is loaded once and kept in memory. In socket mode, the batches sent by concurrent
+clients are scored together by a helpers.scoring.MicroBatcher.
+
+Set ANES_TRACE to a path to record the encoding, feature and prediction time of every batch
+(see helpers.profiling); the trace is written when the service stops.
+
+Examples:
+    python "07 Scoring Service.py" --format jsonl < respondents.jsonl
+    python "07 Scoring Service.py" --socket /tmp/scoring.sock
+    python "07 Scoring Service.py" --port 8765 --format arrow
+"""
+
+import argparse
+import os
+import sys
+from helpers.scoring import ScoringModel, MicroBatcher, format_result, iter_batches, serve
+
+parser = argparse.ArgumentParser(description = 'Score batches of raw ANES respondents.')
+parser.add_argument('--model', default = '../data/scoring_model.pkl',
+                    help = 'path of the saved ScoringModel')
+parser.add_argument('--format', default = 'csv', choices = ['csv', 'jsonl', 'arrow'],
+                    help = 'format of the batches')
+parser.add_argument('--batch-size', type = int, default = 1000,
+                    help = 'number of respondents per batch read from stdin')
+parser.add_argument('--socket', help = 'serve on a Unix socket at this path')
+parser.add_argument('--port', type = int, help = 'serve on a TCP port of localhost')
+parser.add_argument('--max-delay', type = float, default = 0.005,
+                    help = 'longest time in seconds a socket batch waits for others')
+args = parser.parse_args()
+
+model = ScoringModel.load(args.model)
+
+if args.socket is None and args.port is None:
+    for batch in iter_batches(sys.stdin.buffer, args.format, args.batch_size):
+        sys.stdout.write(format_result(model.score(batch)) + '\n')
+        sys.stdout.flush()
+else:
+    batcher = MicroBatcher(model, max_rows = args.batch_size, max_delay = args.max_delay)
+    if args.socket is not None:
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        address = args.socket
+    else:
+        address = ('localhost', args.port)
+    try:
+        serve(batcher, address, args.format)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        batcher.close()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+INPUT
+-   anes_cdf_converted.csv: The result of '02 Data Cleaning.py'.
+
+OUTPUT:
+-   backtest_results.csv: One row per cutoff year and model (including the stacked ensemble)
+    with the test F1 score, ROC area and the turnout-adjusted vote shares; see
+    helpers.backtest.run_backtest.
+-   backtest_predictions.csv: The non-voter probability of every model for every respondent of
+    every cutoff year.
+
+Every cutoff year is a holdout: models are selected, tuned and fitted on the years before it
+and evaluated on it, as '04a'/'05a' (2012), 'z_04b'/'z_05b' (2008) and 'z_04c'/'z_05c' (2004)
+do by hand. All cutoffs run as parallel tasks sharing the per-year feature blocks, whose
+engineered features are learned from the years before the earliest cutoff, and the grid search
+scores are cached in '../data/tuning_cache'.
+
+With --incremental, the models are instead trained once on the years before the first cutoff
+and updated with the years up to every later cutoff as a new survey wave (see
+helpers.incremental), with the untuned parameters of helpers.incremental.MODELS and every
+feature. Every updated model is compared with the same model retrained from scratch, and the
+results file holds the comparison instead of the vote shares; no predictions are written.
+
+Examples:
+    python "08 Backtest.py"
+    python "08 Backtest.py" --cutoffs 2008 2012 --models lr bnb --jobs 4
+    python "08 Backtest.py" --incremental --results ../data/incremental_results.csv
+"""
+
+import argparse
+import helpers.backtest as bt
+import helpers.incremental as ic
+from helpers.columnar import read_cached_csv
+
+parser = argparse.ArgumentParser(description = 'Rolling-origin backtest of the turnout models.')
+parser.add_argument('--cutoffs', type = int, nargs = '+', default = [2004, 2008, 2012],
+                    help = 'test years; every model is trained on the years before each')
+parser.add_argument('--models', nargs = '+', default = [name for name, _, _, _ in bt.MODELS],
+                    choices = [name for name, _, _, _ in bt.MODELS],
+                    help = 'models to tune and stack')
+parser.add_argument('--all-features', action = 'store_true',
+                    help = 'skip feature selection and use every feature')
+parser.add_argument('--jobs', type = int, default = -1, help = 'number of worker processes')
+parser.add_argument('--incremental', action = 'store_true',
+                    help = 'update the models wave by wave instead of retraining them')
+parser.add_argument('--results', default = '../data/backtest_results.csv')
+parser.add_argument('--predictions', default = '../data/backtest_predictions.csv')
+args = parser.parse_args()
+
+df = read_cached_csv('../data/anes_cdf_converted.csv')
+blocks = bt.year_blocks(df, args.cutoffs)
+
+if args.incremental:
+    results = ic.incremental_backtest(blocks, args.cutoffs,
+                                      [model for model in ic.MODELS if model[0] in args.models])
+    results.to_csv(args.results, index = False)
+    print(results.to_string(index = False))
+else:
+    models = [model for model in bt.MODELS if model[0] in args.models]
+    results, predictions = bt.run_backtest(blocks, args.cutoffs, models,
+                                           select = not args.all_features, n_jobs = args.jobs)
+    results.to_csv(args.results, index = False)
+    predictions.to_csv(args.predictions)
+    print(results.loc[:, ['cutoff', 'model', 'threshold', 'f1', 'roc_auc'] +
+                      [column for column in results.columns if column.startswith('error_')]]
+          .to_string(index = False))
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+INPUT
+-   None: the data is synthetic (see helpers.synthetic), generated at every scale from the
+    codebook and the encoding rules of '02 Data Cleaning.py'.
+
+OUTPUT:
+-   benchmarks.jsonl: One record per benchmark and scale with the wall time in seconds, tagged
+    with the commit, whether the working tree had uncommitted changes and the library versions
+    (see helpers.benchmarks.Recorder). Records are appended, so the file holds the history of
+    every commit measured.
+
+At scale 1 the synthetic data has as many respondents as the real data: 55674 in the raw CDF
+and 9374 after filtering. The benchmarks are:
+-   filtering: '01 Data Filtering.py' run unchanged on a synthetic raw CSV in a temporary
+    directory
+-   encode: helpers.cleaning.encode with the rules of '02 Data Cleaning.py'
+-   encode_parallel: the same in --jobs worker processes, also below
+    helpers.cleaning.PARALLEL_MIN_ROWS respondents, where encode itself stays serial
+-   features: helpers.project.FeatureGenerator, fitted and applied
+-   weighted_correlation_matrix: pairwise weighted correlations of the numerical features
+-   normalizer: helpers.machine_learning.Normalizer, fitted and applied to the imputed features
+-   fit_predict_<model>: training on 2000-2008 and predicting 2012 with the default parameters
+    of each model of helpers.backtest.MODELS (SVC only up to --max-svm-scale, as its training
+    time grows quadratically)
+-   threshold_metrics: helpers.evaluation.threshold_metrics of the 2012 predictions, weighted
+
+The time to generate the data is not measured. After the run the timings are compared with
+the last earlier run of another commit.
+
+Examples:
+    python "09 Benchmarks.py"
+    python "09 Benchmarks.py" --scales 1 --benchmarks encode features --repeat 3
+    python "09 Benchmarks.py" --scales 1 10 --benchmarks encode encode_parallel --jobs 8
+"""
+
+import argparse
+import os
+import runpy
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.impute import SimpleImputer
+import helpers.backtest as bt
+import helpers.benchmarks as bm
+import helpers.cleaning as cln
+import helpers.evaluation as ev
+import helpers.synthetic as syn
+from helpers.codebook import Codebook
+from helpers.machine_learning import Normalizer
+from helpers.project import FeatureGenerator
+from helpers.weighted_stats import weighted_correlation_matrix
+
+BENCHMARKS = ['filtering', 'encode', 'encode_parallel', 'features', 'weighted_correlation_matrix',
+              'normalizer', 'fit_predict', 'threshold_metrics']
+
+parser = argparse.ArgumentParser(description = 'Benchmarks of the pipeline on synthetic data.')
+parser.add_argument('--scales', type = float, nargs = '+', default = [1, 10, 100],
+                    help = 'data sizes as multiples of the real data')
+parser.add_argument('--benchmarks', nargs = '+', default = BENCHMARKS, choices = BENCHMARKS)
+parser.add_argument('--repeat', type = int, default = 1,
+                    help = 'number of times each benchmark runs; the fastest run is recorded')
+parser.add_argument('--max-svm-scale', type = float, default = 1)
+parser.add_argument('--jobs', type = int, default = 4,
+                    help = 'number of worker processes of the encode_parallel benchmark')
+parser.add_argument('--seed', type = int, default = 0)
+parser.add_argument('--results', default = bm.RESULTS_PATH,
+                    help = "results file; 'none' to not record the timings")
+args = parser.parse_args()
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+codebook = Codebook()
+rules = bm.script_rules(os.path.join(script_dir, '02 Data Cleaning.py'))
+filtering = bm.script_filter(os.path.join(script_dir, '01 Data Filtering.py'))
+recorder = bm.Recorder(None if args.results == 'none' else args.results, repo = script_dir)
+selected = set(args.benchmarks)
+
+def benchmark_filtering(scale):
+    """
+    Runs '01 Data Filtering.py' in a temporary copy of the project layout, so that its relative
+    paths point to the synthetic raw CSV.
+    """
+    sandbox = tempfile.mkdtemp()
+    try:
+        os.mkdir(os.path.join(sandbox, 'data'))
+        os.mkdir(os.path.join(sandbox, 'scripts'))
+        num_rows = int(round(scale * syn.RAW_ROWS))
+        syn.write_csv(os.path.join(sandbox, 'data', 'anes_cdf_raw.csv'), num_rows,
+                      random_state = args.seed, codebook = codebook)
+        cwd = os.getcwd()
+        os.chdir(os.path.join(sandbox, 'scripts'))
+        try:
+            recorder.time('filtering', scale, lambda: runpy.run_path(
+                os.path.join(script_dir, '01 Data Filtering.py')), args.repeat, num_rows)
+        finally:
+            os.chdir(cwd)
+    finally:
+        shutil.rmtree(sandbox)
+
+def run_scale(scale):
+    if 'filtering' in selected:
+        benchmark_filtering(scale)
+    later = selected - {'filtering'}
+    if not later:
+        return
+
+    abridged = syn.abridged_frame(int(round(scale * syn.ABRIDGED_ROWS)), rules, filtering,
+                                  codebook, random_state = args.seed)
+    rows = len(abridged)
+    encoded = recorder.time('encode', scale, lambda: cln.encode(abridged, rules), args.repeat,
+                            rows, abridged.shape[1]) if 'encode' in later else \
+        cln.encode(abridged, rules)
+    if 'encode_parallel' in later:
+        # The parallel path is forced at every scale, to see where it overtakes the serial one
+        recorder.time('encode_parallel', scale,
+                      lambda: cln.encode(abridged, rules, n_jobs = args.jobs,
+                                         parallel_min_rows = 0),
+                      args.repeat, rows, abridged.shape[1])
+    del abridged
+    encoded.age = encoded.age.replace(0, encoded.age.mean())
+    encoded = encoded.drop(['congressional_district', 'state'], axis = 1)
+
+    generator = FeatureGenerator()
+    df = recorder.time('features', scale, lambda: generator.fit_transform(encoded),
+                       args.repeat, rows, encoded.shape[1]) if 'features' in later else \
+        generator.fit_transform(encoded)
+    del encoded
+
+    if 'weighted_correlation_matrix' in later:
+        numerical = df.loc[:, [column for column in df.columns
+                               if column not in ('year', 'weight', 'respondent', 'VCF0702')
+                               and df[column].nunique() > 2]]
+        recorder.time('weighted_correlation_matrix', scale,
+                      lambda: weighted_correlation_matrix(numerical, df.weight.fillna(1),
+                                                          pairwise = True),
+                      args.repeat, rows, numerical.shape[1])
+        del numerical
+
+    blocks = bt.year_blocks(df, [max(syn.ANALYSIS_YEARS)], features = None)
+    test_year = max(blocks)
+    X_train = pd.concat([block['X'] for year, block in blocks.items() if year < test_year])
+    y_train = np.concatenate([block['y'] for year, block in blocks.items() if year < test_year])
+    X_test, y_test, info = [blocks[test_year][key] for key in ['X', 'y', 'info']]
+    del df, blocks
+    imputer = SimpleImputer(strategy = 'median').fit(X_train)
+    X_train, X_test = imputer.transform(X_train), imputer.transform(X_test)
+    normalizer = Normalizer()
+    if 'normalizer' in later:
+        recorder.time('normalizer', scale, lambda: normalizer.fit_transform(X_train),
+                      args.repeat, X_train.shape[0], X_train.shape[1])
+    X_train, X_test = normalizer.fit_transform(X_train), normalizer.transform(X_test)
+
+    # Without the fit_predict benchmarks, only the predictions of the first model are needed
+    models = [model for model in bt.MODELS if model[0] != 'svm' or scale <= args.max_svm_scale] \
+        if 'fit_predict' in later else bt.MODELS[:1]
+    y_pred = None
+    for name, estimator, _, _ in models:
+        def fit_predict(estimator = estimator):
+            model = clone(estimator).fit(X_train, y_train)
+            return model.predict_proba(X_test)[:, 1]
+        if 'fit_predict' in later:
+            probabilities = recorder.time('fit_predict_' + name, scale, fit_predict,
+                                          args.repeat, X_train.shape[0], X_train.shape[1])
+        else:
+            probabilities = fit_predict()
+        if y_pred is None:
+            y_pred = probabilities
+
+    if 'threshold_metrics' in later:
+        recorder.time('threshold_metrics', scale,
+                      lambda: ev.threshold_metrics(y_test, y_pred, info.weight.to_numpy()),
+                      args.repeat, len(y_test))
+
+for scale in args.scales:
+    run_scale(scale)
+    print('Scale {:g} done.'.format(scale))
+
+print(bm.compare(bm.load_results(recorder.path), recorder.records).to_string())
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+INPUT
+-   anes_cdf_raw.csv and the files passed between the stages of helpers.pipeline.STAGES.
+
+OUTPUT:
+-   The outputs of every stage that is out of date, from anes_cdf_abridged.csv to the
+    predictions of the holdout years and the backtest results.
+-   pipeline_state.json: The fingerprint and output hashes of every stage after its last
+    successful run.
+-   pipeline_runs/: The log of every stage run and the executed copy of every notebook.
+
+Runs the scripts and notebooks from '01 Data Filtering.py' to '06 Additional Evaluation.ipynb',
+the 2008 and 2004 holdouts and the backtest cutoffs of '08 Backtest.py' without opening them.
+A stage runs only if its inputs, its code (including the helper modules it imports) or its
+parameters changed since its last successful run, or if its outputs are missing or were changed
+by hand. If a stage writes the same outputs as before, the stages reading them are not run
+again. Up to --jobs stages whose inputs are ready run at once, e.g. the feature selection and
+tuning notebooks of the three holdout years and the three backtest cutoffs. See
+helpers.pipeline. Notebooks are executed with nbconvert.
+
+Examples:
+    python "10 Pipeline.py"
+    python "10 Pipeline.py" --dry-run
+    python "10 Pipeline.py" tuning_2012 --jobs 2
+    python "10 Pipeline.py" --force cleaning
+"""
+
+import argparse
+import sys
+import helpers.pipeline as pl
+
+names = [stage.name for stage in pl.STAGES]
+parser = argparse.ArgumentParser(description = 'Run the out-of-date stages of the pipeline.')
+parser.add_argument('targets', nargs = '*', metavar = 'stage',
+                    help = 'stages to bring up to date with the stages they depend on '
+                           '(default: all): ' + ', '.join(names))
+parser.add_argument('--force', nargs = '+', default = [], choices = names, metavar = 'stage',
+                    help = 'stages to run even if they are up to date')
+parser.add_argument('--jobs', type = int, default = 3, help = 'number of stages run at once')
+parser.add_argument('--dry-run', action = 'store_true',
+                    help = 'only list the stages that are out of date')
+parser.add_argument('--list', action = 'store_true',
+                    help = 'list the stages with the stages they depend on')
+args = parser.parse_args()
+unknown = [name for name in args.targets if name not in names]
+if unknown:
+    parser.error('unknown stages: ' + ', '.join(unknown))
+
+if args.list:
+    for name, depends in pl.dependencies(pl.STAGES).items():
+        print('{}: {}'.format(name, ', '.join(depends) or '-'))
+    sys.exit()
+
+status = pl.run_pipeline(pl.STAGES, args.targets or None, args.force, args.jobs, args.dry_run)
+print(status.to_string())
+if status.status.isin(['failed', 'blocked']).any():
+    sys.exit(1)
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+These helper functions run the rolling-origin evaluation of the '04' and '05' notebooks (train
+on the election years before a cutoff, test on the cutoff year) for several cutoffs at once.
+The engineered features are learned from the years before the earliest cutoff, computed once
+and split into one block per survey year; the block of a year is reused by every cutoff that
+trains or tests on it. Feature selection runs in
+parallel over the cutoffs, the grid searches of every (cutoff, model) pair share one process
+pool, and the final ensembles are fitted in parallel, one task per cutoff. Adding a cutoff adds
+tasks to these pools rather than another copy of the notebooks.
+
+"""
+
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.ensemble import AdaBoostClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import roc_auc_score
+from sklearn.naive_bayes import BernoulliNB
+from sklearn.pipeline import Pipeline
+from sklearn.svm import SVC
+import helpers.evaluation as ev
+from helpers.machine_learning import Normalizer, SubsetStackingClassifier
+from helpers.profiling import profiled
+from helpers.project import FeatureGenerator
+from helpers.scoring import LABEL, LEAKAGE, PARTIES, vote_shares
+from helpers.selection import CorrelationPruner, FastRFECV
+from helpers.tuning import CACHE_DIR, CachedGridSearchCV, fit_searches
+
+# (name, estimator, parameter grid, number of folds) of the models of
+# '05a Model Tuning and Evaluation'
+MODELS = [('lr', LogisticRegression(solver = 'liblinear'),
+           {'penalty': ['l1', 'l2'], 'C': np.arange(0.05, 2.0, 0.05)}, 5),
+          ('ada', AdaBoostClassifier(),
+           {'n_estimators': np.arange(30, 110, 10), 'learning_rate': np.arange(0.5, 2.25, 0.25)},
+           5),
+          ('bnb', BernoulliNB(), {'alpha': np.arange(0, 2.1, 0.1)}, 5),
+          ('svm', SVC(probability = True), {'C': np.arange(1.5, 3.7, 0.2)}, 3)]
+
+def preprocessing():
+    """
+    Returns the imputation and normalization pipeline used by the notebooks.
+    """
+    return Pipeline([('imp', SimpleImputer(strategy = 'median')), ('scale', Normalizer())])
+
+@profiled
+def year_blocks(df, cutoffs, features = FeatureGenerator()):
+    """
+    Adds the engineered features to the encoded survey data once and splits the result by
+    survey year. The features are learned from the years before the earliest cutoff only, so
+    that no test year informs them and every cutoff can share the blocks.
+
+    INPUT:
+    - df: encoded survey data, as in '../data/anes_cdf_converted.csv'
+    - cutoffs: test years, e.g. [2004, 2008, 2012]
+    - features: FeatureGenerator (a clone is fitted), or None to add no features
+
+    OUTPUT:
+    - OrderedDict from year to a dict holding the feature DataFrame 'X' (without the label,
+      the year, the respondent number and the post-election columns of LEAKAGE), the labels
+      'y' (True for non-voters) and 'info', the weight and intended vote columns used by
+      vote_shares
+    """
+    df = df.drop(['Unnamed: 0', 'congressional_district', 'state'], axis = 1, errors = 'ignore')
+    leakage = df.columns.str.contains('|'.join(LEAKAGE))
+    X = df.loc[:, ~leakage].drop([LABEL, 'year', 'weight', 'respondent'], axis = 1,
+                                 errors = 'ignore')
+    if features is not None:
+        train = (df.year < min(cutoffs)).to_numpy()
+        if not train.any():
+            raise ValueError('No training data before cutoff {}.'.format(min(cutoffs)))
+        X = clone(features).fit(X.loc[train]).transform(X)
+    info = df.loc[:, ['weight'] + list(PARTIES.values())]
+    y = (df[LABEL] == 0).to_numpy()
+    blocks = OrderedDict()
+    for year in np.sort(df.year.unique()):
+        rows = (df.year == year).to_numpy()
+        blocks[int(year)] = {'X': X.loc[rows], 'y': y[rows], 'info': info.loc[rows]}
+    return blocks
+
+@profiled
+def select_features(X, y, threshold = 0.85, step = 5):
+    """
+    Selects features as '04a Feature Selection' does: drops the first one-hot column of every
+    categorical feature, removes correlated features and runs recursive feature elimination
+    with logistic regression. Returns the selected column names.
+    """
+    X = X.loc[:, ~X.columns.str.contains('oh0')]
+    X = X.loc[:, CorrelationPruner(threshold = threshold).fit(X, y).support_]
+    rfecv = FastRFECV(LogisticRegression(), step = step, cv = 3, scoring = 'f1',
+                      preprocessing = preprocessing(), n_jobs = 1).fit(X, y)
+    return list(X.columns[rfecv.support_])
+
+@profiled
+def run_backtest(blocks, cutoffs, models = MODELS, select = True, n_jobs = -1,
+                 cache_dir = CACHE_DIR):
+    """
+    Trains on the years before every cutoff and evaluates on the cutoff year.
+
+    INPUT:
+    - blocks: output of year_blocks
+    - cutoffs: list of test years, e.g. [2004, 2008, 2012]
+    - models: list of (name, estimator, param_grid, cv) tuples; every model is tuned with
+      CachedGridSearchCV (cached per name and cutoff) and the tuned models are stacked with
+      SubsetStackingClassifier
+    - select: whether to select features with select_features (otherwise all are used)
+    - n_jobs: number of worker processes
+    - cache_dir: directory of the grid search cache
+
+    OUTPUT:
+    - results: DataFrame with one row per cutoff and model ('stack' for the ensemble) holding
+      the threshold maximizing the F1 score on out-of-fold training predictions, the test F1
+      score, ROC area, accuracy, precision, recall and predicted non-voter share at that
+      threshold, the sizes of the training and test sets, the number of features, and the
+      survey, model and expected vote shares of every party (with the error of the expected
+      shares if the election result is in helpers.evaluation.ELECTION_RESULTS)
+    - predictions: DataFrame with one row per test respondent and cutoff holding the label
+      and the non-voter probability of every model, indexed like the survey data
+    """
+    cutoffs = list(cutoffs)
+    splits = OrderedDict((cutoff, _split(blocks, cutoff)) for cutoff in cutoffs)
+
+    # Feature selection, one task per cutoff
+    if select:
+        selected = Parallel(n_jobs = n_jobs)(
+            delayed(select_features)(X_train, y_train)
+            for X_train, y_train, _, _, _ in splits.values())
+    else:
+        selected = [list(split[0].columns) for split in splits.values()]
+    columns = OrderedDict(zip(cutoffs, selected))
+
+    # Grid searches of every (cutoff, model) pair in one process pool
+    searches = []
+    for cutoff, (X_train, y_train, _, _, _) in splits.items():
+        X_prep = preprocessing().fit_transform(X_train.loc[:, columns[cutoff]])
+        for name, estimator, param_grid, cv in models:
+            search = CachedGridSearchCV(estimator, param_grid, 'f1', cv = cv, name = name,
+                                        cutoff = cutoff, cache_dir = cache_dir, refit = False)
+            searches.append((search, X_prep, y_train))
+    fit_searches(searches, n_jobs = n_jobs)
+    tuned = OrderedDict((cutoff, []) for cutoff in cutoffs)
+    for (search, _, _), (cutoff, (name, estimator, _, _)) in \
+            zip(searches, [(cutoff, model) for cutoff in cutoffs for model in models]):
+        tuned[cutoff].append((name, clone(estimator).set_params(**search.best_params_), None))
+
+    # Final ensembles, one task per cutoff
+    outputs = Parallel(n_jobs = n_jobs)(
+        delayed(_fit_cutoff)(cutoff, tuned[cutoff], columns[cutoff], *splits[cutoff])
+        for cutoff in cutoffs)
+    results = pd.concat([output[0] for output in outputs], ignore_index = True)
+    predictions = pd.concat([output[1] for output in outputs])
+    return results, predictions
+
+def _split(blocks, cutoff):
+    train_years = [year for year in blocks if year < cutoff]
+    if not train_years or cutoff not in blocks:
+        raise ValueError('No training or test data for cutoff {}.'.format(cutoff))
+    X_train = pd.concat([blocks[year]['X'] for year in train_years])
+    y_train = np.concatenate([blocks[year]['y'] for year in train_years])
+    test = blocks[cutoff]
+    return X_train, y_train, test['X'], test['y'], test['info']
+
+@profiled
+def _fit_cutoff(cutoff, estimators, columns, X_train, y_train, X_test, y_test, info):
+    """
+    Fits the stacked ensemble of the tuned models of one cutoff and evaluates every model and
+    the ensemble on the test year.
+    """
+    X_train = X_train.loc[:, columns]
+    X_test = X_test.loc[:, columns]
+    stack = SubsetStackingClassifier(estimators, preprocessing = preprocessing(), n_jobs = 1)
+    stack.fit(X_train, y_train)
+
+    names = [name for name, _, _ in estimators] + ['stack']
+    oof = np.column_stack([stack.oof_probabilities_,
+                           stack.blender_.predict_proba(stack.oof_probabilities_)[:, 1]])
+    test = np.column_stack([stack.base_probabilities(X_test), stack.predict_proba(X_test)[:, 1]])
+
+    rows = []
+    for i, name in enumerate(names):
+        train_metrics = ev.threshold_metrics(y_train, oof[:, i])
+        threshold = train_metrics.f1.idxmax()
+        metrics = ev.evaluate(y_test, test[:, i], threshold)
+        row = OrderedDict([('cutoff', cutoff), ('model', name), ('threshold', threshold),
+                           ('f1', metrics.f1), ('roc_auc', _roc_auc(y_test, test[:, i])),
+                           ('accuracy', metrics.accuracy), ('precision', metrics.precision),
+                           ('recall', metrics.recall),
+                           ('predicted_share', metrics.predicted_share),
+                           ('n_train', len(y_train)), ('n_test', len(y_test)),
+                           ('n_features', len(columns))])
+        shares = vote_shares(info, test[:, i], threshold)
+        for party in shares.index:
+            for kind in shares.columns:
+                row['{}_{}'.format(kind, party)] = shares.loc[party, kind]
+        if cutoff in ev.ELECTION_RESULTS:
+            for party, result in zip(shares.index, ev.ELECTION_RESULTS[cutoff]):
+                row['error_' + party] = shares.loc[party, 'expected'] - result
+        rows.append(row)
+
+    predictions = pd.DataFrame(test, index = X_test.index, columns = names)
+    predictions.insert(0, 'non_voter', y_test)
+    predictions.insert(0, 'cutoff', cutoff)
+    return pd.DataFrame(rows), predictions
+
+def _roc_auc(y, y_pred):
+    return roc_auc_score(y, y_pred) if len(np.unique(y)) == 2 else np.nan
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+These helper functions time the stages of the pipeline and keep the timings of every commit in
+one JSON lines file, so that a change can be compared with the commits measured before it. See
+'09 Benchmarks.py', which runs the stages on data from helpers.synthetic.
+
+"""
+
+import ast
+import inspect
+import json
+import os
+import platform
+import subprocess
+import time
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import helpers.cleaning as cln
+from helpers.filtering import filter_csv
+
+RESULTS_PATH = '../data/benchmarks.jsonl'
+
+def script_rules(path):
+    """
+    Returns the encoding rules of a cleaning script, i.e. the list assigned to 'rules' in
+    '02 Data Cleaning.py', without running the rest of the script.
+    """
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and \
+                any(isinstance(target, ast.Name) and target.id == 'rules'
+                    for target in node.targets):
+            expression = ast.Expression(node.value)
+            return eval(compile(expression, path, 'eval'), {'cln': cln, 'np': np})
+    raise ValueError('No rules are assigned in {}.'.format(path))
+
+def script_filter(path):
+    """
+    Returns the arguments with which a filtering script, i.e. '01 Data Filtering.py', calls
+    helpers.filtering.filter_csv, apart from the file paths, without running the filter. The
+    statements before the call are run to define the row filter and the dropped columns.
+    """
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    namespace = {}
+    for node in tree.body:
+        call = getattr(node, 'value', None)
+        if isinstance(call, ast.Call) and isinstance(call.func, ast.Name) and \
+                call.func.id == 'filter_csv':
+            evaluate = lambda value: eval(compile(ast.Expression(value), path, 'eval'),
+                                          namespace)
+            arguments = inspect.signature(filter_csv).bind(
+                *[evaluate(value) for value in call.args],
+                **{keyword.arg: evaluate(keyword.value) for keyword in call.keywords})
+            arguments.apply_defaults()
+            return OrderedDict((name, value) for name, value in arguments.arguments.items()
+                               if name not in ('in_path', 'out_path'))
+        exec(compile(ast.Module([node], []), path, 'exec'), namespace)
+    raise ValueError('filter_csv is not called in {}.'.format(path))
+
+def git_revision(path = '.'):
+    """
+    Returns the commit checked out at path and whether the working tree has uncommitted
+    changes, or (None, None) outside of a git repository.
+    """
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd = path,
+                                         stderr = subprocess.DEVNULL).decode().strip()
+        status = subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                         cwd = path, stderr = subprocess.DEVNULL).decode()
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+def time_call(function, repeat = 1):
+    """
+    Calls function repeat times and returns the shortest wall time in seconds and the result of
+    the last call.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+class Recorder(object):
+    """
+    Collects the timings of one benchmark run and appends them to a JSON lines file, one record
+    per benchmark and scale tagged with the commit, the time of the run and the versions of
+    Python, NumPy and pandas.
+
+    INPUT:
+    - path: results file; None keeps the records in memory only
+    - repo: directory of the git repository whose commit is recorded
+    """
+
+    def __init__(self, path = RESULTS_PATH, repo = '.'):
+        self.path = path
+        self.commit, self.dirty = git_revision(repo)
+        self.run = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.records = []
+
+    def add(self, benchmark, scale, seconds, rows = None, columns = None, repeat = 1):
+        record = OrderedDict([('commit', self.commit), ('dirty', self.dirty), ('run', self.run),
+                              ('benchmark', benchmark), ('scale', scale),
+                              ('seconds', seconds), ('repeat', repeat),
+                              ('rows', rows), ('columns', columns),
+                              ('python', platform.python_version()),
+                              ('numpy', np.__version__), ('pandas', pd.__version__)])
+        self.records.append(record)
+        if self.path is not None:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        return record
+
+    def time(self, benchmark, scale, function, repeat = 1, rows = None, columns = None):
+        """
+        Times function with time_call, records the timing and returns the result of function.
+        """
+        seconds, result = time_call(function, repeat)
+        self.add(benchmark, scale, seconds, rows, columns, repeat)
+        return result
+
+def load_results(path = RESULTS_PATH):
+    """
+    Returns the records of a results file as a DataFrame (empty if path is None or the file
+    does not exist).
+    """
+    if path is None or not os.path.exists(path):
+        return pd.DataFrame(columns = ['commit', 'dirty', 'run', 'benchmark', 'scale',
+                                       'seconds'])
+    with open(path) as f:
+        return pd.DataFrame([json.loads(line) for line in f if line.strip()])
+
+def compare(results, records):
+    """
+    Compares the timings of a run with the most recent earlier run of another commit.
+
+    INPUT:
+    - results: DataFrame returned by load_results, possibly including records
+    - records: list of records of the current run, e.g. Recorder.records
+
+    OUTPUT:
+    - DataFrame indexed by benchmark and scale with the current seconds, the seconds and commit
+      of the previous run, and their ratio (above 1 for a slowdown)
+    """
+    current = pd.DataFrame(records)
+    if current.empty:
+        return pd.DataFrame()
+    current = current.groupby(['benchmark', 'scale']).seconds.min()
+    run, commit = records[0]['run'], records[0]['commit']
+    earlier = results.loc[(results.run < run) & (results.commit != commit)] \
+        if len(results) else results
+    out = pd.DataFrame({'seconds': current})
+    if len(earlier):
+        last = earlier.sort_values('run').groupby(['benchmark', 'scale']).last()
+        out['previous'] = last.seconds.reindex(out.index)
+        out['previous_commit'] = last.commit.reindex(out.index).str[:10]
+        out['ratio'] = out.seconds / out.previous
+    return out
@@ -4,27 +4,32 @@
 Created on Fri Mar 17 13:10:35 2017
 
 These helper functions assist in encoding various features into a format
-suitable for a machine learning algorithm.
+suitable for a machine learning algorithm. The encoded data is checked by
+helpers.verification.
 
 @author: derekzhao
 """
 
+import os
+import re
+import shutil
+import tempfile
 import numpy as np
 import pandas as pd
-import re
-import matplotlib.pyplot as plt
-
-print_verification = True
+from collections import namedtuple, OrderedDict
+from joblib import Parallel, delayed, effective_n_jobs
+import helpers.columnar as col
+from helpers.profiling import profiled
                
 #######################       
 ### BINARY ENCODING ###
 #######################
 
+@profiled
 def convert_binary(out_df, in_df, column_name, replace_value, replace_with, offset = 0,
                    fillna = '9'):
     """
-    Performs binary encoding on a column of in_df, appends the result to out_df, 
-    and generates console output for accuracy verification.
+    Performs binary encoding on a column of in_df and appends the result to out_df.
     
     INPUT:
     - out_df: DataFrame that the processed column will be appended to
@@ -38,13 +43,8 @@ def convert_binary(out_df, in_df, column_name, replace_value, replace_with, offs
     new_column = in_df[column_name].fillna(fillna).apply(lambda x: int(x[0]) + offset)
     new_column = new_column.replace(replace_value, replace_with)
     out_df[column_name] = new_column
-          
-    print('IN_DF:')
-    print(in_df[column_name].value_counts().sort_index())
-    print('OUT_DF:')
-    print(out_df[column_name].value_counts().sort_index())
-    print()
 
+@profiled
 def convert_binary_batch(out_df, in_df, start_column, end_column, replace_value, 
                          replace_with, offset = 0, fillna = '9'):
     """
@@ -65,11 +65,12 @@ def convert_binary_batch(out_df, in_df, start_column, end_column, replace_value,
 ### NUMERICAL ENCODING ###
 ##########################
 
+@profiled
 def convert_numerical(out_df, in_df, column_name, scale = 1, fillna = 99, correction = False):
     """
     Performs numerical encoding on a column of in_df and appends the result to out_df.
     If a column has greater than 10 'Don't know' responses, an additional binary encoded column
-    is generated. Plots are generated for accuracy verification.
+    is generated.
     
     INPUT:
     - out_df: DataFrame that the processed column will be appended to
@@ -83,25 +84,17 @@ def convert_numerical(out_df, in_df, column_name, scale = 1, fillna = 99, correc
     if max(new_column.dropna()) < 900 or correction:
         if sum(new_column == 98) >= 10:
             out_df[column_name+'_dk'] = new_column.apply(lambda x: x == 98)
-            print('# DK\'s:', sum(out_df[column_name+'_dk']))
         new_column = new_column.replace([98,99,98.0,99.0],np.nan)
     
     if max(new_column.dropna()) >= 900:
         if sum(new_column == 997) >= 10:
             out_df[column_name+'_dk'] = new_column.apply(lambda x: x == 997)
-            print('# DK\'s:', sum(out_df[column_name+'_dk']))
         new_column = new_column.replace(range(900,1000), np.nan)
         
     new_column = round(new_column / scale)
     out_df[column_name] = new_column
     
-    if print_verification:
-        fig, axes = plt.subplots(1, 2, figsize = (10, 3))
-        in_df[column_name].value_counts().sort_index().plot(kind = 'bar', ax = axes[0])
-        out_df[column_name].value_counts().sort_index().plot(kind = 'bar', ax = axes[1])
-        axes[0].set(title = 'IN_DF: ' + column_name)
-        axes[1].set(title = 'OUT_DF: ' + column_name)
-    
+@profiled
 def convert_numerical_batch(out_df, in_df, start_column, end_column, scale = 1, fillna = 99,
                             correction = False):
     """
@@ -121,11 +114,11 @@ def convert_numerical_batch(out_df, in_df, start_column, end_column, scale = 1,
 ### ORDINAL ENCODING ###
 ########################
     
+@profiled
 def convert_ordinal(out_df, in_df, column_name, replace_value, replace_with, fillna = 0, dk = 8,
                     offset = 0, parse_string = False):
     """
-    Performs ordinal encoding on a column of in_df, appends the result to out_df, 
-    and generates console output for accuracy verification.
+    Performs ordinal encoding on a column of in_df and appends the result to out_df.
     
     INPUT:
     - out_df: DataFrame that the processed column will be appended to
@@ -146,17 +139,10 @@ def convert_ordinal(out_df, in_df, column_name, replace_value, replace_with, fil
     dk_column = new_column == dk
     if sum(dk_column) >= 10:
         out_df[column_name + '_dk'] = dk_column
-        print('# DK\'s:', sum(out_df[column_name+'_dk']))
     new_column = new_column.replace(replace_value, replace_with)
     out_df[column_name] = new_column
     
-    if print_verification:
-        fig, axes = plt.subplots(1, 2, figsize = (10, 3))
-        in_df[column_name].value_counts().sort_index().plot(kind = 'bar', ax = axes[0])
-        out_df[column_name].value_counts().sort_index().plot(kind = 'bar', ax = axes[1])
-        axes[0].set(title = 'IN_DF: ' + column_name)
-        axes[1].set(title = 'OUT_DF: ' + column_name)
-    
+@profiled
 def convert_ordinal_batch(out_df, in_df, start_column, end_column, replace_value, replace_with, fillna = 0, dk = 8,
                     offset = 0, parse_string = False):
     """
@@ -177,6 +163,7 @@ def convert_ordinal_batch(out_df, in_df, start_column, end_column, replace_value
 ### CATEGORICAL ENCODING ###
 ############################
 
+@profiled
 def add_binary(out_df, in_df, column_name):  
     """
     Performs binary encoding on specified column and adds the resulting dataframe to out_df.
@@ -197,6 +184,7 @@ def add_binary(out_df, in_df, column_name):
         column_name = column_name + '_b' + str(i)
         out_df[column_name] = col1
                    
+@profiled
 def add_onehot(out_df, in_df, column_name, replace_value, replace_with, fillna = '0'):
     """
     Performs one-hot encoding on specified column and adds the resulting dataframe to out_df.
@@ -210,10 +198,6 @@ def add_onehot(out_df, in_df, column_name, replace_value, replace_with, fillna =
     - fillna: value to replace missing data
     """
     new_column = in_df[column_name]
-    
-    print('IN_DF:')
-    print(new_column.value_counts().sort_index())
-    
     new_column = new_column.fillna('0').apply(lambda x: int(x[0]))
     new_column = new_column.replace(replace_value, replace_with)
     numColumns = len(new_column.value_counts())
@@ -221,12 +205,11 @@ def add_onehot(out_df, in_df, column_name, replace_value, replace_with, fillna =
     dummies = pd.get_dummies(new_column)
     dummies.columns = [column_name + '_oh' + str(i) for i in range(0, numColumns)]
     
-    print('OUT_DF:')
     for each in dummies.columns:
         out_df[each] = dummies[each]
-        print(each + ':', sum(out_df[each]))
     
 
+@profiled
 def add_range(inDataFrame, inColumn, inColumnName):
     """
     Creates two columns that represent the lower and upper bounds of inColumn.
@@ -252,4 +235,386 @@ def add_range(inDataFrame, inColumn, inColumnName):
     inDataFrame[column2Name] = newColumn2
         
     
-    
\ No newline at end of file
+    
+
+##############################
+### DECLARATIVE ENCODING ###
+##############################
+
+# A rule describes how one column (or a range of consecutive columns) of the abridged data is
+# encoded. The fields mirror the arguments of the convert_* / add_* functions above:
+# - kind: 'copy', 'binary', 'numerical', 'ordinal', 'onehot' or 'range'
+# - column / end_column: first and (optional) last column of a consecutive group
+# - name: output column name, defaults to the input column name
+# - replace_value / replace_with: values substituted after parsing (simultaneously, as with
+#   Series.replace); numerical rules apply the substitution after scaling
+# - fillna: value used for missing data before parsing
+# - dk: 'Don't know' code; a '_dk' column is added when it occurs at least 10 times (None to skip)
+# - offset: added to every parsed response code
+# - scale / correction: see convert_numerical
+# - parse_string: parse the leading response code of string values ('1. Yes' -> 1)
+# - pattern: regular expression whose first group is parsed instead of the leading digit
+EncodingRule = namedtuple('EncodingRule', ['kind', 'column', 'end_column', 'name',
+                                           'replace_value', 'replace_with', 'fillna', 'dk',
+                                           'offset', 'scale', 'correction', 'parse_string',
+                                           'pattern'])
+EncodingRule.__new__.__defaults__ = (None, None, None, None, None, None, 0, 1, False, False, None)
+
+def copy_rule(column_name, name = None):
+    """
+    Copies a column of in_df unchanged, optionally under a new name.
+    """
+    return EncodingRule('copy', column_name, name = name)
+
+def binary_rule(column_name, replace_value, replace_with, offset = 0, fillna = '9',
+                end_column = None, name = None):
+    """
+    Rule equivalent of convert_binary / convert_binary_batch.
+    """
+    return EncodingRule('binary', column_name, end_column, name, replace_value, replace_with,
+                        fillna, None, offset, parse_string = True)
+
+def numerical_rule(column_name, scale = 1, fillna = 99, correction = False, end_column = None,
+                   replace_value = None, replace_with = None, parse_string = False):
+    """
+    Rule equivalent of convert_numerical / convert_numerical_batch. With parse_string the
+    leading response code is parsed first, as is needed for count variables stored as strings.
+    """
+    return EncodingRule('numerical', column_name, end_column, None, replace_value, replace_with,
+                        fillna, None, 0, scale, correction, parse_string)
+
+def ordinal_rule(column_name, replace_value, replace_with, fillna = 0, dk = 8, offset = 0,
+                 parse_string = False, end_column = None, pattern = None):
+    """
+    Rule equivalent of convert_ordinal / convert_ordinal_batch.
+    """
+    return EncodingRule('ordinal', column_name, end_column, None, replace_value, replace_with,
+                        fillna, dk, offset, 1, False, parse_string or pattern is not None,
+                        pattern)
+
+def onehot_rule(column_name, replace_value, replace_with, fillna = '0'):
+    """
+    Rule equivalent of add_onehot.
+    """
+    return EncodingRule('onehot', column_name, None, None, replace_value, replace_with, fillna,
+                        parse_string = True)
+
+def range_rule(column_name):
+    """
+    Rule equivalent of add_range.
+    """
+    return EncodingRule('range', column_name)
+
+def rule_table(rules):
+    """
+    Returns the rules as a DataFrame with one row per rule and one column per rule field.
+    """
+    return pd.DataFrame(list(rules), columns = EncodingRule._fields)
+
+def expand_rules(in_df, rules):
+    """
+    Expands rules that cover a range of consecutive columns into one rule per column.
+    
+    INPUT:
+    - in_df: DataFrame whose column order defines the ranges
+    - rules: list of EncodingRule or a DataFrame produced by rule_table
+    """
+    if isinstance(rules, pd.DataFrame):
+        rules = [EncodingRule(*row) for row in rules.itertuples(index = False)]
+    expanded = []
+    for rule in rules:
+        if _is_missing(rule.end_column):
+            expanded.append(rule._replace(end_column = None))
+            continue
+        start_index = in_df.columns.get_loc(rule.column)
+        end_index = in_df.columns.get_loc(rule.end_column)
+        for index in range(start_index, end_index + 1):
+            expanded.append(rule._replace(column = in_df.columns[index], end_column = None))
+    return expanded
+
+@profiled
+def parse_codes(in_df, columns, fillna = None):
+    """
+    Parses the leading digit of the string values in the specified columns in one vectorized
+    pass, e.g. '1. Yes' -> 1.
+    
+    INPUT:
+    - in_df: DataFrame containing string coded columns
+    - columns: list of columns to parse
+    - fillna: list (one entry per column) of values to use for missing data, or None
+    
+    OUTPUT:
+    - integer matrix with one column per entry of columns
+    """
+    for column in columns:
+        # astype('U1') below would parse numbers by their first digit, e.g. 12.0 as 1
+        present = in_df[column].dropna()
+        if len(present) and pd.api.types.infer_dtype(present) != 'string':
+            raise TypeError('Column {} contains values that are not strings.'.format(column))
+    values = in_df[list(columns)].to_numpy(dtype = object)
+    missing = pd.isnull(values)
+    codes = values.astype('U1').view(np.uint32).reshape(values.shape).astype(np.int64) - ord('0')
+    if fillna is not None:
+        for index, fill in enumerate(fillna):
+            if _is_missing(fill):
+                continue
+            codes[missing[:, index], index] = int(str(fill)[0])
+            missing[:, index] = False
+    invalid = missing | (codes < 0) | (codes > 9)
+    if invalid.any():
+        bad_column = columns[int(np.nonzero(invalid.any(axis = 0))[0][0])]
+        raise ValueError('Column {} contains values without a leading response code.'
+                         .format(bad_column))
+    return codes
+
+# Rows below which encode runs serially whatever n_jobs is. Starting the workers and writing and
+# reading the columnar copy cost more than the encoding of small data: 4.15 s with 4 workers
+# against 0.22 s serially for 3,000 rows, and on one CPU the parallel path stays about 4 times
+# slower up to 40,000 rows. See the encode_parallel benchmark of '09 Benchmarks.py'.
+PARALLEL_MIN_ROWS = 100000
+
+@profiled
+def encode(in_df, rules, schema = None, n_jobs = 1, source = None,
+           parallel_min_rows = PARALLEL_MIN_ROWS):
+    """
+    Encodes in_df according to a table of rules and returns the result as a new DataFrame. The
+    output is identical to calling the corresponding convert_* / add_* functions one rule at a
+    time, but string coded columns are parsed once and the output is assembled in a single
+    concatenation.
+    
+    INPUT:
+    - in_df: DataFrame from which the columns will be processed
+    - rules: list of EncodingRule or a DataFrame produced by rule_table
+    - schema: optional dict from encoding_schema; the decisions that depend on the data (one-hot
+      categories, '_dk' columns, missing value codes) are then taken as they were for the data
+      the schema was built from, so that a small batch of new respondents is encoded exactly
+      like that data
+    - n_jobs: number of worker processes; with more than one, the rules are split into blocks
+      of consecutive rules of one kind (binary, numerical, ordinal, one-hot, ...), each block
+      is encoded by a worker and the blocks are joined in rule order. The output is the same.
+    - source: with n_jobs, the directory of a columnar copy of in_df (see helpers.columnar,
+      e.g. the cache written by read_cached_csv), which the workers memory-map instead of
+      receiving the data; if None, the columns used by the rules are written to a temporary
+      columnar copy once
+    - parallel_min_rows: in_df is encoded serially, ignoring n_jobs and source, if it has
+      fewer rows (see PARALLEL_MIN_ROWS)
+    
+    OUTPUT:
+    - DataFrame with the encoded columns in rule order, indexed like in_df
+    """
+    rules = expand_rules(in_df, rules)
+    if effective_n_jobs(n_jobs) == 1 or len(in_df) < parallel_min_rows:
+        out_columns = _encode_columns(in_df, rules, schema)
+    else:
+        out_columns = _encode_parallel(in_df, rules, schema, n_jobs, source)
+    return pd.DataFrame(out_columns, index = in_df.index)
+
+def rule_blocks(rules, num_blocks):
+    """
+    Splits a list of expanded rules into about num_blocks lists of consecutive rules of the
+    same kind, keeping the rule order.
+    """
+    size = max(1, int(np.ceil(len(rules) / float(num_blocks))))
+    blocks = []
+    for rule in rules:
+        if not blocks or blocks[-1][-1].kind != rule.kind or len(blocks[-1]) >= size:
+            blocks.append([])
+        blocks[-1].append(rule)
+    return blocks
+
+def _encode_columns(in_df, rules, schema = None):
+    """
+    Encodes expanded rules and returns the encoded columns as an OrderedDict of arrays.
+    """
+    out_columns = OrderedDict()
+    for rule, values in zip(rules, _rule_values(in_df, rules)):
+        if schema is not None and rule.kind in _LAYOUTS:
+            layout = schema[rule.kind][_output_name(rule)]
+            _ENCODERS[rule.kind](out_columns, values, rule, layout)
+        else:
+            _ENCODERS[rule.kind](out_columns, values, rule)
+    return out_columns
+
+def _encode_parallel(in_df, rules, schema, n_jobs, source):
+    columns = list(OrderedDict.fromkeys(rule.column for rule in rules))
+    temporary = None
+    if source is None:
+        temporary = tempfile.mkdtemp(prefix = 'encode_')
+        source = os.path.join(temporary, 'input')
+        col.write_columnar(in_df.loc[:, columns], source, compact = False)
+    try:
+        # Several blocks per worker even out the blocks of slow and fast rules
+        blocks = rule_blocks(rules, 4 * effective_n_jobs(n_jobs))
+        outputs = Parallel(n_jobs = n_jobs)(
+            delayed(_encode_block)(source, block, schema) for block in blocks)
+    finally:
+        if temporary is not None:
+            shutil.rmtree(temporary, ignore_errors = True)
+    out_columns = OrderedDict()
+    for output in outputs:
+        for name, values in output.items():
+            if len(values) != len(in_df):
+                raise ValueError('The columnar source {} does not have the rows of in_df.'
+                                 .format(source))
+            out_columns[name] = values
+    return out_columns
+
+def _encode_block(source, rules, schema):
+    columns = list(OrderedDict.fromkeys(rule.column for rule in rules))
+    return _encode_columns(col.read_columnar(source, columns), rules, schema)
+
+@profiled
+def encoding_schema(in_df, rules):
+    """
+    Returns the decisions encode takes from the values of in_df, as a dict keyed by rule kind
+    and then by output feature name:
+    - onehot: categories, in the order of the '_oh' columns
+    - numerical: whether three-digit missing codes are used, and the code of the '_dk' column
+      (None if there is none)
+    - ordinal: whether there is a '_dk' column
+    """
+    rules = [rule for rule in expand_rules(in_df, rules) if rule.kind in _LAYOUTS]
+    schema = {kind: OrderedDict() for kind in _LAYOUTS}
+    for rule, values in zip(rules, _rule_values(in_df, rules)):
+        schema[rule.kind][_output_name(rule)] = _LAYOUTS[rule.kind](values, rule)
+    return schema
+
+def _rule_values(in_df, rules):
+    """
+    Yields the input values of every (expanded) rule, parsing the leading response code of all
+    string coded (column, fillna) pairs in one pass.
+    """
+    parse_keys = list(OrderedDict.fromkeys((rule.column, _fill_key(rule.fillna)) for rule in rules
+                                           if rule.parse_string and rule.pattern is None))
+    codes = parse_codes(in_df, [key[0] for key in parse_keys], [key[1] for key in parse_keys]) \
+        if parse_keys else None
+    code_index = {key: index for index, key in enumerate(parse_keys)}
+    for rule in rules:
+        if rule.parse_string and rule.pattern is None:
+            yield codes[:, code_index[(rule.column, _fill_key(rule.fillna))]]
+        else:
+            yield _column_values(in_df, rule)
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+def _fill_key(fillna):
+    return None if _is_missing(fillna) else str(fillna)[0]
+
+def _column_values(in_df, rule):
+    column = in_df[rule.column]
+    if rule.kind in ('copy', 'range'):
+        return column
+    if not _is_missing(rule.fillna):
+        column = column.fillna(rule.fillna)
+    if rule.pattern is not None:
+        column = column.str.extract(rule.pattern, expand = False)
+        if column.isnull().any():
+            raise ValueError('Column {} contains values not matching {}.'
+                             .format(rule.column, rule.pattern))
+        return column.astype(np.int64).to_numpy()
+    return column.to_numpy()
+
+def _replace(values, replace_value, replace_with):
+    """
+    Vectorized equivalent of Series.replace(replace_value, replace_with) on a NumPy array.
+    Integer arrays stay integer unless a missing value is introduced.
+    """
+    if replace_value is None or (isinstance(replace_value, float) and np.isnan(replace_value)):
+        return values
+    replace_value = np.atleast_1d(replace_value)
+    replace_with = np.broadcast_to(np.asarray(replace_with, dtype = np.float64),
+                                   replace_value.shape)
+    out = values.astype(np.float64)
+    for value, substitute in zip(replace_value, replace_with):
+        out[values == value] = substitute
+    if values.dtype.kind in 'iub' and not np.isnan(out).any():
+        return out.astype(values.dtype)
+    return out
+
+def _output_name(rule):
+    return rule.column if _is_missing(rule.name) else rule.name
+
+def _encode_copy(out_columns, values, rule):
+    out_columns[_output_name(rule)] = values.to_numpy()
+
+def _encode_binary(out_columns, values, rule):
+    out_columns[_output_name(rule)] = _replace(values + rule.offset, rule.replace_value,
+                                               rule.replace_with)
+
+def _encode_numerical(out_columns, values, rule, layout = None):
+    name = _output_name(rule)
+    values = values.astype(np.float64)
+    wide, dk = _numerical_layout(values, rule) if layout is None else layout
+    if dk is not None:
+        out_columns[name + '_dk'] = values == dk
+    if not wide or rule.correction:
+        values = np.where(np.isin(values, [98, 99]), np.nan, values)
+    if wide:
+        values = np.where(np.isin(values, np.arange(900, 1000)), np.nan, values)
+    values = np.round(values / rule.scale)
+    out_columns[name] = _replace(values, rule.replace_value, rule.replace_with)
+
+def _numerical_layout(values, rule):
+    """
+    Returns whether values use three-digit missing codes, and the code counted in the '_dk'
+    column (None if fewer than 10 respondents answered don't know).
+    """
+    values = values.astype(np.float64)
+    wide = bool(np.nanmax(values) >= 900)
+    dk = None
+    if not wide or rule.correction:
+        if (values == 98).sum() >= 10:
+            dk = 98
+    if wide and (values == 997).sum() >= 10:
+        dk = 997
+    return wide, dk
+
+def _encode_ordinal(out_columns, values, rule, layout = None):
+    name = _output_name(rule)
+    has_dk = _ordinal_layout(values, rule) if layout is None else layout
+    if rule.parse_string:
+        values = values + rule.offset
+    if has_dk:
+        out_columns[name + '_dk'] = values == rule.dk
+    out_columns[name] = _replace(values, rule.replace_value, rule.replace_with)
+
+def _ordinal_layout(values, rule):
+    """
+    Returns whether an ordinal feature has a '_dk' column, i.e. at least 10 respondents answered
+    don't know.
+    """
+    if rule.parse_string:
+        values = values + rule.offset
+    return not _is_missing(rule.dk) and bool((values == rule.dk).sum() >= 10)
+
+def _encode_onehot(out_columns, values, rule, layout = None):
+    name = _output_name(rule)
+    categories = _onehot_layout(values, rule) if layout is None else layout
+    values = _replace(values, rule.replace_value, rule.replace_with)
+    for index, category in enumerate(categories):
+        out_columns[name + '_oh' + str(index)] = (values == category).astype(np.uint8)
+
+def _onehot_layout(values, rule):
+    """
+    Returns the categories of a one-hot encoded feature.
+    """
+    values = _replace(values, rule.replace_value, rule.replace_with)
+    return np.unique(values[~np.isnan(values)] if values.dtype.kind == 'f' else values).tolist()
+
+def _encode_range(out_columns, values, rule):
+    name = _output_name(rule)
+    missing = values.isnull() | values.str.contains('NA', na = True)
+    bounds = values.str.extract(r'\d+\.\s*(\d+)\sto\s(\d+)').astype(np.float64)
+    if bounds[~missing].isnull().any(axis = None):
+        raise ValueError('Column {} contains values that are not ranges.'.format(rule.column))
+    bounds[missing] = np.nan
+    out_columns[name + '_r1'] = bounds[0].to_numpy()
+    out_columns[name + '_r2'] = bounds[1].to_numpy()
+
+# Functions returning the data-dependent decisions of an encoder from its raw input values
+_LAYOUTS = {'numerical': _numerical_layout, 'ordinal': _ordinal_layout,
+            'onehot': _onehot_layout}
+
+_ENCODERS = {'copy': _encode_copy, 'binary': _encode_binary, 'numerical': _encode_numerical,
+             'ordinal': _encode_ordinal, 'onehot': _encode_onehot, 'range': _encode_range}
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+These helper functions read the ANES Cumulative Data File variable codebook and the project's
+feature key. The codebook text is parsed once into an index stored next to it: one JSON record
+per variable (label, years asked, valid and missing response codes) and a table of record
+offsets. Nothing is read when this module is imported; the first lookup loads the offset table
+and every lookup reads a single record.
+
+"""
+
+import csv
+import json
+import os
+import re
+from collections import OrderedDict
+from collections.abc import Mapping
+
+HELPERS_DIR = os.path.dirname(os.path.abspath(__file__))
+CODEBOOK_PATH = os.path.join(HELPERS_DIR, '..', '..', 'data',
+                             'anes_timeseries_cdf_codebook_var.txt')
+FEATURE_KEY_PATH = os.path.join(HELPERS_DIR, 'feature_key.csv')
+INDEX_SUFFIX = '.index'
+# Incremented whenever the parsing changes, so that existing indexes are rebuilt
+INDEX_VERSION = 2
+
+# Suffixes added to variable names by helpers.cleaning
+_SUFFIX = re.compile(r'(_dk|_oh\d+|_r[12]|_int)$')
+_CODE = re.compile(r'^(\S+?)\.(?:\s+(.*))?$')
+_YEAR = re.compile(r'^(\d{4})\s*:')
+
+class Codebook(Mapping):
+    """
+    Read-only mapping from variable name (e.g. 'VCF0713') to its codebook entry, a dict with:
+    - group: section of the codebook, e.g. 'ELECTION'
+    - label: short description of the variable
+    - question: question text
+    - years: years in which the variable was asked
+    - valid_codes, missing_codes: dicts from response code (as written in the codebook, e.g.
+      '1', '98' or '00-96') to its meaning
+    - type: storage type given by the codebook
+
+    INPUT:
+    - path: path of the codebook text file
+    """
+
+    def __init__(self, path = CODEBOOK_PATH):
+        self.path = path
+        self._offsets = None
+        self._cache = dict()
+
+    def __getitem__(self, name):
+        if name not in self._cache:
+            offset, length = self.offsets()[name]
+            with open(self._records_path(), 'rb') as f:
+                f.seek(offset)
+                self._cache[name] = json.loads(f.read(length).decode('utf-8'))
+        return self._cache[name]
+
+    def __iter__(self):
+        return iter(self.offsets())
+
+    def __len__(self):
+        return len(self.offsets())
+
+    def __contains__(self, name):
+        return name in self.offsets()
+
+    def offsets(self):
+        """
+        Returns the table of record offsets, building the index first if it is missing or
+        older than the codebook.
+        """
+        if self._offsets is None:
+            # Imported here, as helpers.columnar imports pandas
+            from helpers.columnar import file_hash
+            meta = _read_json(os.path.join(self.index_path(), 'meta.json'))
+            source_hash = file_hash(self.path)
+            if meta is None or meta['source_hash'] != source_hash or \
+                    meta.get('version') != INDEX_VERSION:
+                meta = build_index(self.path, self.index_path(), source_hash)
+            self._offsets = {name: tuple(entry) for name, entry in meta['offsets'].items()}
+        return self._offsets
+
+    def index_path(self):
+        return os.path.splitext(self.path)[0] + INDEX_SUFFIX
+
+    def label(self, name):
+        """
+        Returns the label of a variable, or of the variable an encoded column (e.g.
+        'VCF0713_oh1' or 'VCF0218_dk') was derived from.
+        """
+        return self[base_variable(name)]['label']
+
+    def years(self, name):
+        return self[base_variable(name)]['years']
+
+    def codes(self, name, numeric = False):
+        """
+        Returns the valid and missing response codes of a variable as one dict. With numeric,
+        only codes that are single numbers are returned, keyed by number, as used by the
+        replace_value arguments of helpers.cleaning rules.
+        """
+        entry = self[base_variable(name)]
+        codes = OrderedDict(entry['valid_codes'])
+        codes.update(entry['missing_codes'])
+        return _numeric(codes) if numeric else codes
+
+    def missing_codes(self, name, numeric = False):
+        codes = self[base_variable(name)]['missing_codes']
+        return _numeric(codes) if numeric else OrderedDict(codes)
+
+    def dk_codes(self, name, numeric = False):
+        """
+        Returns the missing codes of a variable whose meaning includes "don't know" (DK).
+        """
+        codes = OrderedDict((code, meaning) for code, meaning
+                            in self[base_variable(name)]['missing_codes'].items()
+                            if re.search(r"\bDK\b|don't know", meaning, re.IGNORECASE))
+        return _numeric(codes) if numeric else codes
+
+    def _records_path(self):
+        return os.path.join(self.index_path(), 'records.jsonl')
+
+class FeatureKey(Mapping):
+    """
+    Read-only mapping from column name to its description in helpers/feature_key.csv, loaded on
+    first use. Encoded columns missing from the feature key are described by the feature key
+    entry or the codebook label of the variable they were derived from.
+
+    INPUT:
+    - path: path of the feature key CSV
+    - codebook: optional Codebook used for columns missing from the feature key
+    """
+
+    def __init__(self, path = FEATURE_KEY_PATH, codebook = None):
+        self.path = path
+        self.codebook = codebook
+        self._key = None
+
+    def __getitem__(self, name):
+        key = self._load()
+        if name in key:
+            return key[name]
+        base = base_variable(name)
+        if base in key:
+            return key[base]
+        if self.codebook is not None and base in self.codebook:
+            return self.codebook[base]['label']
+        raise KeyError(name)
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __contains__(self, name):
+        try:
+            self[name]
+        except KeyError:
+            return False
+        return True
+
+    def _load(self):
+        if self._key is None:
+            with open(self.path, newline = '') as csvfile:
+                self._key = {row[0]: row[1] for row in csv.reader(csvfile) if row}
+        return self._key
+
+def base_variable(name):
+    """
+    Returns the variable an encoded column was derived from, e.g. 'VCF0713_oh1' -> 'VCF0713'.
+    """
+    return _SUFFIX.sub('', name)
+
+def parse_codebook(path):
+    """
+    Parses the codebook text file and returns an OrderedDict of entries (see Codebook) keyed by
+    variable name, in codebook order.
+    """
+    with open(path, encoding = 'latin-1') as f:
+        text = f.read().replace('\r\n', '\n')
+    entries = OrderedDict()
+    for block in re.split(r'\n=+\n', text)[1:]:
+        lines = block.strip('\n').split('\n')
+        name = lines[0].strip()
+        entry = {'group': None, 'label': None, 'question': '', 'years': [],
+                 'valid_codes': OrderedDict(), 'missing_codes': OrderedDict(), 'type': None}
+        sections = _sections(lines[1:])
+        # The header is 'GROUP: Label', or just the label for a few variables
+        header = [line.strip() for line in sections.pop(None, []) if line.strip()]
+        if header and ':' in header[0]:
+            entry['group'], entry['label'] = [part.strip() for part in header[0].split(':', 1)]
+        elif header:
+            entry['label'] = header[0]
+        entry['question'] = '\n'.join(sections.get('QUESTION', [])).strip()
+        entry['valid_codes'] = _codes(sections.get('VALID_CODES', []))
+        entry['missing_codes'] = _codes(sections.get('MISSING_CODES', []))
+        entry['type'] = ' '.join(sections.get('TYPE', [])).strip() or None
+        entry['years'] = sorted(set(int(match.group(1)) for match in
+                                    map(_YEAR.match, sections.get('SOURCE_VARS', []))
+                                    if match))
+        entries[name] = entry
+    return entries
+
+def build_index(path, index_path, source_hash = None):
+    """
+    Parses the codebook at path and writes its index to the directory index_path: records.jsonl
+    holding one JSON entry per line and meta.json holding the byte offset and length of every
+    record, source_hash, the hash of the codebook the index was built from, and the
+    INDEX_VERSION of the parser. Returns the contents of meta.json.
+    """
+    if not os.path.isdir(index_path):
+        os.makedirs(index_path)
+    offsets = OrderedDict()
+    with open(os.path.join(index_path, 'records.jsonl'), 'wb') as f:
+        for name, entry in parse_codebook(path).items():
+            record = json.dumps(entry).encode('utf-8')
+            offsets[name] = (f.tell(), len(record))
+            f.write(record + b'\n')
+    meta = {'source_hash': source_hash, 'version': INDEX_VERSION, 'offsets': offsets}
+    with open(os.path.join(index_path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    return meta
+
+def _sections(lines):
+    """
+    Splits the lines of a codebook entry into sections, keyed by the heading that precedes a
+    line of dashes; lines before the first heading are keyed by None.
+    """
+    sections = OrderedDict([(None, [])])
+    current = None
+    for index, line in enumerate(lines):
+        if re.match(r'^-{3,}\s*$', line):
+            continue
+        if index + 1 < len(lines) and re.match(r'^-{3,}\s*$', lines[index + 1]):
+            current = line.strip().rstrip(':')
+            sections[current] = []
+            continue
+        sections[current].append(line.rstrip())
+    return sections
+
+def _codes(lines):
+    """
+    Parses response code lines, e.g. '1.  Democratic candidate', joining indented continuation
+    lines to the meaning of the preceding code. Unlabelled points of a scale (e.g. '2.' between
+    the labelled end points '1.' and '7.') are codes with an empty meaning.
+    """
+    codes = OrderedDict()
+    code = None
+    for line in lines:
+        match = _CODE.match(line)
+        if match and not line[0].isspace():
+            code = match.group(1)
+            codes[code] = (match.group(2) or '').strip()
+        elif code is not None and line.strip():
+            codes[code] = codes[code] + ' ' + line.strip()
+    return codes
+
+def _numeric(codes):
+    numeric = OrderedDict()
+    for code, meaning in codes.items():
+        try:
+            numeric[int(code)] = meaning
+        except ValueError:
+            pass
+    return numeric
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+These helper functions store DataFrames as a directory of typed, memory-mappable NumPy
+columns so that the CSVs passed between pipeline stages do not have to be re-parsed by every
+notebook. A cache is keyed on the content hash of the CSV it was built from.
+
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import uuid
+import numpy as np
+import pandas as pd
+from helpers.profiling import profiled
+
+CACHE_SUFFIX = '.columnar'
+
+def file_hash(path, block_size = 1 << 20):
+    """
+    Returns the SHA-1 hex digest of the contents of a file.
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def cache_path(csv_path):
+    """
+    Returns the directory in which the columnar copy of csv_path is stored.
+    """
+    return os.path.splitext(csv_path)[0] + CACHE_SUFFIX
+
+def columnar_dtypes(df, float32_columns = ()):
+    """
+    Returns a copy of df with compact dtypes:
+    - '_dk' columns are stored as bool
+    - one-hot ('_oh') columns are stored as int8
+    - columns listed in float32_columns (e.g. thermometers) are stored as float32
+    - object columns mixing bools and numbers are stored as float64
+    Columns with missing values are never converted to bool or integer types.
+
+    INPUT:
+    - df: DataFrame to convert
+    - float32_columns: columns whose values are exactly representable as float32
+    """
+    float32_columns = set(float32_columns)
+    columns = dict()
+    for name in df.columns:
+        column = df[name]
+        if column.dtype.kind == 'O':
+            column = _object_to_numeric(column)
+        has_missing = column.isnull().any()
+        if '_dk' in name and not has_missing:
+            column = column.astype(bool)
+        elif '_oh' in name and not has_missing and column.isin([0, 1]).all():
+            column = column.astype(np.int8)
+        elif name in float32_columns:
+            column = column.astype(np.float32)
+        columns[name] = column
+    return pd.DataFrame(columns, index = df.index)
+
+def write_columnar(df, path, source_hash = None, float32_columns = (), compact = True):
+    """
+    Writes df to the directory path as one .npy file per column, converting dtypes with
+    columnar_dtypes.
+
+    INPUT:
+    - df: DataFrame to write
+    - path: directory to write to (created if needed)
+    - source_hash: hash of the file df was read from, used to validate the cache later
+    - float32_columns: see columnar_dtypes
+    - compact: whether to convert dtypes with columnar_dtypes; without, every column is stored
+      with its dtype, so that read_columnar returns df unchanged
+
+    The columns are written to a temporary directory that then replaces path, so that other
+    processes (e.g. concurrent stages of '10 Pipeline.py') never memory-map a partially written
+    or truncated file, and keep reading the columns they mapped before.
+    """
+    temporary = _sibling(path, 'tmp')
+    os.makedirs(temporary)
+    try:
+        _write_columns(df, temporary, source_hash, float32_columns, compact)
+        _replace_directory(temporary, path)
+    finally:
+        shutil.rmtree(temporary, ignore_errors = True)
+
+def _write_columns(df, path, source_hash, float32_columns, compact):
+    if compact:
+        df = columnar_dtypes(df, float32_columns)
+    meta = {'source_hash': source_hash, 'columns': [], 'float32_columns': list(float32_columns)}
+    for index, name in enumerate(df.columns):
+        values = df[name].to_numpy()
+        entry = {'name': name, 'file': '{}.npy'.format(index), 'mask': None}
+        if values.dtype == object:
+            mask = pd.isnull(values)
+            values = np.where(mask, '', values).astype(str)
+            entry['mask'] = '{}.mask.npy'.format(index)
+            np.save(os.path.join(path, entry['mask']), mask)
+        np.save(os.path.join(path, entry['file']), values)
+        meta['columns'].append(entry)
+    if isinstance(df.index, pd.RangeIndex):
+        meta['index'] = [df.index.start, df.index.stop, df.index.step]
+    else:
+        meta['index'] = 'index.npy'
+        np.save(os.path.join(path, 'index.npy'), df.index.to_numpy())
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+def read_columnar(path, columns = None, mmap_mode = 'c'):
+    """
+    Reads a DataFrame written by write_columnar. Numeric columns are memory-mapped rather than
+    loaded; with the default copy-on-write mode, modifying the frame never alters the cache.
+
+    INPUT:
+    - path: directory written by write_columnar
+    - columns: optional list of columns to read
+    - mmap_mode: mode passed to np.load; None loads the columns into memory
+    """
+    meta = read_meta(path)
+    entries = meta['columns']
+    if columns is not None:
+        by_name = {entry['name']: entry for entry in entries}
+        entries = [by_name[name] for name in columns]
+    data = dict()
+    for entry in entries:
+        values = np.load(os.path.join(path, entry['file']), mmap_mode = mmap_mode)
+        if entry['mask'] is not None:
+            mask = np.load(os.path.join(path, entry['mask']))
+            values = np.where(mask, np.nan, values.astype(object))
+        data[entry['name']] = values
+    if isinstance(meta['index'], list):
+        index = pd.RangeIndex(*meta['index'])
+    else:
+        index = pd.Index(np.load(os.path.join(path, meta['index'])))
+    return pd.DataFrame(data, index = index, copy = False)
+
+def read_meta(path):
+    """
+    Returns the metadata of a columnar cache, or None if there is no cache at path.
+    """
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+@profiled
+def read_cached_csv(csv_path, columns = None, float32_columns = None, **kwargs):
+    """
+    Drop-in replacement for pd.read_csv(csv_path, **kwargs). The first call parses the CSV and
+    writes a typed columnar copy next to it; later calls memory-map that copy for as long as
+    the contents of the CSV (and the read_csv arguments) are unchanged.
+
+    INPUT:
+    - csv_path: path of the CSV file
+    - columns: optional list of columns to read
+    - float32_columns: see columnar_dtypes; defaults to the columns stored as float32 by the
+      previous version of the cache
+    - kwargs: additional arguments passed to pd.read_csv
+    """
+    path = cache_path(csv_path)
+    key = file_hash(csv_path)
+    if kwargs:
+        key = key + ':' + json.dumps(kwargs, sort_keys = True, default = str)
+    meta = read_meta(path)
+    if meta is None or meta['source_hash'] != key:
+        if float32_columns is None:
+            float32_columns = meta['float32_columns'] if meta is not None else ()
+        write_columnar(pd.read_csv(csv_path, **kwargs), path, key, float32_columns)
+    try:
+        return read_columnar(path, columns)
+    except (IOError, OSError):
+        # Another process replaced the cache between reading its metadata and its columns
+        return read_columnar(path, columns)
+
+@profiled
+def to_cached_csv(df, csv_path, float32_columns = ()):
+    """
+    Writes df to csv_path with df.to_csv and stores a columnar copy keyed on the written file.
+
+    INPUT:
+    - df: DataFrame to write
+    - csv_path: path of the CSV file
+    - float32_columns: see columnar_dtypes
+    """
+    df.to_csv(csv_path)
+    write_columnar(pd.read_csv(csv_path), cache_path(csv_path), file_hash(csv_path),
+                   float32_columns)
+
+def _sibling(path, suffix):
+    path = os.path.abspath(path)
+    return os.path.join(os.path.dirname(path), '.{}.{}.{}'.format(os.path.basename(path),
+                                                                  uuid.uuid4().hex, suffix))
+
+def _replace_directory(source, path):
+    """
+    Moves the directory source to path, replacing the directory at path if there is one. If
+    another process puts its own copy at path in between, that copy is kept.
+    """
+    old = _sibling(path, 'old')
+    try:
+        os.rename(path, old)
+    except OSError:
+        old = None
+    try:
+        os.rename(source, path)
+    except OSError:
+        if not os.path.isdir(path):
+            raise
+    finally:
+        if old is not None:
+            shutil.rmtree(old, ignore_errors = True)
+
+def _object_to_numeric(column):
+    """
+    Converts an object column holding bools, numbers and missing values to float64. Columns
+    holding any other values are returned unchanged.
+    """
+    booleans = {'True': 1.0, 'False': 0.0}
+    try:
+        return pd.to_numeric(column.map(lambda x: float(x) if isinstance(x, (bool, np.bool_))
+                                        else booleans.get(x, x), na_action = 'ignore'))
+    except (ValueError, TypeError):
+        return column
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+These helper functions evaluate predicted non-voter probabilities at many thresholds at once,
+as done in '06 Additional Evaluation.ipynb'. The probabilities are sorted once, and the
+confusion counts at every threshold are read from cumulative sums of the labels (and of the
+survey weights) instead of scoring the predictions once per threshold. The turnout-adjusted
+vote shares of every year, model and threshold are read from cumulative sums of the weighted
+vote intentions in the same way.
+
+"""
+
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from helpers.profiling import profiled
+from helpers.scoring import PARTIES
+
+THRESHOLDS = np.round(np.arange(0, 1.01, .01), 2)
+
+COUNTS = ['tp', 'fp', 'fn', 'tn']
+METRICS = ['accuracy', 'precision', 'recall', 'f1', 'predicted_share']
+
+# Popular vote shares (Democrat, Republican, other) used in '06 Additional Evaluation'
+ELECTION_RESULTS = {2004: [.483, .507, .01], 2008: [.529, .457, .014],
+                    2012: [.511, .472, .017]}
+
+# Turnout of the voting-eligible population according to the United States Elections Project,
+# as in '06 Additional Evaluation'
+USEP_TURNOUT = {2000: .542, 2004: .601, 2008: .606, 2012: .586}
+
+SHARE_ERRORS = ['mae', 'margin_error', 'turnout_error']
+
+def threshold_metrics(y, y_pred, weights = None, thresholds = THRESHOLDS):
+    """
+    Returns the metrics of predicting non-voters as the respondents whose probability is above
+    each threshold.
+
+    INPUT:
+    - y: true labels, True (or 1) for non-voters
+    - y_pred: predicted probabilities of not voting
+    - weights: optional survey weights, e.g. the 'weight' column
+    - thresholds: thresholds at which the predictions are evaluated
+
+    OUTPUT:
+    - DataFrame indexed by threshold with the confusion counts tp, fp, fn and tn and the
+      metrics accuracy, precision, recall, f1 and predicted_share (proportion predicted not to
+      vote); with weights, also the weighted counts and metrics with the suffix '_w'
+    """
+    metrics = batch_threshold_metrics({0: (y, y_pred, weights)}, thresholds)
+    return metrics.droplevel('name')
+
+@profiled
+def batch_threshold_metrics(predictions, thresholds = THRESHOLDS):
+    """
+    Computes threshold_metrics for many prediction vectors (e.g. one per model and year) in one
+    call: the vectors are sorted together and their counts read from one array of cumulative
+    sums.
+
+    INPUT:
+    - predictions: dict from a name (e.g. a (model, year) tuple) to a tuple (y, y_pred) or
+      (y, y_pred, weights); weighted metrics are returned if any vector has weights, with
+      missing weights counted as 1. Respondents without a prediction (NaN) are left out, as in
+      vote_share_cube; the counts of an empty vector are 0.
+    - thresholds: thresholds at which every vector is evaluated
+
+    OUTPUT:
+    - DataFrame with the columns of threshold_metrics and a MultiIndex of name and threshold
+    """
+    names = list(predictions)
+    entries = [tuple(predictions[name]) + (None,) * (3 - len(predictions[name]))
+               for name in names]
+    weighted = any(entry[2] is not None for entry in entries)
+    y = np.concatenate([np.asarray(entry[0], dtype = np.float64).ravel() for entry in entries])
+    y_pred = np.concatenate([np.asarray(entry[1], dtype = np.float64).ravel()
+                             for entry in entries])
+    w = np.concatenate([np.ones(len(np.ravel(entry[1]))) if entry[2] is None else
+                        np.asarray(entry[2], dtype = np.float64).ravel() for entry in entries])
+    groups = np.repeat(np.arange(len(names)), [len(np.ravel(entry[1])) for entry in entries])
+    thresholds = np.asarray(thresholds, dtype = np.float64)
+    w = np.nan_to_num(w, nan = 1.0) if weighted else np.ones_like(y)
+    keep = ~np.isnan(y_pred)
+    y, y_pred, w, groups = y[keep], y_pred[keep], w[keep], groups[keep]
+
+    # Sums of the labels and of the respondents (each counted as 1 or as its weight) at or below
+    # every threshold and in total, for every vector
+    below, total = _grouped_sums(groups, len(names), y_pred, thresholds,
+                                 np.column_stack([y, np.ones_like(y), w * y, w]))
+    columns = OrderedDict()
+    _add_metrics(columns, *_confusion(below[:, 0], below[:, 1], total[:, 0], total[:, 1]),
+                 suffix = '')
+    if weighted:
+        _add_metrics(columns, *_confusion(below[:, 2], below[:, 3], total[:, 2], total[:, 3]),
+                     suffix = '_w')
+    query_groups = np.repeat(np.arange(len(names)), len(thresholds))
+    index = pd.MultiIndex.from_arrays([pd.Index(names, dtype = object, tupleize_cols = False)
+                                       .take(query_groups), np.tile(thresholds, len(names))],
+                                      names = ['name', 'threshold'])
+    return pd.DataFrame(columns, index = index)
+
+def threshold_for_recall(metrics, target_recall = 0.8, weighted = False):
+    """
+    Returns the first threshold (in increasing order) at which the recall of metrics, as
+    returned by threshold_metrics, is no longer above target_recall; for a table returned by
+    batch_threshold_metrics, returns a Series with one threshold per name. The threshold is
+    missing if the recall never falls to target_recall.
+    """
+    recall = metrics['recall_w' if weighted else 'recall']
+    if isinstance(metrics.index, pd.MultiIndex):
+        return recall.groupby(level = 'name', sort = False) \
+            .apply(lambda group: _first_threshold(group.droplevel('name'), target_recall))
+    return _first_threshold(recall, target_recall)
+
+def evaluate(y, y_pred, threshold, weights = None):
+    """
+    Returns the counts and metrics of threshold_metrics at a single threshold as a Series.
+    """
+    return threshold_metrics(y, y_pred, weights, [threshold]).iloc[0]
+
+def confusion_matrix(metrics, weighted = False):
+    """
+    Returns the confusion matrix of one row of metrics, laid out as by
+    sklearn.metrics.confusion_matrix (true labels by row, voters first).
+    """
+    suffix = '_w' if weighted else ''
+    return np.array([[metrics['tn' + suffix], metrics['fp' + suffix]],
+                     [metrics['fn' + suffix], metrics['tp' + suffix]]])
+
+@profiled
+def vote_share_cube(df, probabilities, thresholds = THRESHOLDS, parties = PARTIES,
+                    results = ELECTION_RESULTS, turnout = USEP_TURNOUT, label = 'final_vote'):
+    """
+    Returns the turnout-adjusted vote shares of every year, model and threshold: the weighted
+    shares of the intended votes of the respondents predicted to vote, i.e. whose probability
+    of not voting is not above the threshold. All of them are read from one cumulative sum of
+    the weighted intentions, sorted by (year, model, probability).
+
+    INPUT:
+    - df: survey data with the columns 'year', 'weight', the intended vote columns of parties
+      and optionally label
+    - probabilities: DataFrame (or dict) with one column of predicted probabilities of not
+      voting per model, indexed like df, e.g. the prediction columns joined by
+      helpers.predictions.PredictionStore.join; respondents without a probability are left out
+      for that model
+    - thresholds: thresholds at which the shares are computed
+    - parties: OrderedDict from party to the column of df flagging an intended vote for it; the
+      margin is the share of the first party minus that of the second
+    - results: dict from year to the popular vote shares of the parties, in order
+    - turnout: dict from year to the actual turnout
+    - label: column of df that is 0 for respondents who did not vote; if present, the weighted
+      recall and precision of the predicted non-voters are added
+
+    OUTPUT:
+    - DataFrame indexed by year, model and threshold, with the share of every party, the
+      predicted turnout (weighted share predicted to vote), error_<party> (share minus the
+      result), margin, margin_error, mae (mean absolute error of the shares), turnout_error
+      (predicted minus actual turnout) and recall_w / precision_w. Years and models without
+      any probability are left out.
+    """
+    probabilities = pd.DataFrame(probabilities, index = df.index)
+    models, years = list(probabilities.columns), np.sort(df.year.dropna().unique())
+    year_position = np.searchsorted(years, df.year.to_numpy())
+    weights = np.nan_to_num(df.weight.to_numpy(dtype = np.float64), nan = 1.0)
+    columns = [weights[:, None] * np.nan_to_num(df.loc[:, list(parties.values())]
+                                                .to_numpy(dtype = np.float64)), weights]
+    if label in df:
+        columns.append(weights * (df[label].to_numpy() == 0))
+    values = np.column_stack(columns)
+
+    # One group per (year, model), holding the respondents of the year with a probability
+    rows, groups, y_pred = [], [], []
+    for j, model in enumerate(models):
+        predicted = probabilities[model].to_numpy(dtype = np.float64)
+        keep = np.flatnonzero(~np.isnan(predicted) & df.year.notnull().to_numpy())
+        rows.append(keep)
+        groups.append(year_position[keep] * len(models) + j)
+        y_pred.append(predicted[keep])
+    rows = np.concatenate(rows)
+    thresholds = np.asarray(thresholds, dtype = np.float64)
+    below, total = _grouped_sums(np.concatenate(groups), len(years) * len(models),
+                                 np.concatenate(y_pred), thresholds, values[rows])
+
+    num_parties = len(parties)
+    query_groups = np.repeat(np.arange(len(years) * len(models)), len(thresholds))
+    cube = OrderedDict()
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        voters = below[:, :num_parties]
+        shares = voters / voters.sum(axis = 1, keepdims = True)
+        for i, party in enumerate(parties):
+            cube[party] = shares[:, i]
+        cube['turnout'] = below[:, num_parties] / total[:, num_parties]
+        if values.shape[1] > num_parties + 1:
+            # Non-voters are the respondents above the threshold
+            nonvoters = total[:, -1] - below[:, -1]
+            predicted = total[:, num_parties] - below[:, num_parties]
+            cube['recall_w'] = np.where(total[:, -1] > 0, nonvoters / total[:, -1], 0)
+            cube['precision_w'] = np.where(predicted > 0, nonvoters / predicted, 0)
+    index = pd.MultiIndex.from_arrays([years[query_groups // len(models)],
+                                       np.array(models, dtype = object)[query_groups %
+                                                                        len(models)],
+                                       np.tile(thresholds, len(years) * len(models))],
+                                      names = ['year', 'model', 'threshold'])
+    cube = pd.DataFrame(cube, index = index).loc[total[:, num_parties] > 0]
+    return _add_share_errors(cube, parties, results, turnout)
+
+def vote_share_baselines(df, parties = PARTIES, results = ELECTION_RESULTS,
+                         turnout = USEP_TURNOUT, label = 'final_vote'):
+    """
+    Returns the vote shares every year that the turnout-adjusted shares of vote_share_cube are
+    compared with, with the same columns:
+    - 'result': the popular vote and the actual turnout
+    - 'survey': the intended votes of every respondent
+    - 'voters': the intended votes of the respondents who reported voting (label not 0), i.e.
+      the shares of a turnout model making no mistakes; turnout is the reported turnout
+
+    OUTPUT:
+    - DataFrame indexed by year and baseline
+    """
+    rows = OrderedDict()
+    for year, group in df.groupby('year'):
+        weights = np.nan_to_num(group.weight.to_numpy(dtype = np.float64), nan = 1.0)
+        intent = weights[:, None] * np.nan_to_num(group.loc[:, list(parties.values())]
+                                                  .to_numpy(dtype = np.float64))
+        voted = group[label].to_numpy() != 0 if label in group else np.ones(len(group), bool)
+        if year in results:
+            rows[(year, 'result')] = list(results[year]) + [turnout.get(year, np.nan)]
+        for name, selected in [('survey', np.ones(len(group), bool)), ('voters', voted)]:
+            totals = intent[selected].sum(axis = 0)
+            with np.errstate(invalid = 'ignore', divide = 'ignore'):
+                rows[(year, name)] = list(totals / totals.sum()) + \
+                    [weights[selected].sum() / weights.sum()]
+    baselines = pd.DataFrame(list(rows.values()), columns = list(parties) + ['turnout'],
+                             index = pd.MultiIndex.from_tuples(list(rows),
+                                                               names = ['year', 'baseline']))
+    return _add_share_errors(baselines, parties, results, turnout)
+
+def vote_share_errors(cube, baselines = None, by = 'mae'):
+    """
+    Summarizes a table returned by vote_share_cube with one row per year and model with an
+    election result: the threshold with the smallest error by (e.g. 'mae' or the absolute
+    'margin_error'), the errors at that threshold, and the range of mae over all thresholds.
+    With baselines (see vote_share_baselines), the mae and margin error of the survey and of
+    the reported voters are added for comparison.
+    """
+    # Years without an election result have no errors
+    key = cube[by].abs().dropna()
+    best = cube.loc[key.groupby(level = ['year', 'model']).idxmin()]
+    summary = best.reset_index('threshold').loc[:, ['threshold'] + SHARE_ERRORS + ['turnout']]
+    grouped = cube.mae.groupby(level = ['year', 'model'])
+    summary['mae_min'], summary['mae_max'] = grouped.min(), grouped.max()
+    if baselines is not None:
+        for name in ['survey', 'voters']:
+            if name in baselines.index.get_level_values('baseline'):
+                table = baselines.xs(name, level = 'baseline')
+                years = summary.index.get_level_values('year')
+                summary[name + '_mae'] = table.mae.reindex(years).to_numpy()
+                summary[name + '_margin_error'] = table.margin_error.reindex(years).to_numpy()
+    return summary
+
+def _add_metrics(columns, tp, fp, fn, tn, suffix):
+    for name, counts in zip(COUNTS, [tp, fp, fn, tn]):
+        columns[name + suffix] = counts
+    total = tp + fp + fn + tn
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        # As in sklearn.metrics, undefined precision, recall and F1 scores are 0
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 0)
+        recall = np.where(tp + fn > 0, tp / (tp + fn), 0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0)
+        columns['accuracy' + suffix] = (tp + tn) / total
+        columns['precision' + suffix] = precision
+        columns['recall' + suffix] = recall
+        columns['f1' + suffix] = f1
+        columns['predicted_share' + suffix] = (tp + fp) / total
+
+def _grouped_sums(groups, num_groups, y_pred, thresholds, values):
+    """
+    Returns, for every group and threshold (group-major), the sums of the columns of values (one
+    row per prediction) over the rows of the group whose prediction is at or below the
+    threshold, and over all rows of the group. Groups without rows sum to 0; the predictions
+    must not be missing.
+
+    The predictions and thresholds are ranked together so that (group, prediction) pairs become
+    integer keys; after one sort, one cumulative sum of values answers every query with two
+    lookups.
+    """
+    if np.isnan(y_pred).any():
+        raise ValueError('The predictions contain missing values.')
+    _, ranks = np.unique(np.concatenate([y_pred, thresholds]), return_inverse = True)
+    ranks = ranks.ravel()
+    size = ranks.max() + 1 if len(ranks) else 1
+    keys = groups * size + ranks[:len(y_pred)]
+    order = np.argsort(keys, kind = 'stable')
+    keys = keys[order]
+    queries = (np.arange(num_groups)[:, None] * size + ranks[len(y_pred):][None, :]).ravel()
+    below = np.searchsorted(keys, queries, side = 'right')
+    starts = np.searchsorted(keys, np.arange(num_groups) * size)
+    ends = np.append(starts[1:], len(keys))
+    query_groups = np.repeat(np.arange(num_groups), len(thresholds))
+    values = np.asarray(values, dtype = np.float64)
+    cumulative = np.vstack([np.zeros((1, values.shape[1])), np.cumsum(values[order], axis = 0)])
+    start = cumulative[starts[query_groups]]
+    return cumulative[below] - start, cumulative[ends[query_groups]] - start
+
+def _confusion(positives_below, count_below, positives, count):
+    """
+    Returns tp, fp, fn and tn from the positives and counts at or below the thresholds (i.e.
+    predicted negative) and in total.
+    """
+    tn = count_below - positives_below
+    return positives - positives_below, count - positives - tn, positives_below, tn
+
+def _add_share_errors(table, parties, results, turnout):
+    """
+    Adds the errors of the vote shares and turnout of table (indexed by year first) against the
+    election results and actual turnout of its years.
+    """
+    years = table.index.get_level_values('year')
+    names = list(parties)
+    for i, party in enumerate(names):
+        actual = np.array([results[year][i] if year in results else np.nan for year in years])
+        table['error_' + party] = table[party].to_numpy() - actual
+    table['margin'] = table[names[0]] - table[names[1]]
+    table['margin_error'] = table['error_' + names[0]] - table['error_' + names[1]]
+    table['mae'] = table.loc[:, ['error_' + party for party in names]].abs().mean(axis = 1,
+                                                                                  skipna = False)
+    table['turnout_error'] = table.turnout.to_numpy() - \
+        np.array([turnout.get(year, np.nan) for year in years])
+    return table
+
+def _first_threshold(recall, target_recall):
+    below = recall.index[recall.to_numpy() <= target_recall]
+    return below[0] if len(below) else np.nan
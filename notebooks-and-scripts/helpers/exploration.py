@@ -7,40 +7,146 @@ Created on Fri Mar 17 13:10:35 2017
 """
 
 import numpy as np
+import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from scipy.stats import norm
+from helpers.project import wrap_text
 
-def binary_vs_target(firstFeatureName, lastFeatureName, targetName, featureKey, df):
-    firstIndex = df.columns.get_loc(firstFeatureName)
-    lastIndex = df.columns.get_loc(lastFeatureName)
-    targetIndex = df.columns.get_loc(targetName)
-    
-    num_plots = lastIndex - firstIndex + 1
-    fig, axes = plt.subplots(num_plots // 4 + 1, 4, figsize = (10, .7 * num_plots))
-    
-    p_list = []
-    
-    temp_df = df
-    for axesIndex, index in zip(range(0, num_plots), range(firstIndex, lastIndex + 1)):
-        n1 = sum(temp_df.iloc[:,index] == 0)
-        n2 = sum(temp_df.iloc[:,index] == 1)
-        x1 = sum((temp_df.iloc[:,index] == 0) & (temp_df.iloc[:,targetIndex] == 0))
-        x2 = sum((temp_df.iloc[:,index] == 1) & (temp_df.iloc[:,targetIndex] == 0))
-        p1 = x1 / n1
-        p2 = x2 / n2
-        g = sns.barplot([0,1],[p1,p2], ax = axes[axesIndex // 4][axesIndex % 4])
-        if axesIndex % 4 == 0:
+def binary_screen(df, target, columns = None, weights = None, target_value = 0,
+                  correction = 'fdr_bh'):
+    """
+    Compares, for every binary feature at once, the proportion of respondents with
+    target == target_value (by default non-voters) among those answering 0 and those answering 1,
+    with a two-proportion z-test. All counts come from one matrix product of the 0/1 indicators
+    of the features with the target.
+
+    INPUT:
+    - df: DataFrame holding the features (and the target if it is given by name)
+    - target: name of the target column, or array of target values
+    - columns: features to screen; defaults to every column whose values are all 0, 1 or missing
+      (binary, one-hot and '_dk' columns) other than the target
+    - weights: optional name of a weight column, or array of survey weights; the weighted test
+      uses weighted proportions and Kish effective sample sizes
+    - target_value: target value whose proportion is compared
+    - correction: multiple testing correction of the p-values, 'fdr_bh' (Benjamini-Hochberg),
+      'bonferroni' or None
+
+    OUTPUT:
+    - DataFrame indexed by feature with the columns n0, n1 (respondents answering 0 and 1),
+      p0, p1 (proportions of target_value), difference (p1 - p0), z, p_value and p_adjusted,
+      and with weights also p0_w, p1_w, difference_w, z_w, p_value_w and p_adjusted_w
+    """
+    if columns is None:
+        columns = [column for column in binary_columns(df) if column != target]
+    target = df[target] if isinstance(target, str) else target
+    target = np.asarray(target, dtype = np.float64)
+    X = df.loc[:, list(columns)].to_numpy(dtype = np.float64)
+    keep = ~np.isnan(target)
+    X, hit = X[keep], (target[keep] == target_value).astype(np.float64)
+
+    # Columns of indicators: answered 0, then answered 1
+    indicators = np.hstack([X == 0, X == 1]).astype(np.float64)
+    k = X.shape[1]
+    counts, hits = np.vstack([np.ones_like(hit), hit]).dot(indicators)
+    screen = pd.DataFrame({'n0': counts[:k], 'n1': counts[k:]}, index = pd.Index(columns))
+    screen['p0'], screen['p1'], screen['difference'], screen['z'], screen['p_value'] = \
+        _two_proportion_test(hits[:k], counts[:k], hits[k:], counts[k:], counts[:k], counts[k:])
+    screen['p_adjusted'] = adjust_p_values(screen.p_value.to_numpy(), correction)
+
+    if weights is not None:
+        w = df[weights] if isinstance(weights, str) else weights
+        w = np.asarray(w, dtype = np.float64)[keep]
+        totals, weighted_hits, squares = np.vstack([w, w * hit, w**2]).dot(indicators)
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            effective = totals**2 / squares
+        p0, p1, difference, z, p_value = _two_proportion_test(
+            weighted_hits[:k], totals[:k], weighted_hits[k:], totals[k:],
+            effective[:k], effective[k:])
+        screen['p0_w'], screen['p1_w'], screen['difference_w'] = p0, p1, difference
+        screen['z_w'], screen['p_value_w'] = z, p_value
+        screen['p_adjusted_w'] = adjust_p_values(p_value, correction)
+    return screen
+
+def binary_columns(df):
+    """
+    Returns the columns of df whose non-missing values are all 0 or 1.
+    """
+    df = df.select_dtypes(include = [np.number, bool])
+    values = df.to_numpy(dtype = np.float64)
+    binary = ((values == 0) | (values == 1) | np.isnan(values)).all(axis = 0)
+    return list(df.columns[binary])
+
+def adjust_p_values(p_values, correction = 'fdr_bh'):
+    """
+    Returns p-values adjusted for multiple testing with the Benjamini-Hochberg ('fdr_bh') or
+    Bonferroni ('bonferroni') procedure; missing p-values are ignored and stay missing.
+    """
+    p_values = np.asarray(p_values, dtype = np.float64)
+    if correction is None:
+        return p_values
+    adjusted = np.full_like(p_values, np.nan)
+    valid = ~np.isnan(p_values)
+    p = p_values[valid]
+    m = len(p)
+    if correction == 'bonferroni':
+        adjusted[valid] = np.minimum(p * m, 1)
+    elif correction == 'fdr_bh':
+        order = np.argsort(p)
+        scaled = p[order] * m / np.arange(1, m + 1)
+        # Running minimum from the largest p-value down keeps the adjusted values monotonic
+        scaled = np.minimum.accumulate(scaled[::-1])[::-1]
+        adjusted_valid = np.empty(m)
+        adjusted_valid[order] = np.minimum(scaled, 1)
+        adjusted[valid] = adjusted_valid
+    else:
+        raise ValueError('Unknown correction {}.'.format(correction))
+    return adjusted
+
+def plot_screen(screen, feature_key = None, weighted = False, ncols = 4):
+    """
+    Draws one bar plot per screened feature (rows of the output of binary_screen) showing the
+    proportion of the target value among respondents answering No and Yes.
+
+    INPUT:
+    - screen: DataFrame returned by binary_screen, e.g. filtered to significant features
+    - feature_key: optional dict from feature names to descriptions used in the titles
+    - weighted: whether to plot the weighted proportions
+    - ncols: number of plots per row
+    """
+    suffix = '_w' if weighted else ''
+    num_plots = len(screen)
+    fig, axes = plt.subplots(num_plots // ncols + 1, ncols, figsize = (10, .7 * num_plots),
+                             squeeze = False)
+    for axesIndex, (name, row) in enumerate(screen.iterrows()):
+        g = sns.barplot(x = [0, 1], y = [row['p0' + suffix], row['p1' + suffix]],
+                        ax = axes[axesIndex // ncols][axesIndex % ncols])
+        if axesIndex % ncols == 0:
             g.set_ylabel('Proportion NV\nper response')
-        
-        z = np.abs((p1 - p2) / np.sqrt(p1 * (1-p1) / n1 + p2 * (1-p2) / n2))
-        p_value = 2 * (1 - norm.cdf(z))
-        feature_name = wrap_text(featureKey[df.columns[index]])
-        title = feature_name + '\n' + '('+ df.columns[index] + ')' + '\np = ' + str(p_value)
+        title = '(' + name + ')' + '\np = ' + str(row['p_value' + suffix])
+        if feature_key is not None and name in feature_key:
+            title = wrap_text(feature_key[name]) + '\n' + title
         g.set_title(title)
         g.set_xticklabels(['No','Yes'])
-        #g.set_xlabel(feature)
-        
-        p_list.append([abs(p1-p2), p_value, df.columns[index]])
     fig.tight_layout()
-    return p_list
\ No newline at end of file
+    return fig
+
+def binary_vs_target(firstFeatureName, lastFeatureName, targetName, featureKey, df):
+    firstIndex = df.columns.get_loc(firstFeatureName)
+    lastIndex = df.columns.get_loc(lastFeatureName)
+    columns = list(df.columns[firstIndex:lastIndex + 1])
+    screen = binary_screen(df, targetName, columns, correction = None)
+    plot_screen(screen, featureKey)
+    return [[abs(row.difference), row.p_value, name] for name, row in screen.iterrows()]
+
+def _two_proportion_test(x0, n0, x1, n1, m0, m1):
+    """
+    Two-sided two-proportion z-test of x0 / n0 against x1 / n1, with the variance of each
+    proportion estimated from m0 and m1 observations.
+    """
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        p0 = x0 / n0
+        p1 = x1 / n1
+        z = np.abs((p0 - p1) / np.sqrt(p0 * (1 - p0) / m0 + p1 * (1 - p1) / m1))
+    p_value = 2 * norm.sf(z)
+    return p0, p1, p1 - p0, z, p_value
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+These helper functions filter respondents and features from a survey CSV without loading the
+whole file into memory.
+
+"""
+
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from helpers.profiling import profiled
+
+@profiled
+def filter_csv(in_path, out_path, row_filter, drop_columns = (), min_count = 0,
+               chunksize = 5000, dtype = None, encoding = 'utf-8'):
+    """
+    Streams in_path in chunks, keeps the rows selected by row_filter, drops drop_columns and
+    every column with fewer than min_count non-null values among the kept rows, and writes the
+    result (with the original row labels as index) to out_path.
+
+    The column threshold is decided in a single pass over in_path by keeping running non-null
+    counts per column. Kept rows are spooled to a temporary file next to out_path, which is then
+    re-read with only the surviving columns. Peak memory is bounded by the chunk size rather
+    than by the size of in_path.
+
+    INPUT:
+    - in_path: path of the CSV to filter
+    - out_path: path of the filtered CSV
+    - row_filter: function mapping a DataFrame chunk to a boolean Series of rows to keep
+    - drop_columns: columns to remove after row_filter has been applied
+    - min_count: minimum number of non-null values a column needs to be kept
+    - chunksize: number of rows read at a time
+    - dtype: dtype argument passed on to pd.read_csv, e.g. to force string coded columns used
+      by row_filter to be read as strings
+    - encoding: encoding of in_path
+
+    OUTPUT:
+    - num_rows: number of respondents written to out_path
+    - columns: Index of the columns written to out_path
+    """
+    counts = None
+    float_columns = set()
+    object_columns = set()
+    num_rows = 0
+
+    spool = tempfile.NamedTemporaryFile('w', suffix = '.csv', delete = False, encoding = 'utf-8',
+                                        dir = os.path.dirname(os.path.abspath(out_path)))
+    try:
+        with spool:
+            reader = pd.read_csv(in_path, chunksize = chunksize, dtype = dtype,
+                                 encoding = encoding)
+            for chunk in reader:
+                chunk = chunk.loc[np.asarray(row_filter(chunk), dtype = bool)]
+                chunk = chunk.drop(list(drop_columns), axis = 1)
+                chunk_counts = chunk.notnull().sum(axis = 0)
+                counts = chunk_counts if counts is None else counts + chunk_counts
+                kinds = chunk.dtypes.map(lambda x: x.kind)
+                float_columns.update(kinds.index[kinds == 'f'])
+                object_columns.update(kinds.index[kinds == 'O'])
+                chunk.to_csv(spool, header = spool.tell() == 0)
+                num_rows += len(chunk)
+
+        columns = counts.index[counts >= min_count]
+
+        # Columns inferred as float in any chunk are float in the whole file, as they would be
+        # had the file been read at once.
+        out_dtype = {column: np.float64 for column in columns
+                     if column in float_columns and column not in object_columns}
+        header = True
+        reader = pd.read_csv(spool.name, index_col = 0, chunksize = chunksize,
+                             usecols = lambda x: x in columns or x.startswith('Unnamed: 0'),
+                             dtype = out_dtype)
+        with open(out_path, 'w', encoding = 'utf-8') as out_file:
+            for chunk in reader:
+                chunk.index.name = None
+                chunk.loc[:, columns].to_csv(out_file, header = header)
+                header = False
+    finally:
+        os.remove(spool.name)
+
+    return num_rows, columns
@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+These helper functions update the turnout models with a new survey wave instead of retraining
+them on every year before the cutoff. The imputation medians are kept as value counts of every
+column and the Normalizer statistics as counts, means and sums of squared deviations of the
+observed values, so that both are updated from the rows of the new wave alone and give the
+statistics of SimpleImputer and Normalizer fitted on the whole history.
+
+Models supporting partial_fit are fitted to convergence on the first wave and updated with every
+later wave only. BernoulliNB adds the counts of the wave. SGDClassifier would converge to the
+logistic regression of the latest wave alone, forgetting the earlier ones, so logistic regression
+is fitted by IncrementalLogisticRegression, which keeps a second-order expansion of the loss of
+the earlier waves instead of their rows. scikit-learn cannot warm-start SVC or
+AdaBoostClassifier: SVC is refitted on its support vectors and the new wave, AdaBoostClassifier
+on the whole history.
+compare_with_refit measures how far an updated model is from the same model retrained from
+scratch.
+
+"""
+
+from collections import OrderedDict
+import time
+import numpy as np
+import pandas as pd
+from scipy.special import expit
+from sklearn.base import BaseEstimator, ClassifierMixin, TransformerMixin, clone
+from sklearn.ensemble import AdaBoostClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.metrics import roc_auc_score
+from sklearn.naive_bayes import BernoulliNB
+from sklearn.pipeline import Pipeline
+from sklearn.svm import SVC
+from helpers.machine_learning import Normalizer, merge_moments
+from helpers.profiling import profiled
+
+STRATEGIES = ['partial_fit', 'support_vectors', 'refit']
+
+class IncrementalPreprocessing(BaseEstimator, TransformerMixin):
+    """
+    Median imputation followed by Normalizer, as helpers.backtest.preprocessing, whose
+    statistics can be updated with new rows by partial_fit. Columns without any observed value
+    are imputed with 0 (SimpleImputer drops them).
+
+    INPUT:
+    - binary: whether the Normalizer standardizes binary columns too
+    - standardize: whether to apply the Normalizer; if False, the imputed values are returned
+      in their own units
+    - dtype: dtype of the output
+    """
+
+    def __init__(self, binary = False, standardize = True, dtype = np.float64):
+        self.binary = binary
+        self.standardize = standardize
+        self.dtype = dtype
+
+    def fit(self, X, y = None):
+        for attribute in ['observed_', 'n_missing_', 'values_', 'counts_']:
+            if hasattr(self, attribute):
+                delattr(self, attribute)
+        return self.partial_fit(X, y)
+
+    @profiled
+    def partial_fit(self, X, y = None):
+        """
+        Adds a batch of rows to the value counts and moments of every column.
+        """
+        X = _as_array(X)
+        missing = np.isnan(X)
+        if not hasattr(self, 'observed_'):
+            self.observed_ = Normalizer()
+            self.n_missing_ = np.zeros(X.shape[1])
+            self.values_ = [np.empty(0) for _ in range(X.shape[1])]
+            self.counts_ = [np.empty(0, dtype = np.int64) for _ in range(X.shape[1])]
+        # Normalizer ignores missing values, so observed_ holds the moments of the observed values
+        self.observed_.partial_fit(X)
+        self.n_missing_ = self.n_missing_ + missing.sum(axis = 0)
+        for j in range(X.shape[1]):
+            values, counts = np.unique(X[~missing[:, j], j], return_counts = True)
+            if len(self.values_[j]):
+                values, inverse = np.unique(np.concatenate([self.values_[j], values]),
+                                            return_inverse = True)
+                counts = np.bincount(inverse, np.concatenate([self.counts_[j], counts]),
+                                     minlength = len(values)).astype(np.int64)
+            self.values_[j], self.counts_[j] = values, counts
+        return self._set_statistics()
+
+    def _set_statistics(self):
+        self.statistics_ = np.array([_median(values, counts)
+                                     for values, counts in zip(self.values_, self.counts_)])
+        observed = self.observed_
+        # The imputed values of a column are n_missing_ copies of its median
+        counts, means, M2 = merge_moments(observed.n_samples_seen_, observed.mean_, observed.M2_,
+                                          self.n_missing_, self.statistics_,
+                                          np.zeros_like(self.statistics_))
+        imputed = self.n_missing_ > 0
+        lows = np.where(imputed, np.minimum(observed.lows_, self.statistics_), observed.lows_)
+        highs = np.where(imputed, np.maximum(observed.highs_, self.statistics_), observed.highs_)
+        # A median between the two values of a binary column (an even split) is a third value
+        many = observed.many_ | (imputed & (self.statistics_ != lows) &
+                                 (self.statistics_ != highs))
+        self.normalizer_ = Normalizer.from_moments(counts, means, M2, lows, highs, many,
+                                                   binary = self.binary, copy = False,
+                                                   dtype = self.dtype)
+        return self
+
+    @profiled
+    def transform(self, X):
+        X = _as_array(X)
+        X = np.where(np.isnan(X), self.statistics_, X)
+        if not self.standardize:
+            return X.astype(self.dtype, copy = False)
+        return self.normalizer_.transform(X)
+
+    def scaling(self):
+        """
+        Returns the mean and scale applied to every column (0 and 1 for unscaled columns).
+        """
+        means, scales = np.zeros(len(self.statistics_)), np.ones(len(self.statistics_))
+        if not self.standardize:
+            return means, scales
+        means[self.normalizer_.columns_] = self.normalizer_.means
+        scales[self.normalizer_.columns_] = self.normalizer_.scales_
+        return means, scales
+
+class IncrementalModel(BaseEstimator, ClassifierMixin):
+    """
+    Classifier behind IncrementalPreprocessing that is updated with a new wave by partial_fit.
+
+    INPUT:
+    - estimator: binary classifier
+    - strategy: how a wave is folded in:
+      - 'partial_fit': the estimator is fitted on the first wave and its partial_fit is called
+        on every later wave only, passes times in random order. The coefficients of a linear
+        model are first rescaled to the updated Normalizer statistics, so that its decision
+        function on the earlier rows is unchanged.
+      - 'support_vectors': the estimator (an SVC) is refitted on the rows that were support
+        vectors of the previous fit and the wave; only the support vectors are kept.
+      - 'refit': the estimator is refitted on every row seen, which are kept.
+    - passes: number of passes of partial_fit over every later wave, e.g. several for
+      SGDClassifier; 1 for estimators that fold in a wave in one call, such as BernoulliNB and
+      IncrementalLogisticRegression, which would otherwise count it several times
+    - random_state: seed of the order of the rows of every pass
+    - binary: whether the Normalizer standardizes binary columns too
+    - standardize: whether the estimator gets standardized columns; if False, it gets the
+      imputed columns in their own units, e.g. for BernoulliNB, which binarizes at a fixed
+      threshold that moving Normalizer means would shift between waves
+    """
+
+    def __init__(self, estimator, strategy = 'partial_fit', passes = 1, random_state = 0,
+                 binary = False, standardize = True):
+        self.estimator = estimator
+        self.strategy = strategy
+        self.passes = passes
+        self.random_state = random_state
+        self.binary = binary
+        self.standardize = standardize
+
+    def fit(self, X, y):
+        for attribute in ['model_', 'preprocessing_', 'X_', 'y_', 'missing_counts_']:
+            if hasattr(self, attribute):
+                delattr(self, attribute)
+        self.n_waves_ = 0
+        return self.partial_fit(X, y)
+
+    @profiled
+    def partial_fit(self, X, y):
+        """
+        Folds a wave of rows into the preprocessing statistics and the model.
+        """
+        if self.strategy not in STRATEGIES:
+            raise ValueError('Unknown strategy {}; use one of {}.'.format(
+                self.strategy, ', '.join(STRATEGIES)))
+        X, y = _as_array(X), np.asarray(y, dtype = bool)
+        if not hasattr(self, 'preprocessing_'):
+            self.preprocessing_ = IncrementalPreprocessing(binary = self.binary,
+                                                           standardize = self.standardize)
+            self.n_waves_ = 0
+        fitted = hasattr(self, 'model_')
+        if fitted:
+            statistics = self.preprocessing_.statistics_
+            previous = self.preprocessing_.scaling()
+        self.preprocessing_.partial_fit(X)
+
+        if self.strategy == 'partial_fit':
+            if not fitted:
+                # The first wave is fitted to convergence, as a retraining would be
+                self.model_ = clone(self.estimator).fit(self.preprocessing_.transform(X), y)
+            else:
+                self._update(X, y, statistics, previous)
+            # Missing values of every class, whose binarized imputations BernoulliNB has counted
+            missing = np.vstack([np.isnan(X[y == c]).sum(axis = 0) for c in self.model_.classes_])
+            self.missing_counts_ = missing if not fitted else self.missing_counts_ + missing
+        else:
+            if fitted:
+                X, y = np.vstack([self.X_, X]), np.concatenate([self.y_, y])
+            self.model_ = clone(self.estimator).fit(self.preprocessing_.transform(X), y)
+            if self.strategy == 'support_vectors':
+                X, y = X[self.model_.support_], y[self.model_.support_]
+            self.X_, self.y_ = X, y
+        self.classes_ = self.model_.classes_
+        self.n_waves_ += 1
+        return self
+
+    def predict_proba(self, X):
+        return self.model_.predict_proba(self.preprocessing_.transform(X))
+
+    def predict(self, X):
+        return self.model_.predict(self.preprocessing_.transform(X))
+
+    def _update(self, X, y, statistics, previous):
+        # statistics and previous are the imputation medians and scaling before the wave
+        if hasattr(self.model_, 'feature_count_') and not self.standardize:
+            _update_binarized_counts(self.model_, self.missing_counts_, statistics,
+                                     self.preprocessing_.statistics_)
+        if hasattr(self.model_, 'coef_'):
+            # The decision function is compared on the rows of the wave imputed as before,
+            # since the rescaling does not depend on the rows
+            current = self.preprocessing_.scaling()
+            before = _linear_decision(self.model_, _standardize(X, statistics, *previous))
+            if hasattr(self.model_, 'rescale'):
+                self.model_.rescale(previous, current)
+            else:
+                _rescale_linear(self.model_, previous, current)
+            after = _linear_decision(self.model_, _standardize(X, statistics, *current))
+            if not np.allclose(before, after):
+                raise RuntimeError('Rescaling changed the decision function of the model.')
+        Z = self.preprocessing_.transform(X)
+        rng = np.random.RandomState(self.random_state + self.n_waves_)
+        for _ in range(self.passes):
+            order = rng.permutation(len(y))
+            self.model_.partial_fit(Z[order], y[order], classes = [False, True])
+
+class IncrementalLogisticRegression(BaseEstimator, ClassifierMixin):
+    """
+    L2-regularized logistic regression, as LogisticRegression with the lbfgs solver, whose
+    partial_fit folds in a batch of rows without the earlier ones. The log loss of the earlier
+    rows is kept as its gradient and Hessian at the last coefficients, and the coefficients are
+    found by Newton's method on the loss of the batch plus this expansion. The first fit is
+    exact; later ones differ from a retraining only as far as the loss of the earlier rows is
+    not quadratic between the old and the new coefficients, which grows with the number of
+    columns relative to the rows of a wave.
+
+    INPUT:
+    - C: inverse of the regularization strength, as in LogisticRegression
+    - tol: largest change of a coefficient at which Newton's method stops
+    - max_iter: largest number of Newton steps per batch
+    """
+
+    def __init__(self, C = 1.0, tol = 1e-6, max_iter = 100):
+        self.C = C
+        self.tol = tol
+        self.max_iter = max_iter
+
+    def fit(self, X, y):
+        for attribute in ['coef_', 'intercept_', 'gradient_', 'hessian_']:
+            if hasattr(self, attribute):
+                delattr(self, attribute)
+        return self.partial_fit(X, y)
+
+    def partial_fit(self, X, y, classes = None):
+        """
+        Fits the coefficients to a batch of rows and the expansion of the loss of the earlier
+        ones, and adds the loss of the batch to the expansion.
+        """
+        X = _as_array(X)
+        if not hasattr(self, 'coef_'):
+            self.classes_ = np.unique(y) if classes is None else np.asarray(classes)
+            if len(self.classes_) != 2:
+                raise ValueError('IncrementalLogisticRegression needs two classes.')
+            self.coef_, self.intercept_ = np.zeros((1, X.shape[1])), np.zeros(1)
+            self.gradient_ = np.zeros(X.shape[1] + 1)
+            self.hessian_ = np.zeros((X.shape[1] + 1, X.shape[1] + 1))
+        # The intercept is the last coefficient of X with a column of ones, and not penalized
+        X = np.hstack([X, np.ones((len(X), 1))])
+        targets = np.asarray(y) == self.classes_[1]
+        penalty = np.append(np.full(X.shape[1] - 1, 1. / self.C), 0.)
+        start = np.append(self.coef_.ravel(), self.intercept_)
+
+        def objective(theta):
+            z, shift = np.dot(X, theta), theta - start
+            return np.logaddexp(0, z).sum() - z[targets].sum() + np.dot(self.gradient_, shift) + \
+                np.dot(shift, np.dot(self.hessian_, shift)) / 2 + np.dot(penalty, theta ** 2) / 2
+
+        theta, loss = start.copy(), objective(start)
+        for self.n_iter_ in range(1, self.max_iter + 1):
+            p = expit(np.dot(X, theta))
+            gradient = np.dot(X.T, p - targets) + self.gradient_ + \
+                np.dot(self.hessian_, theta - start) + penalty * theta
+            hessian = np.dot(X.T * (p * (1 - p)), X) + self.hessian_ + np.diag(penalty)
+            step = np.linalg.solve(hessian, gradient)
+            # Newton steps are halved until the objective decreases
+            for _ in range(30):
+                new_loss = objective(theta - step)
+                if new_loss <= loss:
+                    break
+                step = step / 2
+            theta, loss = theta - step, new_loss
+            if np.abs(step).max() <= self.tol:
+                break
+        p = expit(np.dot(X, theta))
+        self.gradient_ = self.gradient_ + np.dot(self.hessian_, theta - start) + \
+            np.dot(X.T, p - targets)
+        self.hessian_ = self.hessian_ + np.dot(X.T * (p * (1 - p)), X)
+        self.coef_, self.intercept_ = theta[None, :-1], theta[-1:]
+        return self
+
+    def rescale(self, previous, current):
+        """
+        Changes the coefficients, fitted on columns standardized with the previous (means,
+        scales), and the expansion of the loss so that they give the same decision function and
+        loss on columns standardized with the current ones.
+        """
+        (means, scales), (new_means, new_scales) = previous, current
+        # The new coefficients are transform times the old ones
+        transform = np.diag(np.append(new_scales / scales, 1.))
+        transform[-1, :-1] = (new_means - means) / scales
+        inverse = np.linalg.inv(transform)
+        theta = np.dot(transform, np.append(self.coef_.ravel(), self.intercept_))
+        self.coef_, self.intercept_ = theta[None, :-1], theta[-1:]
+        self.gradient_ = np.dot(inverse.T, self.gradient_)
+        self.hessian_ = np.dot(np.dot(inverse.T, self.hessian_), inverse)
+        return self
+
+    def decision_function(self, X):
+        return np.dot(_as_array(X), self.coef_.ravel()) + self.intercept_[0]
+
+    def predict_proba(self, X):
+        p = expit(self.decision_function(X))
+        return np.column_stack([1 - p, p])
+
+    def predict(self, X):
+        return self.classes_[(self.decision_function(X) > 0).astype(int)]
+
+# (name, model) of the models of '05a Model Tuning and Evaluation' in incremental form;
+# BernoulliNB gets unstandardized columns, so that every wave is binarized at the same threshold
+# (0) and its counts add up to those of a retraining
+MODELS = [('lr', IncrementalModel(IncrementalLogisticRegression())),
+          ('ada', IncrementalModel(AdaBoostClassifier(), 'refit')),
+          ('bnb', IncrementalModel(BernoulliNB(), standardize = False)),
+          ('svm', IncrementalModel(SVC(probability = True, random_state = 0), 'support_vectors'))]
+
+@profiled
+def compare_with_refit(model, X, y, X_test, y_test = None, tolerance = 0.02):
+    """
+    Compares an incremental model with the same estimator retrained from scratch on all its
+    rows behind SimpleImputer and, if the model standardizes, Normalizer.
+
+    INPUT:
+    - model: IncrementalModel updated with every wave of X
+    - X, y: all rows the model was updated with
+    - X_test: rows on which the predicted probabilities are compared
+    - y_test: optional labels of X_test, to compare the ROC areas
+    - tolerance: largest mean absolute difference of the probabilities, and of the ROC areas,
+      accepted
+
+    OUTPUT:
+    - OrderedDict with the largest difference of the imputation medians and of the
+      standardization means and scales, the mean and largest absolute difference of the
+      probabilities, the share of test rows predicted alike at 0.5, the difference of the ROC
+      areas of the model and the retrained model (NaN without y_test), the seconds taken by
+      the retraining, and whether the statistics agree and the probabilities and ROC areas are
+      within tolerance
+    """
+    start = time.perf_counter()
+    steps = [('imp', SimpleImputer(strategy = 'median', keep_empty_features = True))]
+    if model.standardize:
+        steps.append(('scale', Normalizer(binary = model.binary)))
+    reference = Pipeline(steps + [('model', clone(model.estimator))]).fit(_as_array(X), y)
+    seconds = time.perf_counter() - start
+
+    imputer = reference.named_steps['imp']
+    preprocessing = model.preprocessing_
+    means, scales = preprocessing.scaling()
+    reference_means, reference_scales = np.zeros(len(means)), np.ones(len(scales))
+    if model.standardize:
+        normalizer = reference.named_steps['scale']
+        reference_means[normalizer.columns_] = normalizer.means
+        reference_scales[normalizer.columns_] = normalizer.scales_
+    statistics = [np.abs(preprocessing.statistics_ - imputer.statistics_).max(),
+                  np.abs(means - reference_means).max(), np.abs(scales - reference_scales).max()]
+
+    X_test = _as_array(X_test)
+    probabilities = model.predict_proba(X_test)[:, 1]
+    reference_probabilities = reference.predict_proba(X_test)[:, 1]
+    difference = np.abs(probabilities - reference_probabilities)
+    roc_auc_diff = np.nan if y_test is None else \
+        _roc_auc(y_test, probabilities) - _roc_auc(y_test, reference_probabilities)
+    return OrderedDict([('median_diff', statistics[0]), ('mean_diff', statistics[1]),
+                        ('scale_diff', statistics[2]),
+                        ('probability_diff', difference.mean()),
+                        ('probability_diff_max', difference.max()),
+                        ('agreement', ((probabilities > .5) ==
+                                       (reference_probabilities > .5)).mean()),
+                        ('roc_auc_diff', roc_auc_diff), ('refit_seconds', seconds),
+                        ('matches', bool(np.allclose(statistics, 0, atol = 1e-8) and
+                                         difference.mean() <= tolerance and
+                                         not abs(roc_auc_diff) > tolerance))])
+
+@profiled
+def incremental_backtest(blocks, cutoffs, models = MODELS, check = True, tolerance = 0.02):
+    """
+    Trains every model on the years before the first cutoff and folds in the years up to every
+    later cutoff as a new wave, evaluating on every cutoff year. Every feature is used, since
+    the columns of a model cannot change between waves.
+
+    INPUT:
+    - blocks: output of helpers.backtest.year_blocks
+    - cutoffs: test years, e.g. [2004, 2008, 2012]
+    - models: list of (name, IncrementalModel) pairs
+    - check: whether to compare every updated model with compare_with_refit
+    - tolerance: tolerance of compare_with_refit
+
+    OUTPUT:
+    - DataFrame with one row per cutoff and model holding the number of rows of the wave and
+      of the history, the seconds taken by the update, the test ROC area and, if check is
+      True, the columns of compare_with_refit
+    """
+    cutoffs = sorted(cutoffs)
+    if cutoffs[-1] not in blocks or not [year for year in blocks if year < cutoffs[0]]:
+        raise ValueError('No training or test data for cutoffs {}.'.format(cutoffs))
+    models = [(name, clone(model)) for name, model in models]
+    history, rows, previous = [], [], None
+    for cutoff in cutoffs:
+        years = [year for year in blocks
+                 if year < cutoff and (previous is None or year >= previous)]
+        X_wave = _as_array(pd.concat([blocks[year]['X'] for year in years]))
+        y_wave = np.concatenate([blocks[year]['y'] for year in years])
+        history.append((X_wave, y_wave))
+        X_test, y_test = _as_array(blocks[cutoff]['X']), blocks[cutoff]['y']
+        for name, model in models:
+            start = time.perf_counter()
+            if previous is None:
+                model.fit(X_wave, y_wave)
+            else:
+                model.partial_fit(X_wave, y_wave)
+            row = OrderedDict([('cutoff', cutoff), ('model', name), ('n_wave', len(y_wave)),
+                               ('n_train', sum(len(y) for _, y in history)),
+                               ('seconds', time.perf_counter() - start),
+                               ('roc_auc', _roc_auc(y_test, model.predict_proba(X_test)[:, 1]))])
+            if check:
+                row.update(compare_with_refit(model, np.vstack([X for X, _ in history]),
+                                              np.concatenate([y for _, y in history]), X_test,
+                                              y_test, tolerance))
+            rows.append(row)
+        previous = cutoff
+    return pd.DataFrame(rows)
+
+def _update_binarized_counts(model, missing_counts, statistics, new_statistics):
+    """
+    Corrects the feature counts of a BernoulliNB fitted on imputed columns in their own units
+    for the earlier missing values whose imputation (the median) moved across the binarization
+    threshold, so that they are counted as a retraining would count them. The next partial_fit
+    recomputes the feature probabilities from the counts.
+    """
+    if model.binarize is None:
+        return
+    change = (new_statistics > model.binarize).astype(float) - (statistics > model.binarize)
+    model.feature_count_ = model.feature_count_ + missing_counts * change
+
+def _rescale_linear(model, previous, current):
+    """
+    Changes coef_ and intercept_ of a linear model fitted on columns standardized with the
+    previous (means, scales) so that it gives the same decision function on columns standardized
+    with the current ones.
+    """
+    if getattr(model, 'average', False):
+        # partial_fit of averaged SGD resumes from private coefficients, not from coef_
+        raise ValueError('Linear models with average = True cannot be rescaled.')
+    (means, scales), (new_means, new_scales) = previous, current
+    weights = model.coef_ / scales
+    model.intercept_ = model.intercept_ + np.dot(weights, new_means - means)
+    model.coef_ = np.ascontiguousarray(weights * new_scales)
+
+def _linear_decision(model, Z):
+    return np.dot(Z, model.coef_.T) + model.intercept_
+
+def _standardize(X, statistics, means, scales):
+    return (np.where(np.isnan(X), statistics, X) - means) / scales
+
+def _median(values, counts):
+    """
+    Returns the median of the values repeated counts times (0 if there are none).
+    """
+    if not len(values):
+        return 0.
+    cumulative = np.cumsum(counts)
+    total = cumulative[-1]
+    lower = values[np.searchsorted(cumulative, (total - 1) // 2, side = 'right')]
+    upper = values[np.searchsorted(cumulative, total // 2, side = 'right')]
+    return (lower + upper) / 2.
+
+def _as_array(X):
+    if isinstance(X, pd.DataFrame):
+        return X.to_numpy(dtype = np.float64)
+    return np.asarray(X, dtype = np.float64)
+
+def _roc_auc(y, y_pred):
+    return roc_auc_score(y, y_pred) if len(np.unique(y)) == 2 else np.nan
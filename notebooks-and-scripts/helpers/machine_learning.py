@@ -7,71 +7,255 @@ Created on Fri Mar 24 20:56:50 2017
 """
 import numpy as np
 import pandas as pd
-from sklearn.base import TransformerMixin
-
-class Normalizer(TransformerMixin):
-    
-    standard_deviations = np.array
-    means = np.array
-    numeric_indices = np.array
-    binary = bool
-    
-    def __init__(self, binary = False):
+from joblib import Parallel, delayed
+from scipy import sparse
+from sklearn.base import BaseEstimator, ClassifierMixin, TransformerMixin, clone
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import StratifiedKFold
+from sklearn.pipeline import make_pipeline
+from helpers.profiling import profiled
+
+class Normalizer(BaseEstimator, TransformerMixin):
+    """
+    Standardizes every column with more than two distinct values to zero mean and unit variance
+    and leaves binary columns (e.g. one-hot and '_dk' columns) unchanged. With binary = True,
+    binary columns are standardized as well. Missing values are ignored by the statistics and
+    left missing.
+
+    Accepts arrays, DataFrames and scipy sparse matrices. Sparse input is expected to be free of
+    missing values; its binary columns stay sparse and only the standardized columns are
+    densified.
+
+    INPUT:
+    - binary: whether to standardize binary columns too
+    - copy: if False, dense input of the output dtype is standardized in place
+    - dtype: dtype of the output, e.g. np.float32 to halve memory
+    """
+
+    def __init__(self, binary = False, copy = True, dtype = np.float64):
         self.binary = binary
-        
-    def fit(self, df, y = None):
-        df = pd.DataFrame(df)
-        num_unique = np.array([df.iloc[:,i].nunique() for i in range(0, df.shape[1])]) 
-        self.numeric_indices = num_unique > 2
-        self.means = df.iloc[:,self.numeric_indices].mean()
-        #self.standard_deviations = np.std(df, axis = 0)
-        self.standard_deviations = df.iloc[:,self.numeric_indices].std(ddof = 0)   
+        self.copy = copy
+        self.dtype = dtype
+
+    @profiled
+    def fit(self, X, y = None):
+        for attribute in ['n_samples_seen_', 'lows_']:
+            if hasattr(self, attribute):
+                delattr(self, attribute)
+        return self.partial_fit(X, y)
+
+    @profiled
+    def partial_fit(self, X, y = None):
+        """
+        Updates the column statistics with a batch of rows, so that the statistics of data too
+        large for memory can be computed in chunks.
+        """
+        if sparse.issparse(X):
+            X = sparse.csr_matrix(X, dtype = np.float64)
+            X.sum_duplicates()
+            counts = np.full(X.shape[1], X.shape[0], dtype = np.float64)
+            means = np.asarray(X.mean(axis = 0)).ravel()
+            M2 = np.asarray(X.multiply(X).sum(axis = 0)).ravel() - counts * means**2
+            lows = X.min(axis = 0).toarray().ravel()
+            highs = X.max(axis = 0).toarray().ravel()
+            coo = X.tocoo()
+            inner = (coo.data != lows[coo.col]) & (coo.data != highs[coo.col])
+            many = np.bincount(coo.col[inner], minlength = X.shape[1]) > 0
+            # Implicit zeros are values too: a column with -1, 0 and 1 has three distinct values
+            # even if the zeros are not stored
+            implicit = np.bincount(coo.col, minlength = X.shape[1]) < X.shape[0]
+            many |= implicit & (lows < 0) & (highs > 0)
+        else:
+            X = np.asarray(X, dtype = np.float64)
+            missing = np.isnan(X)
+            counts = (~missing).sum(axis = 0).astype(np.float64)
+            with np.errstate(invalid = 'ignore', divide = 'ignore'):
+                means = np.where(missing, 0, X).sum(axis = 0) / counts
+                M2 = np.where(missing, 0, (X - means)**2).sum(axis = 0)
+            empty = counts == 0
+            means[empty], M2[empty] = 0, 0
+            lows = np.where(missing, np.inf, X).min(axis = 0)
+            highs = np.where(missing, -np.inf, X).max(axis = 0)
+            many = ((X != lows) & (X != highs) & ~missing).any(axis = 0)
+
+        if not hasattr(self, 'n_samples_seen_'):
+            self.n_samples_seen_, self.mean_, self.M2_ = counts, means, M2
+            self.lows_, self.highs_, self.many_ = lows, highs, many
+        else:
+            self.n_samples_seen_, self.mean_, self.M2_ = merge_moments(
+                self.n_samples_seen_, self.mean_, self.M2_, counts, means, M2)
+            # A column has more than two distinct values if either batch does, or if the
+            # extremes of the two batches are more than two distinct values
+            extremes = np.sort(np.vstack([self.lows_, self.highs_, lows, highs]), axis = 0)
+            extremes = np.where(np.isinf(extremes), np.nan, extremes)
+            distinct = (np.diff(extremes, axis = 0) > 0).sum(axis = 0) + \
+                (~np.isnan(extremes)).any(axis = 0)
+            self.many_ = self.many_ | many | (distinct > 2)
+            self.lows_ = np.minimum(self.lows_, lows)
+            self.highs_ = np.maximum(self.highs_, highs)
+        return self._set_scaling()
+
+    @classmethod
+    def from_moments(cls, counts, means, M2, lows, highs, many, **params):
+        """
+        Returns a Normalizer fitted to column statistics computed elsewhere, e.g. by
+        helpers.incremental.IncrementalPreprocessing.
+
+        INPUT:
+        - counts, means, M2: number of non-missing values, mean and sum of squared deviations
+          from the mean of every column
+        - lows, highs: lowest and highest value of every column
+        - many: whether every column has more than two distinct values
+        - params: parameters of the Normalizer, e.g. binary
+        """
+        normalizer = cls(**params)
+        normalizer.n_samples_seen_ = np.asarray(counts, dtype = np.float64)
+        normalizer.mean_ = np.asarray(means, dtype = np.float64)
+        normalizer.M2_ = np.asarray(M2, dtype = np.float64)
+        normalizer.lows_, normalizer.highs_ = np.asarray(lows), np.asarray(highs)
+        normalizer.many_ = np.asarray(many, dtype = bool)
+        return normalizer._set_scaling()
+
+    def _set_scaling(self):
+        self.numeric_indices = self.many_
+        self.columns_ = np.flatnonzero(np.ones_like(self.many_) if self.binary else self.many_)
+        self.means = self.mean_[self.columns_]
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            self.standard_deviations = np.sqrt(self.M2_ / self.n_samples_seen_)[self.columns_]
+        # Constant columns are centred but not scaled
+        self.scales_ = np.where(self.standard_deviations > 0, self.standard_deviations, 1)
         return self
-                      
-        
-    def transform(self, df):
-        df = pd.DataFrame(df)
-        if self.binary:
-            df = (df - self.means) / self.standard_deviations
+
+    @profiled
+    def transform(self, X):
+        if sparse.issparse(X):
+            return self._transform_sparse(X)
+        if isinstance(X, pd.DataFrame):
+            X = X.to_numpy(dtype = self.dtype, copy = self.copy)
         else:
-            df.iloc[:,self.numeric_indices] = \
-            (df.iloc[:,self.numeric_indices] - self.means) / self.standard_deviations
-        return np.array(df)
-    
-    #def fit_transform(self, df, *_):
-        #self.fit(df)
-        #df = self.transform(df)
-        #return df
-        
-        
-class SoftVotingClassifier:
-    def __init__(self, estimators, weights = None, print_cv = True):
-        self.estimators = estimators
-        self.n = len(estimators)
-        if weights == None:
-            self.weights = np.ones(self.n)
+            X = np.array(X, dtype = self.dtype, copy = self.copy or None)
+        if len(self.columns_) == X.shape[1]:
+            X -= self.means.astype(X.dtype)
+            X /= self.scales_.astype(X.dtype)
         else:
-            self.weights = weights
-        self.blending = LinearRegression()
-        self.print_cv = print_cv
-        
-    def fit(self, X_train_list, y_train):
-        assert(self.n == len(X_train_list))
-        predict_probas = np.zeros([len(y_train), self.n])
-        for i in range(0, self.n):
-            self.estimators[i].fit(X_train_list[i], y_train)
-            predict_probas[:,i] = self.estimators[i].predict_proba(X_train_list[i])[:,1]
-            
-        y_pred = np.dot(predict_probas, self.weights) / self.weights.sum()
-        
-        return y_pred, predict_probas
-    
-    def predict_proba(self, X_test_list, y_test):
-        assert(self.n == len(X_train_list))
-        predict_probas = np.zeros([len(y_test), self.n])
-        for i in range(0, self.n):
-            predict_probas[:,i] = self.estimators[i].predict_proba(X_test_list[i])[:,1]
-        
-        y_pred = np.dot(predict_probas, self.weights) / self.weights.sum()
-        
-        return y_pred
\ No newline at end of file
+            X[:, self.columns_] = (X[:, self.columns_] - self.means) / self.scales_
+        return X
+
+    def _transform_sparse(self, X):
+        X = sparse.csc_matrix(X, dtype = self.dtype)
+        numeric = (X[:, self.columns_].toarray() - self.means) / self.scales_
+        if len(self.columns_) == X.shape[1]:
+            return numeric.astype(self.dtype)
+        others = np.flatnonzero(~np.isin(np.arange(X.shape[1]), self.columns_))
+        stacked = sparse.hstack([sparse.csc_matrix(numeric.astype(self.dtype)), X[:, others]],
+                                format = 'csc')
+        # Put the columns back in their original order
+        order = np.argsort(np.concatenate([self.columns_, others]))
+        return stacked[:, order].tocsr()
+
+class SubsetStackingClassifier(BaseEstimator, ClassifierMixin):
+    """
+    Stacked ensemble of binary classifiers, each trained on its own feature subset. The base
+    models are fitted in parallel worker processes, once per cross-validation fold and once on
+    the whole data; their out-of-fold probabilities of the positive class are the training data
+    of the blender, so that the blender never sees probabilities of rows a model was fitted on.
+
+    INPUT:
+    - estimators: list of (name, estimator, columns) tuples; columns selects the DataFrame
+      columns (or array column indices) the estimator uses, None for all of them
+    - blender: classifier fitted on the out-of-fold probabilities; defaults to logistic
+      regression
+    - preprocessing: optional transformer (e.g. a pipeline of Imputer and Normalizer) fitted
+      for every base model on its own training rows and columns
+    - cv: number of stratified folds, or a cross-validation splitter
+    - n_jobs: number of worker processes
+    """
+
+    def __init__(self, estimators, blender = None, preprocessing = None, cv = 5, n_jobs = -1):
+        self.estimators = estimators
+        self.blender = blender
+        self.preprocessing = preprocessing
+        self.cv = cv
+        self.n_jobs = n_jobs
+
+    @profiled
+    def fit(self, X, y):
+        y = np.asarray(y)
+        cv = StratifiedKFold(self.cv) if isinstance(self.cv, int) else self.cv
+        folds = list(cv.split(np.zeros((len(y), 1)), y))
+        subsets = [self._subset(X, columns) for _, _, columns in self.estimators]
+
+        # One task per (model, fold) plus one fit of every model on the whole data
+        tasks = [(i, train, test) for i in range(len(self.estimators))
+                 for train, test in folds + [(None, None)]]
+        results = Parallel(n_jobs = self.n_jobs)(
+            delayed(_fit_predict)(self.estimators[i][1], self.preprocessing, subsets[i], y,
+                                  train, test)
+            for i, train, test in tasks)
+
+        self.oof_probabilities_ = np.zeros((len(y), len(self.estimators)))
+        self.estimators_ = []
+        for (i, train, test), (model, probabilities) in zip(tasks, results):
+            if test is None:
+                self.estimators_.append(model)
+            else:
+                self.oof_probabilities_[test, i] = probabilities
+        self.named_estimators_ = dict(zip([name for name, _, _ in self.estimators],
+                                          self.estimators_))
+
+        blender = LogisticRegression() if self.blender is None else self.blender
+        self.blender_ = clone(blender).fit(self.oof_probabilities_, y)
+        self.classes_ = self.blender_.classes_
+        return self
+
+    def base_probabilities(self, X):
+        """
+        Returns the probability of the positive class given by every base model, one column per
+        model.
+        """
+        return np.column_stack([model.predict_proba(self._subset(X, columns))[:, 1]
+                                for model, (_, _, columns) in zip(self.estimators_,
+                                                                  self.estimators)])
+
+    @profiled
+    def predict_proba(self, X):
+        return self.blender_.predict_proba(self.base_probabilities(X))
+
+    def predict(self, X):
+        return self.blender_.predict(self.base_probabilities(X))
+
+    @staticmethod
+    def _subset(X, columns):
+        if columns is None:
+            return np.asarray(X)
+        if isinstance(X, pd.DataFrame):
+            return X.loc[:, list(columns)].to_numpy()
+        return np.asarray(X)[:, columns]
+
+def merge_moments(counts_a, means_a, M2_a, counts_b, means_b, M2_b):
+    """
+    Returns the number of values, mean and sum of squared deviations from the mean of every
+    column of two batches from those of each batch (Chan et al.), without revisiting the rows.
+    Columns without values get a mean and M2 of zero.
+    """
+    total = counts_a + counts_b
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        delta = means_b - means_a
+        means = np.where(total > 0, means_a + delta * counts_b / total, 0)
+        M2 = np.where(total > 0, M2_a + M2_b + delta**2 * counts_a * counts_b / total, 0)
+    return total, means, M2
+
+@profiled
+def _fit_predict(estimator, preprocessing, X, y, train = None, test = None):
+    """
+    Fits estimator (behind a clone of preprocessing) on the train rows of X, or on all rows if
+    train is None, and returns the fitted model with its positive class probabilities for the
+    test rows (None if test is None).
+    """
+    model = clone(estimator)
+    if preprocessing is not None:
+        model = make_pipeline(clone(preprocessing), model)
+    if train is None:
+        return model.fit(X, y), None
+    model.fit(X[train], y[train])
+    return model, model.predict_proba(X[test])[:, 1]
@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+These helper functions run the scripts and notebooks of the project as a pipeline. Every stage
+declares the files it reads and writes, so that the order of the stages follows from the data
+passed between them through '../data/'. A stage is fingerprinted by the content of its inputs,
+its parameters and its code (the code cells of a notebook, or a script, plus every helper module
+either imports), and is skipped when its fingerprint and outputs are those recorded after its
+last successful run. Stages whose inputs are ready run concurrently. See '10 Pipeline.py'.
+
+"""
+
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import pandas as pd
+from helpers.columnar import file_hash
+from helpers.predictions import PredictionStore
+
+HELPERS_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.dirname(HELPERS_DIR)
+STATE_PATH = '../data/pipeline_state.json'
+# Logs of the stages and the executed copies of the notebooks
+RUNS_DIR = '../data/pipeline_runs'
+
+# A stage of the pipeline:
+# - name: unique name of the stage
+# - path: script or notebook run by the stage, relative to the scripts directory
+# - inputs / outputs: files read and written by the stage, relative to the scripts directory
+# - params: dict of command line options passed to a script, e.g. {'cutoffs': [2008]} for
+#   '--cutoffs 2008'; notebooks take no parameters
+Stage = namedtuple('Stage', ['name', 'path', 'inputs', 'outputs', 'params'])
+Stage.__new__.__defaults__ = (None,)
+
+MODEL_NAMES = ['lr', 'ada', 'bnb', 'svm']
+
+def _training(year = None):
+    """
+    Returns the training sets of the selected features of every model written by a feature
+    selection notebook.
+    """
+    infix = '' if year is None else '{}_'.format(year)
+    return ['../data/anes_cdf_training_{}{}.csv'.format(infix, model) for model in MODEL_NAMES]
+
+def _manifests(year = None):
+    infix = '' if year is None else '{}_'.format(year)
+    return ['../data/features_{}{}.json'.format(infix, model) for model in MODEL_NAMES]
+
+def _generator(year = None):
+    """
+    Returns the FeatureGenerator fitted by a feature selection notebook, which the tuning
+    notebook of the same holdout year reuses.
+    """
+    suffix = '' if year is None else '_{}'.format(year)
+    return ['../data/feature_generator{}.pkl'.format(suffix)]
+
+def _predictions(model, cutoff):
+    """
+    Returns the file tracking the latest predictions of a model in the prediction store.
+    """
+    return [PredictionStore().head_path(model, cutoff)]
+
+# The stages from the raw CDF to the evaluation tables. The 2008 and 2004 holdouts ('z_04b' /
+# 'z_05b' and 'z_04c' / 'z_05c') and the cutoffs of the backtest are independent branches.
+STAGES = [
+    Stage('filtering', '01 Data Filtering.py', ['../data/anes_cdf_raw.csv'],
+          ['../data/anes_cdf_abridged.csv']),
+    Stage('cleaning', '02 Data Cleaning.py',
+          ['../data/anes_cdf_abridged.csv', '../data/anes_timeseries_cdf_codebook_var.txt'],
+          ['../data/anes_cdf_converted.csv', '../data/encoding.pkl',
+           '../data/encoding_report.json', '../data/encoding_report.html']),
+    Stage('selection_2012', '04a Feature Selection.ipynb', ['../data/anes_cdf_converted.csv'],
+          _training() + _manifests() + _generator()),
+    Stage('selection_2008', 'z_04b Feature Selection (2008).ipynb',
+          ['../data/anes_cdf_converted.csv'],
+          _training(2008) + _manifests(2008) + _generator(2008)),
+    Stage('selection_2004', 'z_04c Feature Selection (2004).ipynb',
+          ['../data/anes_cdf_converted.csv'],
+          _training(2004) + _manifests(2004) + _generator(2004)),
+    Stage('tuning_2012', '05a Model Tuning and Evaluation.ipynb',
+          ['../data/anes_cdf_converted.csv', '../data/encoding.pkl'] + _training() +
+          _generator(),
+          _predictions('vote', 2012) + ['../data/scoring_model.pkl']),
+    Stage('tuning_2008', 'z_05b Model Tuning and Evaluation (2008).ipynb',
+          ['../data/anes_cdf_converted.csv'] + _training(2008) + _generator(2008),
+          _predictions('vote', 2008)),
+    Stage('tuning_2004', 'z_05c Model Tuning and Evaluation (2004).ipynb',
+          ['../data/anes_cdf_converted.csv'] + _training(2004) + _generator(2004),
+          _predictions('custom_vote', 2004)),
+    Stage('evaluation', '06 Additional Evaluation.ipynb',
+          ['../data/anes_cdf_converted.csv'] + _predictions('vote', 2012) +
+          _predictions('vote', 2008) + _predictions('custom_vote', 2004), []),
+] + [
+    Stage('backtest_{}'.format(cutoff), '08 Backtest.py', ['../data/anes_cdf_converted.csv'],
+          ['../data/backtest_results_{}.csv'.format(cutoff),
+           '../data/backtest_predictions_{}.csv'.format(cutoff)],
+          OrderedDict([('cutoffs', [cutoff]),
+                       ('results', '../data/backtest_results_{}.csv'.format(cutoff)),
+                       ('predictions', '../data/backtest_predictions_{}.csv'.format(cutoff))]))
+    for cutoff in [2004, 2008, 2012]
+]
+
+class FileHashes(object):
+    """
+    Content hashes of files, remembered with the size and modification time of each file so that
+    a file is only read again when it has changed. The remembered hashes are kept in the state
+    file between runs.
+    """
+
+    def __init__(self, known = None):
+        self.known = dict(known or {})
+
+    def __call__(self, path):
+        """
+        Returns the hash of the file at path, or None if it does not exist.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = os.path.normpath(os.path.abspath(path))
+        size, mtime, digest = self.known.get(key, (None, None, None))
+        if (size, mtime) != (stat.st_size, stat.st_mtime_ns):
+            digest = file_hash(path)
+            self.known[key] = (stat.st_size, stat.st_mtime_ns, digest)
+        return digest
+
+def code_files(path):
+    """
+    Returns the script or notebook at path followed by every module of the helpers package it
+    imports, directly or through other helper modules.
+    """
+    files, pending = [path], [path]
+    while pending:
+        for module in _helper_imports(pending.pop()):
+            module_path = os.path.join(HELPERS_DIR, module + '.py')
+            if module_path not in files and os.path.exists(module_path):
+                files.append(module_path)
+                pending.append(module_path)
+    return files
+
+def code_hash(path):
+    """
+    Returns the hash of the code of a script, helper module or notebook. Only the code cells of a
+    notebook count, so that executing it or editing its markdown does not change the hash.
+    """
+    return hashlib.sha1(_source(path).encode('utf-8')).hexdigest()
+
+def fingerprint(stage, hashes):
+    """
+    Returns the fingerprint of a stage: a hash of its name, parameters, inputs and code. Missing
+    inputs are hashed as missing.
+    """
+    digest = hashlib.sha1()
+    digest.update(json.dumps([stage.name, stage.params], sort_keys = True).encode())
+    for path in stage.inputs:
+        digest.update('{}={}\n'.format(path, hashes(path)).encode())
+    for path in code_files(stage.path):
+        digest.update('{}={}\n'.format(os.path.basename(path), code_hash(path)).encode())
+    return digest.hexdigest()
+
+def dependencies(stages):
+    """
+    Returns an OrderedDict from the name of every stage to the names of the stages writing its
+    inputs. Raises ValueError if two stages write the same file, if names repeat or if the stages
+    form a cycle.
+    """
+    writers = {}
+    for stage in stages:
+        for path in stage.outputs:
+            key = os.path.normpath(path)
+            if key in writers:
+                raise ValueError('{} is written by both {} and {}.'
+                                 .format(path, writers[key], stage.name))
+            writers[key] = stage.name
+    if len(set(stage.name for stage in stages)) != len(stages):
+        raise ValueError('Stage names must be unique.')
+    depends = OrderedDict((stage.name, sorted(set(writers[os.path.normpath(path)]
+                                                  for path in stage.inputs
+                                                  if os.path.normpath(path) in writers)))
+                          for stage in stages)
+    _topological_order(depends)
+    return depends
+
+def select(stages, targets = None):
+    """
+    Returns the stages needed to run the named targets, i.e. the targets and every stage they
+    depend on, in the order of stages. All stages are returned if targets is None.
+    """
+    if targets is None:
+        return list(stages)
+    depends = dependencies(stages)
+    unknown = set(targets) - set(depends)
+    if unknown:
+        raise ValueError('Unknown stages: {}.'.format(', '.join(sorted(unknown))))
+    needed, pending = set(), list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in needed:
+            needed.add(name)
+            pending.extend(depends[name])
+    return [stage for stage in stages if stage.name in needed]
+
+def command(stage, runs_dir = RUNS_DIR):
+    """
+    Returns the command line running a stage: the script with its parameters as options, or the
+    notebook executed by nbconvert into a copy under runs_dir.
+    """
+    if stage.path.endswith('.ipynb'):
+        if stage.params:
+            raise ValueError('Notebook stage {} cannot take parameters.'.format(stage.name))
+        return [sys.executable, '-m', 'nbconvert', '--to', 'notebook', '--execute',
+                '--ExecutePreprocessor.timeout=-1', '--output-dir', runs_dir,
+                '--output', stage.name, stage.path]
+    arguments = [sys.executable, stage.path]
+    for key, value in (stage.params or {}).items():
+        option = '--' + key.replace('_', '-')
+        if value is True:
+            arguments.append(option)
+        elif isinstance(value, (list, tuple)):
+            arguments += [option] + [str(item) for item in value]
+        elif value is not None and value is not False:
+            arguments += [option, str(value)]
+    return arguments
+
+def load_state(path = STATE_PATH):
+    """
+    Returns the state saved by run_pipeline: the fingerprint and output hashes of every stage
+    after its last successful run, and the remembered file hashes.
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {'stages': {}, 'files': {}}
+
+def save_state(state, path = STATE_PATH):
+    folder = os.path.dirname(path)
+    if folder and not os.path.isdir(folder):
+        os.makedirs(folder)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent = 1, sort_keys = True)
+    os.replace(path + '.tmp', path)
+
+def up_to_date(stage, state, hashes, current = None):
+    """
+    Returns whether a stage can be skipped: its fingerprint is the one recorded after its last
+    successful run and its outputs exist unchanged since. The current fingerprint is computed
+    unless given.
+    """
+    recorded = state['stages'].get(stage.name)
+    if recorded is None:
+        return False
+    if (current or fingerprint(stage, hashes)) != recorded['fingerprint']:
+        return False
+    return all(hashes(path) is not None and hashes(path) == recorded['outputs'].get(path)
+               for path in stage.outputs)
+
+def run_pipeline(stages = STAGES, targets = None, force = (), n_jobs = 1, dry_run = False,
+                 state_path = STATE_PATH, runs_dir = RUNS_DIR, log = print):
+    """
+    Runs the stages that are out of date, each as soon as the stages writing its inputs are done,
+    with up to n_jobs stages at a time. A stage that fails stops the stages depending on it but
+    not the other branches.
+
+    INPUT:
+    - stages: list of Stage, e.g. STAGES
+    - targets: names of the stages to bring up to date along with the stages they depend on
+      (default: all)
+    - force: names of stages to run even if they are up to date
+    - n_jobs: number of stages running at a time
+    - dry_run: only report which stages are out of date. A stage is reported as out of date if
+      a stage it depends on is, although running it may leave its inputs unchanged.
+    - state_path: JSON file holding the fingerprints of the last successful runs
+    - runs_dir: directory of the stage logs and executed notebooks
+    - log: function called with a line of progress
+
+    OUTPUT:
+    - DataFrame with one row per stage: its status ('skipped', 'ran', 'failed', 'blocked' by a
+      failed stage, or 'stale' in a dry run), the seconds it ran and its log file
+
+    All paths are relative to the scripts directory, in which the stages run.
+    """
+    cwd = os.getcwd()
+    os.chdir(SCRIPTS_DIR)
+    try:
+        return _run(select(stages, targets), set(force), max(1, n_jobs), dry_run, state_path,
+                    runs_dir, log)
+    finally:
+        os.chdir(cwd)
+
+def _run(stages, force, n_jobs, dry_run, state_path, runs_dir, log):
+    depends = dependencies(stages)
+    by_name = OrderedDict((stage.name, stage) for stage in stages)
+    state = load_state(state_path)
+    hashes = FileHashes(state.get('files'))
+    status = OrderedDict((name, None) for name in by_name)
+    fingerprints, seconds, logs = {}, {}, {}
+    if not dry_run and not os.path.isdir(runs_dir):
+        os.makedirs(runs_dir)
+
+    running = {}
+    with ThreadPoolExecutor(max_workers = n_jobs) as executor:
+        while True:
+            progress = False
+            for name, stage in by_name.items():
+                if status[name] is not None or name in running.values():
+                    continue
+                upstream = [status[dependency] for dependency in depends[name]]
+                if any(value in ('failed', 'blocked') for value in upstream):
+                    status[name] = 'blocked'
+                    log('{}: blocked'.format(name))
+                    progress = True
+                    continue
+                if dry_run:
+                    if None in upstream:
+                        continue
+                    stale = name in force or 'stale' in upstream or \
+                        not up_to_date(stage, state, hashes)
+                    status[name] = 'stale' if stale else 'skipped'
+                    log('{}: {}'.format(name, 'out of date' if stale else 'up to date'))
+                    progress = True
+                    continue
+                if any(value not in ('skipped', 'ran') for value in upstream):
+                    continue
+                current = fingerprint(stage, hashes)
+                if name not in force and up_to_date(stage, state, hashes, current):
+                    status[name] = 'skipped'
+                    log('{}: up to date'.format(name))
+                    progress = True
+                    continue
+                logs[name] = os.path.join(runs_dir, name + '.log')
+                log('{}: running {}'.format(name, stage.path))
+                future = executor.submit(_execute, stage, logs[name], runs_dir)
+                running[future] = name
+                state['stages'].pop(name, None)
+                fingerprints[name] = current
+                progress = True
+            if progress:
+                continue
+            if not running:
+                break
+            done, _ = wait(list(running), return_when = FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                returncode, elapsed = future.result()
+                seconds[name] = elapsed
+                stage = by_name[name]
+                missing = [path for path in stage.outputs if hashes(path) is None]
+                if returncode != 0 or missing:
+                    status[name] = 'failed'
+                    log('{}: failed after {:.1f} s ({}), see {}'.format(
+                        name, elapsed, 'exit code {}'.format(returncode) if returncode
+                        else 'missing ' + ', '.join(missing), logs[name]))
+                    continue
+                status[name] = 'ran'
+                state['stages'][name] = {'fingerprint': fingerprints[name],
+                                         'outputs': {path: hashes(path)
+                                                     for path in stage.outputs}}
+                log('{}: done in {:.1f} s'.format(name, elapsed))
+            state['files'] = hashes.known
+            save_state(state, state_path)
+
+    if not dry_run:
+        state['files'] = hashes.known
+        save_state(state, state_path)
+    return pd.DataFrame({'status': pd.Series(status),
+                         'seconds': pd.Series(seconds, dtype = float),
+                         'log': pd.Series(logs, dtype = object)},
+                        index = list(status), columns = ['status', 'seconds', 'log'])
+
+def _execute(stage, log_path, runs_dir):
+    """
+    Runs a stage in a subprocess with its output written to log_path, and returns the exit code
+    and the wall time in seconds.
+    """
+    start = time.perf_counter()
+    with open(log_path, 'w') as log_file:
+        returncode = subprocess.call(command(stage, runs_dir), stdout = log_file,
+                                     stderr = subprocess.STDOUT)
+    return returncode, time.perf_counter() - start
+
+def _source(path):
+    with open(path, encoding = 'utf-8') as f:
+        if not path.endswith('.ipynb'):
+            return f.read()
+        notebook = json.load(f)
+    return '\n'.join(''.join(cell['source']) for cell in notebook['cells']
+                     if cell['cell_type'] == 'code')
+
+def _helper_imports(path):
+    """
+    Returns the names of the helper modules imported by a script, notebook or helper module.
+    """
+    source = _source(path)
+    if path.endswith('.ipynb'):
+        # IPython magics and shell commands are not Python
+        source = '\n'.join(line for line in source.split('\n')
+                           if not line.lstrip().startswith(('%', '!')))
+    names = []
+    for node in ast.walk(ast.parse(source, path)):
+        if isinstance(node, ast.Import):
+            names += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            names.append(node.module)
+            if node.module == 'helpers':
+                names += ['helpers.' + alias.name for alias in node.names]
+    return [name.split('.')[1] for name in names
+            if name.startswith('helpers.') and name.count('.') == 1]
+
+def _topological_order(depends):
+    order, visiting, done = [], set(), set()
+
+    def visit(name):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError('The stages depend on each other in a cycle through {}.'
+                             .format(name))
+        visiting.add(name)
+        for dependency in depends[name]:
+            visit(dependency)
+        visiting.discard(name)
+        done.add(name)
+        order.append(name)
+    for name in depends:
+        visit(name)
+    return order
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+These helper functions keep the predicted non-voter probabilities of the models in one store
+instead of a pickle per model and split. Every prediction is keyed by respondent (the unique
+respondent number VCF0006a, the 'respondent' column of anes_cdf_converted.csv), survey year,
+model, training cutoff and run, so that predictions are joined to the survey data by key rather
+than by position. Panel respondents keep their number across survey years, so a respondent is
+identified by the pair of respondent number and year.
+
+The store is append-only: every call of PredictionStore.append writes a new part, a columnar
+directory (see helpers.columnar) holding the respondent, year and probability columns, and never
+modifies earlier parts. Reads memory-map only the columns asked for.
+
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+import numpy as np
+import pandas as pd
+import helpers.columnar as col
+
+STORE_PATH = '../data/predictions.store'
+KEYS = ['respondent', 'year', 'model', 'cutoff', 'run']
+# Columns stored in every part; model, cutoff and run are the same for all rows of a part
+PART_COLUMNS = ['respondent', 'year', 'probability']
+
+class PredictionStore(object):
+    """
+    Append-only store of predicted probabilities.
+
+    INPUT:
+    - path: directory of the store (created by the first append)
+
+    Example:
+        store = PredictionStore()
+        store.append(df_orig.respondent[y_test.index], df_orig.year[y_test.index], y_pred,
+                     model = 'vote', cutoff = 2012)
+        final_vote_df = store.join(final_vote_df, [('vote', 2012), ('vote', 2008)])
+    """
+
+    def __init__(self, path = STORE_PATH):
+        self.path = path
+
+    def append(self, respondents, years, probabilities, model, cutoff, run = None):
+        """
+        Adds the predictions of a model trained on the years before cutoff as a new part and
+        returns the run id.
+
+        INPUT:
+        - respondents: respondent number (VCF0006a) of every prediction
+        - years: survey year of every prediction
+        - probabilities: predicted probability of not voting
+        - model: name of the model, e.g. 'lr' or 'vote'
+        - cutoff: first year held out from training
+        - run: id of the run, unique per model and cutoff (default: time of the call and a
+          random suffix)
+        """
+        respondents = np.asarray(respondents, dtype = np.int64)
+        years = np.asarray(years, dtype = np.int64)
+        probabilities = np.asarray(probabilities, dtype = np.float64)
+        if not len(respondents) == len(years) == len(probabilities):
+            raise ValueError('respondents, years and probabilities must have the same length.')
+        if pd.MultiIndex.from_arrays([respondents, years]).has_duplicates:
+            raise ValueError('Every respondent can only be predicted once per year and run.')
+        if run is None:
+            run = '{}-{}'.format(time.strftime('%Y%m%dT%H%M%S'), uuid.uuid4().hex[:6])
+        key = {'model': str(model), 'cutoff': int(cutoff), 'run': str(run),
+               'created': time.time(), 'rows': len(respondents),
+               'digest': _digest(respondents, years, probabilities)}
+        parts = os.path.join(self.path, 'parts')
+        if not os.path.isdir(parts):
+            os.makedirs(parts)
+        name = '{}_{}_{}'.format(key['model'], key['cutoff'], key['run'])
+        if os.path.exists(os.path.join(parts, name)):
+            raise ValueError('Run {} of {} ({}) is already stored.'.format(run, model, cutoff))
+
+        # The part is written under a temporary name and renamed once complete, so that readers
+        # never see a partial part
+        temporary = os.path.join(parts, '.{}.tmp'.format(name))
+        try:
+            col.write_columnar(pd.DataFrame({'respondent': respondents, 'year': years,
+                                             'probability': probabilities},
+                                            columns = PART_COLUMNS),
+                               temporary, compact = False)
+            with open(os.path.join(temporary, 'key.json'), 'w') as f:
+                json.dump(key, f)
+            os.rename(temporary, os.path.join(parts, name))
+        finally:
+            shutil.rmtree(temporary, ignore_errors = True)
+        self._write_head(key)
+        return key['run']
+
+    def runs(self):
+        """
+        Returns a DataFrame with one row per part: model, cutoff, run, time of creation, number
+        of rows and part directory, in order of creation.
+        """
+        parts = os.path.join(self.path, 'parts')
+        rows = []
+        if os.path.isdir(parts):
+            for name in os.listdir(parts):
+                if name.startswith('.'):
+                    continue
+                with open(os.path.join(parts, name, 'key.json')) as f:
+                    key = json.load(f)
+                key['part'] = name
+                rows.append(key)
+        runs = pd.DataFrame(rows, columns = ['model', 'cutoff', 'run', 'created', 'rows', 'part',
+                                             'digest'])
+        runs['created'] = pd.to_datetime(runs.created, unit = 's')
+        return runs.sort_values('created').reset_index(drop = True)
+
+    def read(self, columns = None, model = None, cutoff = None, run = None, latest = True):
+        """
+        Returns the stored predictions as a DataFrame with one row per prediction.
+
+        INPUT:
+        - columns: columns to return among KEYS and 'probability' (default: all); only the
+          stored columns asked for are read
+        - model, cutoff, run: if given, only the predictions of this model, cutoff or run (a
+          value or a list of values)
+        - latest: whether to keep only the latest run of every model and cutoff
+
+        OUTPUT:
+        - DataFrame; model and run are categoricals
+        """
+        columns = KEYS + ['probability'] if columns is None else list(columns)
+        unknown = set(columns) - set(KEYS + ['probability'])
+        if unknown:
+            raise ValueError('Unknown columns: {}.'.format(', '.join(sorted(unknown))))
+        runs = self._select(model, cutoff, run, latest)
+        stored = [column for column in PART_COLUMNS if column in columns]
+        frames = []
+        for key in runs.itertuples():
+            frame = col.read_columnar(os.path.join(self.path, 'parts', key.part), stored)
+            for column in ['model', 'cutoff', 'run']:
+                if column in columns:
+                    frame[column] = getattr(key, column)
+            frames.append(frame)
+        if not frames:
+            return pd.DataFrame(columns = columns)
+        out = pd.concat(frames, ignore_index = True).loc[:, columns]
+        for column in ['model', 'run']:
+            if column in columns:
+                out[column] = out[column].astype('category')
+        return out
+
+    def join(self, frame, keys, names = None, on = 'respondent'):
+        """
+        Adds the latest predictions of models to frame as columns, matched on the respondent
+        number and the survey year of every row. Respondents without a prediction get NaN.
+
+        INPUT:
+        - frame: DataFrame with the respondent number and 'year' columns, e.g. the encoded survey
+          data
+        - keys: list of (model, cutoff) pairs
+        - names: names of the new columns (default: 'model_cutoff')
+        - on: column of frame holding the respondent number
+
+        OUTPUT:
+        - copy of frame with one column per key
+        """
+        names = ['{}_{}'.format(model, cutoff) for model, cutoff in keys] \
+            if names is None else list(names)
+        rows = _respondent_index(frame[on], frame.year)
+        out = frame.copy()
+        for (model, cutoff), name in zip(keys, names):
+            predictions = self.read(['respondent', 'year', 'probability'], model, cutoff)
+            if predictions.empty:
+                raise ValueError('No predictions of {} ({}) are stored.'.format(model, cutoff))
+            position = _respondent_index(predictions.respondent, predictions.year) \
+                .get_indexer(rows)
+            found = position >= 0
+            values = np.full(len(frame), np.nan)
+            values[found] = predictions.probability.to_numpy()[position[found]]
+            out[name] = values
+        return out
+
+    def head_path(self, model, cutoff):
+        """
+        Returns the path of the file describing the latest predictions of a model and cutoff by
+        the hash of their content. It changes only when a run stores different predictions, so
+        that helpers.pipeline can track the store.
+        """
+        return os.path.join(self.path, '{}_{}.head'.format(model, cutoff))
+
+    def _write_head(self, key):
+        path = self.head_path(key['model'], key['cutoff'])
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'model': key['model'], 'cutoff': key['cutoff'], 'rows': key['rows'],
+                       'digest': key['digest']}, f)
+        os.replace(path + '.tmp', path)
+
+    def _select(self, model, cutoff, run, latest):
+        runs = self.runs()
+        for column, value in [('model', model), ('cutoff', cutoff), ('run', run)]:
+            if value is not None:
+                values = value if isinstance(value, (list, tuple)) else [value]
+                runs = runs.loc[runs[column].isin(values)]
+        if latest:
+            runs = runs.groupby(['model', 'cutoff'], sort = False).tail(1)
+        return runs
+
+def _respondent_index(respondents, years):
+    return pd.MultiIndex.from_arrays([np.asarray(respondents, dtype = np.int64),
+                                      np.asarray(years, dtype = np.int64)])
+
+def _digest(*arrays):
+    digest = hashlib.sha1()
+    for values in arrays:
+        digest.update(np.ascontiguousarray(values).tobytes())
+    return digest.hexdigest()
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+These helper functions record where time and memory go in a run of the scripts, notebooks or
+the scoring service. The helpers of the pipeline (encoders, feature builders, Normalizer,
+cross-validation and grid search fits, ...) are decorated with profiled, and stages of a script
+can be wrapped in stage. While no Tracer is active, both only check a global and call through.
+
+A Tracer records a span per call with the wall and CPU time, the change of the resident memory
+and of its peak, optionally the peak of the memory allocated by Python (tracemalloc), the
+shapes of the DataFrames and arrays passed in and returned, and the number of DataFrame and
+Series copies made. The spans are written as a Chrome trace (JSON, viewable in chrome://tracing
+or Perfetto) and summarized as a table of the costliest helpers.
+
+Tracing is started with the tracing context manager, or for a whole script by setting the
+environment variable ANES_TRACE to the path of the trace, e.g.
+    ANES_TRACE=../data/trace_02.json python "02 Data Cleaning.py"
+and ANES_TRACE_MEMORY=1 to trace Python allocations as well. Calls made in worker processes
+(n_jobs other than 1) are not recorded.
+
+"""
+
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+import pandas as pd
+
+TRACE_ENV = 'ANES_TRACE'
+
+_tracer = None
+
+class Tracer(object):
+    """
+    Collects the spans of profiled calls and stages while it is active.
+
+    INPUT:
+    - memory: whether to trace Python allocations with tracemalloc, which adds the peak
+      allocation of every span at the cost of slowing allocations down
+    - count_copies: whether to count the calls of DataFrame.copy and Series.copy, including
+      those made inside pandas
+    """
+
+    def __init__(self, memory = False, count_copies = True):
+        self.memory = memory
+        self.count_copies = count_copies
+        self.events = []
+        self.copies = 0
+        self._stack = threading.local()
+        self._start = None
+        self._patched = []
+        self._started_tracemalloc = False
+
+    def start(self):
+        self._start = time.perf_counter()
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        if self.count_copies:
+            for cls in (pd.DataFrame, pd.Series):
+                self._patched.append((cls, cls.__dict__.get('copy')))
+                cls.copy = self._counting(cls.copy)
+        return self
+
+    def stop(self):
+        for cls, copy in reversed(self._patched):
+            if copy is None:
+                # The method is inherited, e.g. from NDFrame
+                del cls.copy
+            else:
+                cls.copy = copy
+        self._patched = []
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def _counting(self, copy):
+        tracer = self
+
+        @functools.wraps(copy)
+        def counted(*args, **kwargs):
+            tracer.copies += 1
+            return copy(*args, **kwargs)
+        return counted
+
+    def _spans(self):
+        if not hasattr(self._stack, 'spans'):
+            self._stack.spans = []
+        return self._stack.spans
+
+    def enter(self, name, category, args = None):
+        """
+        Opens a span and returns it; close it with exit.
+        """
+        span = {'name': name, 'cat': category, 'args': _shapes(args),
+                'wall': time.perf_counter(), 'cpu': time.process_time(),
+                'rss': _rss(), 'max_rss': _max_rss(), 'copies': self.copies,
+                'child_peak': 0}
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            spans = self._spans()
+            if spans:
+                # The peak counter is reset for this span, so the enclosing span keeps the
+                # peak reached so far
+                spans[-1]['child_peak'] = max(spans[-1]['child_peak'], peak)
+            tracemalloc.reset_peak()
+            span['allocated'] = current
+        self._spans().append(span)
+        return span
+
+    def exit(self, span, result = None, args = None):
+        wall, cpu = time.perf_counter(), time.process_time()
+        spans = self._spans()
+        spans.pop()
+        event = OrderedDict([('name', span['name']), ('cat', span['cat']), ('ph', 'X'),
+                             ('ts', (span['wall'] - self._start) * 1e6),
+                             ('dur', (wall - span['wall']) * 1e6),
+                             ('pid', os.getpid()), ('tid', threading.get_ident())])
+        details = OrderedDict()
+        details['cpu_ms'] = (cpu - span['cpu']) * 1e3
+        rss, max_rss = _rss(), _max_rss()
+        if rss is not None and span['rss'] is not None:
+            details['rss_delta_mb'] = (rss - span['rss']) / 2. ** 20
+        if max_rss is not None:
+            details['peak_rss_growth_mb'] = (max_rss - span['max_rss']) / 2. ** 20
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, span['child_peak'])
+            details['alloc_delta_mb'] = (current - span['allocated']) / 2. ** 20
+            details['alloc_peak_mb'] = (peak - span['allocated']) / 2. ** 20
+            if spans:
+                spans[-1]['child_peak'] = max(spans[-1]['child_peak'], peak)
+        details['copies'] = self.copies - span['copies']
+        if span['args']:
+            details['in'] = span['args']
+        out = _shape(result)
+        if out is None and args:
+            # Functions adding columns to an argument in place (e.g. convert_binary)
+            out = _shapes(args)
+        if out:
+            details['out'] = out
+        event['args'] = details
+        self.events.append(event)
+        return event
+
+    def trace(self):
+        """
+        Returns the recorded spans in the Chrome trace event format.
+        """
+        return {'traceEvents': sorted(self.events, key = lambda event: event['ts']),
+                'displayTimeUnit': 'ms'}
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.trace(), f)
+
+    def summary(self, top = 20):
+        """
+        Returns a DataFrame with one row per profiled helper or stage, sorted by total wall time:
+        the number of calls, the total, self (excluding nested spans) and mean wall time in
+        milliseconds, the CPU time, the largest growth of the peak resident memory and of the
+        peak Python allocation in MB, and the number of frame copies.
+        """
+        if not self.events:
+            return pd.DataFrame()
+        events = pd.DataFrame([OrderedDict([('name', event['name']),
+                                            ('ts', event['ts']), ('dur', event['dur']),
+                                            ('tid', event['tid'])] +
+                                           [(key, value) for key, value in event['args'].items()
+                                            if key not in ('in', 'out')])
+                               for event in self.events])
+        events['self'] = events.dur - _child_time(events)
+        grouped = events.groupby('name')
+        table = pd.DataFrame({'calls': grouped.size(),
+                              'total_ms': grouped.dur.sum() / 1e3,
+                              'self_ms': grouped['self'].sum() / 1e3,
+                              'mean_ms': grouped.dur.mean() / 1e3,
+                              'cpu_ms': grouped.cpu_ms.sum(),
+                              'copies': grouped.copies.sum()})
+        for column in ['peak_rss_growth_mb', 'alloc_peak_mb']:
+            if column in events:
+                table[column] = grouped[column].max()
+        return table.sort_values('total_ms', ascending = False).head(top)
+
+def read_trace(path):
+    """
+    Returns a Tracer holding the spans of a trace written by Tracer.write, e.g. to print its
+    summary.
+    """
+    tracer = Tracer(count_copies = False)
+    with open(path) as f:
+        tracer.events = json.load(f)['traceEvents']
+    return tracer
+
+def enabled():
+    return _tracer is not None
+
+def active_tracer():
+    return _tracer
+
+def start(memory = False, count_copies = True):
+    """
+    Starts recording with a new Tracer and returns it.
+    """
+    global _tracer
+    if _tracer is not None:
+        raise RuntimeError('A tracer is already active.')
+    _tracer = Tracer(memory, count_copies).start()
+    return _tracer
+
+def stop():
+    """
+    Stops recording and returns the Tracer (None if none was active).
+    """
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.stop()
+    return tracer
+
+@contextmanager
+def tracing(path = None, memory = False, count_copies = True, top = None):
+    """
+    Records the profiled calls of a block of code. The trace is written to path if given, and
+    a summary of the top costliest helpers is printed if top is given.
+
+    Example:
+        with prof.tracing('../data/trace.json', top = 20) as tracer:
+            final_df = cln.encode(clean_df, rules)
+    """
+    tracer = start(memory, count_copies)
+    try:
+        yield tracer
+    finally:
+        stop()
+        if path is not None:
+            tracer.write(path)
+        if top is not None:
+            print(tracer.summary(top).to_string())
+
+def profiled(function = None, name = None, category = 'helper'):
+    """
+    Decorator recording a span for every call of a function or method while a Tracer is active.
+    The span is named after the function (e.g. 'cleaning.convert_binary') unless a name is
+    given.
+    """
+    if function is None:
+        return functools.partial(profiled, name = name, category = category)
+    if name is None:
+        name = '{}.{}'.format(function.__module__.rsplit('.', 1)[-1], function.__qualname__)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        tracer = _tracer
+        if tracer is None:
+            return function(*args, **kwargs)
+        shaped = args + tuple(kwargs.values())
+        span = tracer.enter(name, category, shaped)
+        result = None
+        try:
+            result = function(*args, **kwargs)
+            return result
+        finally:
+            tracer.exit(span, result, shaped)
+    return wrapper
+
+class _NullStage(object):
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+class _Stage(object):
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.span = tracer.enter(name, category, args)
+
+    def __enter__(self):
+        return self.span
+
+    def __exit__(self, *exc_info):
+        self.tracer.exit(self.span)
+        return False
+
+def stage(name, *frames):
+    """
+    Context manager recording a span for a stage of a script, e.g.
+        with prof.stage('read', clean_df):
+    The shapes of the DataFrames or arrays given as frames are recorded with the span.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _NULL_STAGE
+    return _Stage(tracer, name, 'stage', frames)
+
+def _child_time(events):
+    """
+    Returns the time spent in the spans directly nested in every span of events, found by
+    walking the spans of each thread in start order with a stack.
+    """
+    child = pd.Series(0.0, index = events.index)
+    for _, group in events.sort_values(['ts', 'dur'], ascending = [True, False]) \
+            .groupby('tid', sort = False):
+        stack = []
+        for index, ts, dur in zip(group.index, group.ts, group.dur):
+            while stack and ts >= stack[-1][1]:
+                stack.pop()
+            if stack:
+                child[stack[-1][0]] += dur
+            stack.append((index, ts + dur))
+    return child
+
+def _shape(x):
+    shape = getattr(x, 'shape', None)
+    if isinstance(shape, tuple) and not isinstance(x, type):
+        return list(shape)
+    return None
+
+def _shapes(args):
+    if not args:
+        return None
+    shapes = [shape for shape in map(_shape, args) if shape is not None]
+    return shapes or None
+
+def _rss():
+    """
+    Returns the resident memory of the process in bytes (Linux only, otherwise None).
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError):
+        return None
+
+def _max_rss():
+    """
+    Returns the peak resident memory of the process in bytes, or None where it is unknown.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def _trace_from_environment():
+    """
+    Starts a Tracer if ANES_TRACE is set, and writes the trace to its path and prints a summary
+    when the process exits. Worker processes started by the traced process do not trace.
+    """
+    path = os.environ.get(TRACE_ENV)
+    if not path or os.environ.get(TRACE_ENV + '_PID', str(os.getpid())) != str(os.getpid()):
+        return
+    os.environ[TRACE_ENV + '_PID'] = str(os.getpid())
+    tracer = start(memory = os.environ.get(TRACE_ENV + '_MEMORY') == '1')
+
+    def finish():
+        stop()
+        tracer.write(path)
+        summary = tracer.summary()
+        if len(summary):
+            sys.stderr.write(summary.to_string() + '\n')
+    atexit.register(finish)
+
+_trace_from_environment()
@@ -6,16 +6,16 @@ Created on Fri Mar 17 13:10:35 2017
 @author: derekzhao
 """
 
-import csv
+from collections import OrderedDict
 import numpy as np
 import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+from helpers.codebook import Codebook, FeatureKey
+from helpers.profiling import profiled
+
+# Descriptions of the columns, read from helpers/feature_key.csv (or the codebook) on first use
+feature_key = FeatureKey(codebook = Codebook())
 
-with open('helpers/feature_key.csv') as csvfile:
-    reader = csv.reader(csvfile)
-    feature_key = dict()
-    for row in reader:
-        feature_key[row[0]] = row[1]
-        
 def wrap_text(in_string, num = 15):
     out_string = str()
     counter = 0
@@ -28,34 +28,141 @@ def wrap_text(in_string, num = 15):
             counter = counter + 1
     return out_string
 
-def add_thermometer_intensity(df):
-    
-    def thermometer_to_intensity(x):
-        if x == np.nan:
-            return np.nan
+# Ordinal features whose distance from the middle of their scale is added by FeatureGenerator
+ORDINAL_COLUMNS = ['VCF0803','VCF0806','VCF0830','VCF0851','VCF9014','VCF9015','VCF9039','VCF9042',
+                   'VCF0301','VCF0303','VCF0502','VCF0604','VCF0605','VCF0880a','VCF9009','VCF9045']
+
+# Columns on the thermometer range that are not thermometers
+THERMOMETER_EXCLUDE = ['VCF0114_r1','VCF1015']
+
+# Neutral point of the thermometers, which '02 Data Cleaning.py' encodes on 0-10 (scale = 10)
+THERMOMETER_MIDPOINT = 5
+
+class FeatureGenerator(BaseEstimator, TransformerMixin):
+    """
+    Adds the engineered features of '04a Feature Selection' to a DataFrame of encoded features:
+    - thermometer intensity: (x - 5)**2 of every thermometer, i.e. every column with a maximum
+      of at least 10 and a minimum of 0, with the sum of the intensities ('int_sum_therm')
+      raised to the power 1.2
+    - ordinal intensity: the distance |x - midpoint| of every column of ORDINAL_COLUMNS from the
+      middle of its range, with the squared sum ('int_sum_ord')
+    - 'dk_sum': the squared number of 'Don't know' responses ('_dk' columns)
+    The thermometers, the midpoints and the '_dk' columns are learned on the training data only,
+    so that training and test data get the same features. Missing values do not count towards
+    the sums and leave the corresponding intensity missing.
+
+    The output has the input columns followed by the new features, in the order of
+    add_dk_sum(add_ordinal_intensity(add_thermometer_intensity(df))), and is computed in one
+    pass into a preallocated array. The names of the new features of each group are kept in
+    groups_ ('thermometer', 'ordinal', 'dk').
+
+    INPUT:
+    - thermometer, ordinal, dk: whether to add each group of features
+    - ordinal_columns: ordinal columns whose intensity is added
+    - exclude: columns never treated as thermometers
+    - dtype: dtype of the output
+    """
+
+    def __init__(self, thermometer = True, ordinal = True, dk = True,
+                 ordinal_columns = ORDINAL_COLUMNS, exclude = THERMOMETER_EXCLUDE,
+                 dtype = np.float64):
+        self.thermometer = thermometer
+        self.ordinal = ordinal
+        self.dk = dk
+        self.ordinal_columns = ordinal_columns
+        self.exclude = exclude
+        self.dtype = dtype
+
+    @profiled
+    def fit(self, X, y = None):
+        if hasattr(self, 'mins_'):
+            del self.mins_
+        return self.partial_fit(X, y)
+
+    @profiled
+    def partial_fit(self, X, y = None):
+        """
+        Updates the column minima and maxima with a chunk of rows, so that the features of data
+        too large for memory can be learned in chunks.
+        """
+        values = X.to_numpy(dtype = np.float64)
+        # fmin and fmax ignore missing values
+        mins, maxs = np.fmin.reduce(values, axis = 0), np.fmax.reduce(values, axis = 0)
+        if not hasattr(self, 'mins_'):
+            self.columns_ = list(X.columns)
+            self.mins_, self.maxs_ = mins, maxs
         else:
-            return abs(x - 50) ** 2
-    
-    columns_to_convert = (df.max() > 50) & (df.min() <= 0)
-    columns_to_convert[[df.columns.get_loc('VCF0114_r1'),df.columns.get_loc('VCF1015')]] = False
-    thermometer_df = df.loc[:,columns_to_convert]
-    thermometer_df = thermometer_df.applymap(thermometer_to_intensity)
-    thermometer_df.columns = thermometer_df.columns + '_int'
-    thermometer_df['int_sum_therm'] = thermometer_df.sum(axis = 1) ** 1.2
-    return pd.concat([df, thermometer_df], axis = 1)
+            self.mins_, self.maxs_ = np.fmin(self.mins_, mins), np.fmax(self.maxs_, maxs)
+
+        columns = pd.Index(self.columns_)
+        thermometers = (self.maxs_ >= 2 * THERMOMETER_MIDPOINT) & (self.mins_ == 0) & \
+            ~columns.isin(self.exclude)
+        self.thermometer_indices_ = np.flatnonzero(thermometers) if self.thermometer else \
+            np.array([], dtype = int)
+        self.ordinal_indices_ = columns.get_indexer(self.ordinal_columns) if self.ordinal else \
+            np.array([], dtype = int)
+        if (self.ordinal_indices_ < 0).any():
+            missing = np.array(self.ordinal_columns)[self.ordinal_indices_ < 0]
+            raise KeyError('Ordinal columns {} are missing.'.format(list(missing)))
+        self.midpoints_ = (self.maxs_[self.ordinal_indices_] +
+                           self.mins_[self.ordinal_indices_]) / 2
+        self.dk_indices_ = np.flatnonzero(columns.str.contains('dk')) if self.dk else \
+            np.array([], dtype = int)
+
+        self.groups_ = OrderedDict()
+        if self.thermometer:
+            self.groups_['thermometer'] = [self.columns_[i] + '_int'
+                                           for i in self.thermometer_indices_] + ['int_sum_therm']
+        if self.ordinal:
+            self.groups_['ordinal'] = [self.columns_[i] + '_int'
+                                       for i in self.ordinal_indices_] + ['int_sum_ord']
+        if self.dk:
+            self.groups_['dk'] = ['dk_sum']
+        self.feature_names_ = list(self.columns_) + [name for names in self.groups_.values()
+                                                     for name in names]
+        return self
+
+    @profiled
+    def transform(self, X):
+        index = X.index if isinstance(X, pd.DataFrame) else None
+        if isinstance(X, pd.DataFrame):
+            if list(X.columns) != self.columns_:
+                X = X.loc[:, self.columns_]
+            X = X.to_numpy(dtype = self.dtype)
+        num_columns = len(self.columns_)
+        # Column-major, as the blocks of a DataFrame, so that the result is not copied again
+        out = np.empty((len(X), len(self.feature_names_)), dtype = self.dtype, order = 'F')
+        out[:, :num_columns] = X
+        values = out[:, :num_columns]
+        position = num_columns
+        if self.thermometer:
+            position = self._add_intensity(out, position, (values[:, self.thermometer_indices_]
+                                                           - THERMOMETER_MIDPOINT) ** 2, 1.2)
+        if self.ordinal:
+            position = self._add_intensity(out, position, np.abs(values[:, self.ordinal_indices_]
+                                                                 - self.midpoints_), 2)
+        if self.dk:
+            out[:, position] = np.nansum(values[:, self.dk_indices_], axis = 1) ** 2
+        return pd.DataFrame(out, index = index, columns = self.feature_names_, copy = False)
+
+    def get_feature_names_out(self, input_features = None):
+        return np.array(self.feature_names_, dtype = object)
+
+    @staticmethod
+    def _add_intensity(out, position, intensity, power):
+        end = position + intensity.shape[1]
+        out[:, position:end] = intensity
+        out[:, end] = np.nansum(intensity, axis = 1) ** power
+        return end + 1
+
+@profiled
+def add_thermometer_intensity(df):
+    return FeatureGenerator(ordinal = False, dk = False).fit_transform(df)
 
+@profiled
 def add_ordinal_intensity(df):
-    columns_to_convert = ['VCF0803','VCF0806','VCF0830','VCF0851','VCF9014','VCF9015','VCF9039','VCF9042','VCF0301',
-                     'VCF0303','VCF0502','VCF0604','VCF0605','VCF0880a','VCF9009','VCF9045']
-    intensity_df = df.loc[:,columns_to_convert]
-    intensity_df = abs(intensity_df - (intensity_df.max() + intensity_df.min()) / 2)
-    intensity_df.columns = intensity_df.columns + '_int'
-    intensity_df['int_sum_ord'] = intensity_df.sum(axis = 1) ** 2
-    return pd.concat([df, intensity_df], axis = 1)
+    return FeatureGenerator(thermometer = False, dk = False).fit_transform(df)
 
+@profiled
 def add_dk_sum(df):
-    df = df[:]
-    dk_column_index = df.columns.str.contains('dk')
-    dk_df = df.loc[:,dk_column_index]
-    df['dk_sum'] = dk_df.sum(axis = 1) ** 2
-    return df
\ No newline at end of file
+    return FeatureGenerator(thermometer = False, ordinal = False).fit_transform(df)
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+These helper functions score batches of raw ANES-coded respondents with a fitted turnout model.
+A batch is encoded with the rules and schema saved by '02 Data Cleaning.py', the engineered
+features are added, and the non-voter probabilities of the model are returned together with the
+weighted vote shares computed in '06 Additional Evaluation.ipynb'. '07 Scoring Service.py'
+loads a ScoringModel once and keeps it in memory between batches.
+
+"""
+
+import io
+import json
+import pickle as pkl
+import queue
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+import pandas as pd
+import helpers.cleaning as cln
+from helpers.project import FeatureGenerator
+from helpers.profiling import profiled
+
+# Label of the turnout models (VCF0702, whether the respondent voted)
+LABEL = 'VCF0702'
+# Columns recorded after the election, dropped from the features as in '04a Feature Selection';
+# a column matches if its name contains one of them (e.g. VCF0704a and the VCF0704 one-hots)
+LEAKAGE = ['VCF0703', 'VCF0704', 'VCF0707', 'VCF0708', 'VCF0709', 'VCF0710', 'VCF0734',
+           'VCF0736', 'VCF1011', 'final_vote']
+# One-hot columns of VCF0713 (intended vote) for the parties whose shares are reported
+PARTIES = OrderedDict([('dem', 'VCF0713_oh1'), ('rep', 'VCF0713_oh2'), ('other', 'VCF0713_oh5')])
+
+@profiled
+def add_features(df):
+    """
+    Adds the engineered features used by '05a Model Tuning and Evaluation.ipynb', learning them
+    from df itself. A ScoringModel should rather be given the FeatureGenerator fitted on the
+    training data, so that the features of a batch do not depend on the batch.
+    """
+    df = df.drop(['congressional_district', 'state'], axis = 1, errors = 'ignore')
+    return FeatureGenerator().fit_transform(df)
+
+def scoring_encoding(encoding):
+    """
+    Returns a copy of the encoding saved by '02 Data Cleaning.py' without the rules of the label
+    and of the post-election columns of LEAKAGE, which respondents scored before an election do
+    not have.
+    """
+    encoding = dict(encoding)
+    encoding['rules'] = [rule for rule in encoding['rules']
+                         if rule.column != LABEL and
+                         not any(column in cln._output_name(rule) for column in LEAKAGE)]
+    return encoding
+
+class ScoringModel(object):
+    """
+    A fitted turnout model together with everything needed to apply it to raw respondents.
+
+    INPUT:
+    - encoding: dict saved by '02 Data Cleaning.py' to '../data/encoding.pkl', holding the
+      expanded encoding rules, the schema from helpers.cleaning.encoding_schema and the mean age;
+      the rules of the label and the post-election columns are dropped (see scoring_encoding)
+    - columns: columns the estimator was fitted on (for a SubsetStackingClassifier, the union
+      of the columns of its models, which it selects by name)
+    - estimator: fitted classifier (e.g. the SubsetStackingClassifier of '05a Model Tuning and
+      Evaluation') whose positive class is non-voting
+    - threshold: probability above which a respondent is predicted not to vote
+    - features: FeatureGenerator fitted on the training data, or function adding the
+      engineered features to an encoded DataFrame
+    """
+
+    def __init__(self, encoding, columns, estimator, threshold = 0.5, features = add_features):
+        self.encoding = scoring_encoding(encoding)
+        self.columns = list(columns)
+        self.estimator = estimator
+        self.threshold = threshold
+        self.features = features
+        rules = self.encoding['rules']
+        self.raw_columns = list(OrderedDict.fromkeys(rule.column for rule in rules))
+        # Rules without a fill value cannot encode an unanswered question (e.g. gender)
+        self.required_columns = list(OrderedDict.fromkeys(
+            rule.column for rule in rules
+            if rule.kind not in ('copy', 'range') and cln._is_missing(rule.fillna) and
+            (rule.parse_string or rule.pattern is not None)))
+
+    def check(self, raw_df):
+        """
+        Raises a ValueError listing the required columns that a batch of raw respondents lacks
+        or leaves blank.
+        """
+        missing = [column for column in self.required_columns
+                   if column not in raw_df.columns or raw_df[column].isnull().any()]
+        if missing:
+            raise ValueError('Every respondent needs a value of the columns {}; missing in {}.'
+                             .format(', '.join(self.required_columns), ', '.join(missing)))
+
+    @profiled
+    def encode(self, raw_df):
+        """
+        Encodes a batch of raw respondents exactly as '02 Data Cleaning.py' encoded the training
+        data. Other raw columns missing from the batch are treated as unanswered, but every
+        respondent must answer the required_columns (see check).
+        """
+        self.check(raw_df)
+        raw_df = raw_df.reindex(columns = self.raw_columns)
+        # Columns left empty in a small batch carry no type; treat them as unanswered strings
+        empty = raw_df.columns[raw_df.isnull().all().to_numpy()]
+        raw_df[empty] = raw_df[empty].astype(object)
+        df = cln.encode(raw_df, self.encoding['rules'], self.encoding['schema'])
+        df.age = df.age.replace(0, self.encoding['age_mean'])
+        return df
+
+    def predict_proba(self, raw_df):
+        """
+        Returns the probability that each respondent of a raw batch does not vote.
+        """
+        return self._predict_proba(self.encode(raw_df))
+
+    @profiled
+    def score(self, raw_df):
+        """
+        Scores a batch of raw respondents.
+
+        OUTPUT:
+        - dict with the row labels of the batch ('index'), the non-voter probabilities
+          ('probabilities') and the vote shares computed by vote_shares ('shares')
+        """
+        df = self.encode(raw_df)
+        probabilities = self._predict_proba(df)
+        return {'index': raw_df.index.tolist(), 'probabilities': probabilities,
+                'shares': vote_shares(df, probabilities, self.threshold)}
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pkl.dump(self, f)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return pkl.load(f)
+
+    @profiled
+    def _predict_proba(self, df):
+        if hasattr(self.features, 'transform'):
+            X = self.features.transform(df)
+        else:
+            X = self.features(df)
+        X = X.reindex(columns = self.columns)
+        return self.estimator.predict_proba(X)[:, 1]
+
+def vote_shares(df, probabilities, threshold = 0.5):
+    """
+    Returns the weighted vote shares of an encoded batch as a DataFrame with one row per party
+    and the columns:
+    - survey: shares by intended vote, as reported by respondents
+    - model: shares among respondents predicted to vote (probability not above threshold)
+    - expected: shares with every respondent weighted by its probability of voting
+    """
+    intent = df.loc[:, list(PARTIES.values())].to_numpy(dtype = np.float64)
+    weights = df.weight.to_numpy(dtype = np.float64)
+    probabilities = np.asarray(probabilities, dtype = np.float64)
+    voting = probabilities <= threshold
+    totals = np.column_stack([weights, weights * voting, weights * (1 - probabilities)]) \
+        .T.dot(np.nan_to_num(intent)).T
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        shares = totals / totals.sum(axis = 0)
+    return pd.DataFrame(shares, index = list(PARTIES), columns = ['survey', 'model', 'expected'])
+
+class MicroBatcher(object):
+    """
+    Scores the batches submitted by concurrent clients together: a worker thread collects
+    batches until max_rows respondents are waiting or max_delay seconds have passed since the
+    first of them, encodes and scores them in one call of the model, and hands every client the
+    result for its own rows.
+
+    INPUT:
+    - model: ScoringModel
+    - max_rows: number of respondents above which a batch is scored without waiting
+    - max_delay: longest time in seconds a batch waits for others
+    """
+
+    def __init__(self, model, max_rows = 5000, max_delay = 0.005):
+        self.model = model
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target = self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, raw_df):
+        """
+        Queues a batch of raw respondents and returns a Future of its ScoringModel.score result.
+        A batch failing ScoringModel.check is rejected at once rather than failing the batches
+        scored with it.
+        """
+        future = Future()
+        try:
+            self.model.check(raw_df)
+        except ValueError as e:
+            future.set_exception(e)
+            return future
+        self._queue.put((raw_df, future))
+        return future
+
+    @profiled
+    def score(self, raw_df):
+        return self.submit(raw_df).result()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            items = [item]
+            num_rows = len(item[0])
+            deadline = time.time() + self.max_delay
+            while num_rows < self.max_rows:
+                try:
+                    item = self._queue.get(timeout = max(deadline - time.time(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                items.append(item)
+                num_rows = num_rows + len(item[0])
+            self._score(items)
+
+    @profiled
+    def _score(self, items):
+        try:
+            raw_df = pd.concat([raw_df for raw_df, _ in items], ignore_index = True, sort = False)
+            df = self.model.encode(raw_df)
+            probabilities = self.model._predict_proba(df)
+        except Exception as e:
+            for _, future in items:
+                future.set_exception(e)
+            return
+        start = 0
+        for raw_df, future in items:
+            end = start + len(raw_df)
+            shares = vote_shares(df.iloc[start:end], probabilities[start:end],
+                                 self.model.threshold)
+            future.set_result({'index': raw_df.index.tolist(),
+                               'probabilities': probabilities[start:end], 'shares': shares})
+            start = end
+
+def serve(batcher, address, fmt = 'csv'):
+    """
+    Serves a MicroBatcher on a local socket until interrupted. A client sends one batch in the
+    given format and shuts down its side of the connection; the server answers with the JSON
+    produced by format_result followed by a newline.
+
+    INPUT:
+    - batcher: MicroBatcher
+    - address: path of a Unix socket, or (host, port) tuple of a TCP socket
+    - fmt: format of the batches, see read_batch
+    """
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            data = self.rfile.read()
+            try:
+                out = format_result(batcher.score(read_batch(data, fmt)))
+            except Exception as e:
+                out = json.dumps({'error': str(e)})
+            self.wfile.write(out.encode('utf-8') + b'\n')
+
+    if isinstance(address, tuple):
+        server = socketserver.ThreadingTCPServer(address, Handler)
+    else:
+        server = socketserver.ThreadingUnixStreamServer(address, Handler)
+    server.daemon_threads = True
+    with server:
+        server.serve_forever()
+
+def iter_batches(stream, fmt = 'csv', batch_size = 1000):
+    """
+    Yields DataFrames of at most batch_size raw respondents read from a binary stream (e.g.
+    sys.stdin.buffer) in CSV, JSONL or Arrow IPC stream format.
+    """
+    if fmt == 'csv':
+        for chunk in pd.read_csv(stream, chunksize = batch_size):
+            yield chunk
+    elif fmt == 'jsonl':
+        for chunk in pd.read_json(stream, lines = True, chunksize = batch_size, dtype = False):
+            yield chunk
+    elif fmt == 'arrow':
+        import pyarrow as pa
+        reader = pa.ipc.open_stream(stream)
+        for record_batch in reader:
+            df = record_batch.to_pandas()
+            for start in range(0, len(df), batch_size):
+                yield df.iloc[start:start + batch_size]
+    else:
+        raise ValueError('Unknown batch format {}.'.format(fmt))
+
+def read_batch(data, fmt = 'csv'):
+    """
+    Reads a batch of raw respondents from bytes in CSV, JSONL ('jsonl') or Arrow IPC stream
+    ('arrow') format. String coded ANES columns are kept as strings.
+    """
+    if fmt == 'csv':
+        return pd.read_csv(io.BytesIO(data))
+    if fmt == 'jsonl':
+        return pd.read_json(io.BytesIO(data), lines = True, dtype = False)
+    if fmt == 'arrow':
+        import pyarrow as pa
+        return pa.ipc.open_stream(data).read_all().to_pandas()
+    raise ValueError('Unknown batch format {}.'.format(fmt))
+
+def format_result(result):
+    """
+    Returns the result of ScoringModel.score as a JSON string.
+    """
+    shares = result['shares']
+    out = {'index': [_json_value(x) for x in result['index']],
+           'probabilities': [float(x) for x in result['probabilities']],
+           'shares': {column: {party: _json_value(shares.loc[party, column])
+                               for party in shares.index}
+                      for column in shares.columns}}
+    return json.dumps(out)
+
+def _json_value(x):
+    if isinstance(x, np.generic):
+        x = x.item()
+    if isinstance(x, float) and np.isnan(x):
+        return None
+    return x
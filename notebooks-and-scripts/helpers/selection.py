@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+These helper functions select features by cross-validated recursive feature elimination, prune
+groups of highly correlated features, and store the selected column lists as feature manifests.
+
+"""
+
+import json
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import BaseEstimator, TransformerMixin, clone
+from sklearn.metrics import get_scorer
+from sklearn.model_selection import StratifiedKFold
+from helpers.profiling import profiled
+
+class FastRFECV(BaseEstimator, TransformerMixin):
+    """
+    Recursive feature elimination with cross-validated selection of the number of features,
+    with the interface of RFECV (n_features_, support_, ranking_, cv_results_, estimator_).
+
+    Unlike RFECV, preprocessing (e.g. imputation and normalization) is fitted once per fold
+    rather than being run on the whole data beforehand, the folds and the elimination on the
+    whole data run in parallel, and estimators with a warm_start parameter start every
+    elimination step from the coefficients of the previous step.
+
+    INPUT:
+    - estimator: estimator exposing coef_ or feature_importances_ once fitted
+    - step: number of features removed at each step
+    - cv: number of stratified folds, or a cross-validation splitter
+    - scoring: scorer name or callable
+    - min_features_to_select: smallest number of features considered
+    - preprocessing: optional transformer applied before the estimator
+    - n_jobs: number of worker processes
+    - warm_start: whether to warm-start estimators supporting it
+    """
+
+    def __init__(self, estimator, step = 5, cv = 3, scoring = 'f1', min_features_to_select = 1,
+                 preprocessing = None, n_jobs = -1, warm_start = True):
+        self.estimator = estimator
+        self.step = step
+        self.cv = cv
+        self.scoring = scoring
+        self.min_features_to_select = min_features_to_select
+        self.preprocessing = preprocessing
+        self.n_jobs = n_jobs
+        self.warm_start = warm_start
+
+    @profiled
+    def fit(self, X, y):
+        columns = X.columns if isinstance(X, pd.DataFrame) else None
+        X = np.asarray(X)
+        y = np.asarray(y)
+        cv = StratifiedKFold(self.cv) if isinstance(self.cv, int) else self.cv
+        folds = list(cv.split(X, y))
+
+        # The last task eliminates features on the whole data set; its path gives the ranking
+        tasks = [(X[train], y[train], X[test], y[test]) for train, test in folds]
+        tasks.append((X, y, None, None))
+        paths = Parallel(n_jobs = self.n_jobs)(
+            delayed(_elimination_path)(self.estimator, self.preprocessing, X_train, y_train,
+                                       X_test, y_test, self.step, self.min_features_to_select,
+                                       self.scoring, self.warm_start)
+            for X_train, y_train, X_test, y_test in tasks)
+
+        sizes, _, eliminated, self.preprocessing_ = paths[-1]
+        scores = np.array([path[1] for path in paths[:-1]])
+        mean = scores.mean(axis = 0)
+        # Ties go to the smaller number of features
+        best = len(mean) - 1 - np.argmax(mean[::-1])
+        self.n_features_ = sizes[best]
+
+        self.ranking_ = np.ones(X.shape[1], dtype = int)
+        for i, removed in enumerate(eliminated[:best]):
+            self.ranking_[removed] = best - i + 1
+        self.support_ = self.ranking_ == 1
+        self.cv_results_ = {'n_features': np.array(sizes[::-1]),
+                            'mean_test_score': mean[::-1],
+                            'std_test_score': scores.std(axis = 0)[::-1]}
+        for fold in range(len(scores)):
+            self.cv_results_['split{}_test_score'.format(fold)] = scores[fold][::-1]
+        self.grid_scores_ = mean[::-1]
+        if columns is not None:
+            self.selected_features_ = list(columns[self.support_])
+
+        X_selected = self._preprocess(X)[:, self.support_]
+        self.estimator_ = clone(self.estimator).fit(X_selected, y)
+        return self
+
+    def transform(self, X):
+        return self._preprocess(np.asarray(X))[:, self.support_]
+
+    def _preprocess(self, X):
+        return X if self.preprocessing_ is None else self.preprocessing_.transform(X)
+
+class CorrelationPruner(BaseEstimator, TransformerMixin):
+    """
+    Removes features until no two remaining features have an absolute correlation above
+    threshold. Correlated features are grouped into clusters (connected components of the
+    above-threshold pairs); within a cluster, the feature scoring lowest against the target is
+    removed as long as it is still correlated with another remaining feature.
+
+    Correlations are computed a block of columns at a time after median imputation, so the full
+    matrix of feature correlations is never held in memory.
+
+    INPUT:
+    - threshold: absolute correlation above which two features are considered redundant
+    - scoring: 'mutual_info' (mutual information of the feature values and the target, as
+      sklearn.metrics.mutual_info_score), 'correlation' (absolute correlation with the target)
+      or a function mapping (X, y) to one score per column
+    - block_size: number of columns whose correlations are computed at once
+    """
+
+    def __init__(self, threshold = 0.85, scoring = 'mutual_info', block_size = 256):
+        self.threshold = threshold
+        self.scoring = scoring
+        self.block_size = block_size
+
+    @profiled
+    def fit(self, X, y):
+        columns = X.columns if isinstance(X, pd.DataFrame) else None
+        X = _impute_median(np.asarray(X, dtype = np.float64))
+        y = np.asarray(y)
+        pairs = correlated_pairs(X, self.threshold, self.block_size)
+
+        # Union-find over the correlated pairs gives the clusters
+        parent = np.arange(X.shape[1])
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        for i, j in pairs:
+            root_i, root_j = find(i), find(j)
+            if root_i != root_j:
+                parent[max(root_i, root_j)] = min(root_i, root_j)
+        involved = np.unique(pairs)
+        roots = np.array([find(i) for i in involved], dtype = int)
+        self.clusters_ = [involved[roots == root] for root in np.unique(roots)]
+
+        degrees = np.bincount(pairs.ravel(), minlength = X.shape[1])
+        neighbours = [[] for _ in range(X.shape[1])]
+        for i, j in pairs:
+            neighbours[i].append(j)
+            neighbours[j].append(i)
+        scores = np.full(X.shape[1], np.nan)
+        if len(involved):
+            scores[involved] = self._score(X[:, involved], y)
+        self.scores_ = scores
+
+        removed = []
+        for cluster in self.clusters_:
+            # Ties go to the later column, so the earliest column of a group of equals is kept
+            for i in cluster[np.lexsort((-cluster, scores[cluster]))]:
+                if degrees[i] > 0:
+                    removed.append(i)
+                    degrees[i] = 0
+                    for j in neighbours[i]:
+                        degrees[j] = degrees[j] - 1
+        self.support_ = np.ones(X.shape[1], dtype = bool)
+        self.support_[removed] = False
+        self.num_correlated_ = len(involved)
+        if columns is not None:
+            self.removed_ = list(columns[removed])
+            self.selected_features_ = list(columns[self.support_])
+        else:
+            self.removed_ = removed
+        return self
+
+    def transform(self, X):
+        if isinstance(X, pd.DataFrame):
+            return X.loc[:, self.support_]
+        return np.asarray(X)[:, self.support_]
+
+    def _score(self, X, y):
+        if self.scoring == 'mutual_info':
+            return mutual_information(X, y)
+        if self.scoring == 'correlation':
+            return np.abs(_standardize(X).T.dot(_standardize(y.reshape(-1, 1)))).ravel() / len(y)
+        return np.asarray(self.scoring(X, y))
+
+def correlated_pairs(X, threshold, block_size = 256):
+    """
+    Returns the pairs (i, j), i < j, of columns of X whose absolute correlation exceeds threshold
+    as an array of shape (num_pairs, 2). Correlations are computed for block_size columns at a
+    time against the columns that follow them. X must not contain missing values.
+    """
+    Z = _standardize(np.asarray(X, dtype = np.float64))
+    n, p = Z.shape
+    pairs = []
+    for start in range(0, p, block_size):
+        end = min(start + block_size, p)
+        block = np.abs(Z[:, start:end].T.dot(Z[:, start:])) / n
+        rows, cols = np.nonzero(block > threshold)
+        cols = cols + start
+        rows = rows + start
+        upper = cols > rows
+        pairs.append(np.column_stack([rows[upper], cols[upper]]))
+    return np.vstack(pairs) if pairs else np.zeros((0, 2), dtype = int)
+
+def mutual_information(X, y):
+    """
+    Returns the mutual information (in nats) of every column of X with y, treating the values of
+    each as discrete labels, as sklearn.metrics.mutual_info_score does for one column. All
+    columns are handled in one pass by counting (column, value, label) triples.
+    """
+    X = np.asarray(X, dtype = np.float64)
+    n, p = X.shape
+    _, labels = np.unique(np.asarray(y), return_inverse = True)
+    num_labels = labels.max() + 1 if n else 0
+
+    # Group entries by (column, value)
+    columns = np.repeat(np.arange(p), n)
+    values = X.T.ravel()
+    order = np.lexsort((values, columns))
+    columns, values = columns[order], values[order]
+    new_group = np.ones(n * p, dtype = bool)
+    new_group[1:] = (columns[1:] != columns[:-1]) | (values[1:] != values[:-1])
+    groups = np.cumsum(new_group) - 1
+    num_groups = groups[-1] + 1 if n * p else 0
+
+    joint = np.bincount(groups * num_labels + np.tile(labels, p)[order],
+                        minlength = num_groups * num_labels).reshape(num_groups, num_labels)
+    joint = joint.astype(np.float64)
+    label_counts = np.bincount(labels, minlength = num_labels).astype(np.float64)
+    group_counts = joint.sum(axis = 1, keepdims = True)
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        terms = joint / n * np.log(joint * n / (group_counts * label_counts))
+    terms = np.where(joint > 0, terms, 0)
+    return np.bincount(columns[new_group], weights = terms.sum(axis = 1), minlength = p)
+
+def write_manifest(path, features, **info):
+    """
+    Writes a feature manifest: a JSON file holding the list of selected columns, and optionally
+    details of how they were selected (e.g. model = 'lr', cutoff = 2012).
+    """
+    manifest = dict(info)
+    manifest['features'] = [str(feature) for feature in features]
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent = 1)
+
+def read_manifest(path):
+    """
+    Returns the list of columns stored in a feature manifest.
+    """
+    with open(path) as f:
+        return json.load(f)['features']
+
+@profiled
+def _elimination_path(estimator, preprocessing, X_train, y_train, X_test, y_test, step,
+                      min_features, scoring, warm_start):
+    """
+    Eliminates features from the training data down to min_features, step features at a time.
+
+    OUTPUT:
+    - sizes: number of features at each step
+    - scores: test score at each step (empty if X_test is None)
+    - eliminated: arrays of the features removed at each step, in order
+    - preprocessing: the fitted preprocessing (None if there is none)
+    """
+    if preprocessing is not None:
+        preprocessing = clone(preprocessing, safe = False)
+        X_train = preprocessing.fit_transform(X_train)
+        if X_test is not None:
+            X_test = preprocessing.transform(X_test)
+    scorer = get_scorer(scoring) if isinstance(scoring, str) else scoring
+
+    model = clone(estimator)
+    warm_start = warm_start and 'warm_start' in model.get_params()
+    if warm_start:
+        model.set_params(warm_start = True)
+    features = np.arange(X_train.shape[1])
+    sizes, scores, eliminated = [], [], []
+    while True:
+        model.fit(X_train[:, features], y_train)
+        sizes.append(len(features))
+        if X_test is not None:
+            scores.append(scorer(model, X_test[:, features], y_test))
+        if len(features) <= min_features:
+            break
+        ranks = np.argsort(_importance(model), kind = 'mergesort')
+        num_removed = min(step, len(features) - min_features)
+        kept = np.sort(ranks[num_removed:])
+        eliminated.append(features[ranks[:num_removed]])
+        features = features[kept]
+        if warm_start and hasattr(model, 'coef_'):
+            model.coef_ = model.coef_[:, kept]
+    return sizes, scores, eliminated, preprocessing
+
+def _impute_median(X):
+    medians = np.nanmedian(X, axis = 0)
+    medians[np.isnan(medians)] = 0
+    return np.where(np.isnan(X), medians, X)
+
+def _standardize(X):
+    """
+    Centres and scales the columns of X to unit variance; constant columns become zero.
+    """
+    X = X - X.mean(axis = 0)
+    std = X.std(axis = 0)
+    return X / np.where(std > 0, std, 1)
+
+def _importance(model):
+    if hasattr(model, 'coef_'):
+        coef = np.asarray(model.coef_)
+        return np.abs(coef) if coef.ndim == 1 else np.linalg.norm(coef, axis = 0, ord = 1)
+    return np.asarray(model.feature_importances_)
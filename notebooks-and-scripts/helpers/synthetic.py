@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+These helper functions generate synthetic survey data shaped like the ANES Cumulative Data
+File, so that the scripts can be run and timed without the respondent data. Every variable of
+the codebook becomes a column stored as in the raw CSV: labelled categories as strings such as
+'1. Male', scales and thermometers as numbers, survey weights as positive decimals. Each
+respondent belongs to a survey year, variables are blank in the years the codebook does not
+list them, and a share of the answers are 'Don't know' or other missing codes. The values are
+random; only the layout of the data is realistic.
+
+"""
+
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from helpers.codebook import Codebook
+from helpers.filtering import filter_csv
+
+# Respondents in the full CDF and after '01 Data Filtering.py'
+RAW_ROWS = 55674
+ABRIDGED_ROWS = 9374
+
+# Presidential election years kept by '01 Data Filtering.py'
+ANALYSIS_YEARS = [2000, 2004, 2008, 2012]
+
+# Labelled categories that '02 Data Cleaning.py' reads as numbers rather than strings
+NUMERIC_COLUMNS = ['VCF0521', 'VCF0521a', 'VCF0522', 'VCF0523']
+
+# Variables used by '01 Data Filtering.py' to select respondents, present in every year
+FILTER_COLUMNS = ['VCF0013', 'VCF0015a', 'VCF0702']
+
+# Shares of the response codes of the filter variables, close to those of the CDF: most
+# respondents have post-election data and a full pre-election interview, and about a quarter
+# report not voting
+CODE_SHARES = {'VCF0013': {'0': .08, '1': .92}, 'VCF0015a': {'0': .92, '1': .06, '2': .02},
+               'VCF0702': {'1': .25, '2': .75}}
+
+# Column holding the survey year and name of the release column of the raw CSV
+YEAR_COLUMN = 'VCF0004'
+VERSION_COLUMN = 'Version'
+
+def survey_years(codebook):
+    """
+    Returns the years of the CDF, i.e. every year in which a variable of the codebook was asked.
+    """
+    return sorted(set(year for name in codebook for year in codebook[name]['years']))
+
+def column_kinds(codebook, numeric_columns = NUMERIC_COLUMNS):
+    """
+    Returns an OrderedDict from variable name to the way it is stored in the raw CSV:
+    - 'year': the survey year
+    - 'weight': survey weights (decimal storage type)
+    - 'character': character codes such as congressional districts
+    - 'id': numeric variables without response codes, e.g. respondent numbers
+    - 'string': labelled categories stored as 'code. label'
+    - 'numeric': scales, thermometers and counts stored as numbers
+
+    A variable counts as a labelled category if all of its valid codes are single numbers with
+    a label; scales label only some of their points (e.g. '1.' and '7.') and ranges such as
+    '00-96' are numeric.
+    """
+    kinds = OrderedDict()
+    for name in codebook:
+        if not name or name == VERSION_COLUMN.upper():
+            # The release is written by write_csv as VERSION_COLUMN
+            continue
+        entry = codebook[name]
+        storage = entry['type'] or ''
+        valid = entry['valid_codes']
+        if name == YEAR_COLUMN:
+            kinds[name] = 'year'
+        elif storage.startswith('Numeric') and 'Dec 4' in storage:
+            kinds[name] = 'weight'
+        elif storage.startswith('Character'):
+            kinds[name] = 'character'
+        elif not valid and not entry['missing_codes']:
+            kinds[name] = 'id'
+        elif name not in numeric_columns and valid and \
+                all(code.isdigit() for code in valid) and \
+                all(meaning and not meaning.endswith(' .') for meaning in valid.values()):
+            kinds[name] = 'string'
+        else:
+            kinds[name] = 'numeric'
+    return kinds
+
+def generate(num_rows, columns = None, years = None, codebook = None, by_year = True,
+             complete_columns = FILTER_COLUMNS, dk_rate = 0.05, inap_rate = 0.02,
+             random_state = None, first_id = 0):
+    """
+    Generates synthetic raw survey data.
+
+    INPUT:
+    - num_rows: number of respondents
+    - columns: variables to generate, in order (default: every variable of the codebook)
+    - years: survey years the respondents are drawn from (default: every year of the CDF, with
+      twice as many respondents in presidential as in midterm years)
+    - codebook: helpers.codebook.Codebook describing the variables
+    - by_year: whether variables are blank in the years the codebook does not list for them
+    - complete_columns: variables answered by every respondent in every year, e.g. those
+      selecting respondents in '01 Data Filtering.py'
+    - dk_rate: share of answers given one of the variable's missing codes (DK, NA, ...)
+    - inap_rate: share of answers left blank (inapplicable) in the years a variable was asked
+    - random_state: seed or numpy RandomState
+    - first_id: respondent number of the first row, so that chunks can be generated separately
+
+    OUTPUT:
+    - DataFrame with one row per respondent, indexed by respondent number
+    """
+    codebook = Codebook() if codebook is None else codebook
+    rng = random_state if isinstance(random_state, np.random.RandomState) \
+        else np.random.RandomState(random_state)
+    kinds = column_kinds(codebook)
+    columns = list(kinds) if columns is None else list(columns)
+    if years is None:
+        years = survey_years(codebook)
+        p = np.array([2. if year % 4 == 0 else 1. for year in years])
+    else:
+        p = np.ones(len(years))
+    year = np.asarray(years)[rng.choice(len(years), num_rows, p = p / p.sum())]
+    complete_columns = set(complete_columns)
+
+    out = OrderedDict()
+    for name in columns:
+        kind = kinds[name]
+        if kind == 'year':
+            out[name] = year
+            continue
+        if kind == 'id':
+            values = np.arange(first_id, first_id + num_rows) + 1
+        else:
+            values = _values(kind, codebook[name], num_rows, dk_rate, rng, CODE_SHARES.get(name))
+        blank = np.zeros(num_rows, dtype = bool)
+        if name not in complete_columns:
+            blank = rng.rand(num_rows) < inap_rate
+            asked = codebook[name]['years']
+            if by_year and asked:
+                blank |= ~np.isin(year, asked)
+        if blank.any():
+            values = values.astype(object) if values.dtype.kind in 'OU' else \
+                values.astype(np.float64)
+            values[blank] = np.nan
+        out[name] = values
+    return pd.DataFrame(out, index = pd.RangeIndex(first_id, first_id + num_rows))
+
+def write_csv(path, num_rows, chunksize = 10000, random_state = None, **kwargs):
+    """
+    Writes synthetic raw survey data with num_rows respondents to path in chunks, laid out like
+    the raw CDF CSV: the respondent number as unnamed first column, a release column and every
+    variable of the codebook. Memory use is bounded by chunksize. Further keyword arguments are
+    passed on to generate.
+    """
+    rng = random_state if isinstance(random_state, np.random.RandomState) \
+        else np.random.RandomState(random_state)
+    for start in range(0, num_rows, chunksize):
+        size = min(chunksize, num_rows - start)
+        chunk = generate(size, random_state = rng, first_id = start, **kwargs)
+        chunk.insert(0, VERSION_COLUMN, 'ANES_cdf_VERSION:synthetic')
+        chunk.to_csv(path, mode = 'w' if start == 0 else 'a', header = start == 0)
+    return path
+
+def abridged_frame(num_rows, rules, filtering, codebook = None, random_state = None,
+                   dk_rate = 0.05, inap_rate = 0.02):
+    """
+    Generates synthetic data shaped like the output of '01 Data Filtering.py', i.e. the input
+    of '02 Data Cleaning.py'. Raw respondents of ANALYSIS_YEARS are written to a temporary CSV,
+    filtered by helpers.filtering.filter_csv with the arguments of the filtering script and read
+    back as the cleaning script reads them, so that the columns and their types are those the
+    encoding rules receive.
+
+    The response threshold (min_count) is applied to ABRIDGED_ROWS raw respondents, scaled to
+    the share of them kept by the row filter; only the variables passing it are generated for
+    the num_rows respondents returned. The variables named by the rules are answered by every
+    respondent, as they are in the abridged data although the codebook does not list all of
+    the analysis years for some of them. So are all variables of copy rules, of rules without
+    a fillna value and of rules parsing strings with a fillna value that is not a string, as
+    encoding a missing value fails for them.
+
+    INPUT:
+    - num_rows: number of respondents
+    - rules: list of helpers.cleaning.EncodingRule, e.g. the table of '02 Data Cleaning.py'
+    - filtering: dict of the arguments of filter_csv other than the paths, e.g. as returned
+      by helpers.benchmarks.script_filter for '01 Data Filtering.py'
+    - codebook, random_state, dk_rate, inap_rate: as for generate
+    """
+    codebook = Codebook() if codebook is None else codebook
+    rng = random_state if isinstance(random_state, np.random.RandomState) \
+        else np.random.RandomState(random_state)
+    options = dict(years = ANALYSIS_YEARS, codebook = codebook, dk_rate = dk_rate,
+                   inap_rate = inap_rate, complete_columns = _complete_columns(rules, codebook))
+    filtering = dict(filtering)
+    min_count = filtering.pop('min_count', 0)
+    directory = tempfile.mkdtemp(prefix = 'abridged_')
+    raw_path = os.path.join(directory, 'raw.csv')
+    abridged_path = os.path.join(directory, 'abridged.csv')
+    try:
+        write_csv(raw_path, ABRIDGED_ROWS, random_state = rng, **options)
+        kept, _ = filter_csv(raw_path, abridged_path, min_count = 0, **filtering)
+        counts = pd.read_csv(abridged_path).notnull().sum()
+        columns = set(counts.index[counts >= min_count * kept / ABRIDGED_ROWS])
+
+        # The filter selects respondents by, and drops, variables absent from the output
+        needed = columns | set(FILTER_COLUMNS) | {YEAR_COLUMN} | \
+            set(filtering.get('drop_columns', ()))
+        raw_rows = int(np.ceil(1.1 * num_rows * ABRIDGED_ROWS / kept))
+        write_csv(raw_path, raw_rows, random_state = rng,
+                  columns = [name for name in column_kinds(codebook) if name in needed],
+                  **options)
+        filter_csv(raw_path, abridged_path, min_count = 0, **filtering)
+        abridged = pd.read_csv(abridged_path, nrows = num_rows)
+    finally:
+        shutil.rmtree(directory, ignore_errors = True)
+    return abridged.loc[:, [column for column in abridged.columns if column in columns]]
+
+def _values(kind, entry, num_rows, dk_rate, rng, shares = None):
+    """
+    Draws the answers of one variable, with a share dk_rate of missing codes. The valid codes
+    are drawn with the given shares (a dict from code to share) or with random shares.
+    """
+    if kind == 'weight':
+        weights = rng.lognormal(0, 0.5, num_rows)
+        return np.round(weights / weights.mean(), 4)
+    if kind == 'character':
+        width = max([len(code) for code in entry['missing_codes'] if code.isdigit()] or [2])
+        return np.char.zfill(rng.randint(0, 10 ** width - 1, num_rows).astype(str), width)
+
+    missing = [code for code in entry['missing_codes'] if _is_code(code)]
+    is_missing = rng.rand(num_rows) < (dk_rate if missing else 0)
+    if kind == 'string':
+        valid = list(entry['valid_codes'])
+        labels = np.array(['{}. {}'.format(code, entry['valid_codes'][code]) for code in valid] +
+                          ['{}. {}'.format(code, entry['missing_codes'][code])
+                           for code in missing], dtype = object)
+        # Categories are not equally popular
+        p = rng.dirichlet(2 * np.ones(len(valid))) if shares is None else \
+            np.array([shares.get(code, 0) for code in valid]) / sum(shares.values())
+        codes = rng.choice(len(valid), num_rows, p = p)
+        if missing:
+            codes[is_missing] = len(valid) + rng.randint(0, len(missing), is_missing.sum())
+        return labels[codes]
+
+    if shares is not None:
+        values = np.array([int(code) for code in shares])[
+            rng.choice(len(shares), num_rows, p = np.array(list(shares.values())))]
+    else:
+        values = _numeric_values(entry, num_rows, rng)
+    if missing:
+        values[is_missing] = np.asarray([int(code) for code in missing])[
+            rng.randint(0, len(missing), is_missing.sum())]
+    return values
+
+def _numeric_values(entry, num_rows, rng):
+    """
+    Draws valid numeric answers: uniformly within the widest range such as '00-96', between the
+    lowest and highest point of scales that label only some of their points, or among the
+    listed codes.
+    """
+    valid = entry['valid_codes']
+    ranges = [[int(bound) for bound in code.split('-')] for code in valid
+              if '-' in code and all(bound.isdigit() for bound in code.split('-'))]
+    numbers = [int(code) for code in valid if code.isdigit()]
+    if ranges:
+        low, high = max(ranges, key = lambda bounds: bounds[1] - bounds[0])
+        values = rng.randint(low, high + 1, num_rows)
+        if numbers:
+            listed = rng.rand(num_rows) < 0.05
+            values[listed] = np.asarray(numbers)[rng.randint(0, len(numbers), listed.sum())]
+        return values
+    if not numbers:
+        return rng.randint(0, 10, num_rows)
+    if any(not meaning or meaning.endswith(' .') for meaning in valid.values()):
+        return rng.randint(min(numbers), max(numbers) + 1, num_rows)
+    return np.asarray(numbers)[rng.randint(0, len(numbers), num_rows)]
+
+def _is_code(code):
+    return code.isdigit() or (code.startswith('-') and code[1:].isdigit())
+
+def _complete_columns(rules, codebook):
+    """
+    Returns the variables answered in every year by abridged_frame: FILTER_COLUMNS, the
+    variables named by the rules, and all variables of copy rules, of rules without a fillna
+    value and of rules parsing strings with a fillna value that is not a string.
+    """
+    order = [name for name in codebook if name]
+    position = {name: index for index, name in enumerate(order)}
+    complete = set(FILTER_COLUMNS)
+    for rule in rules:
+        end = rule.end_column if isinstance(rule.end_column, str) else rule.column
+        complete.update([rule.column, end])
+        if rule.kind == 'copy' or rule.fillna is None or \
+                (rule.parse_string and not isinstance(rule.fillna, str)):
+            complete.update(order[position[rule.column]:position[end] + 1])
+    return complete
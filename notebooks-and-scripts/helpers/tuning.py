@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+These helper functions run cross-validated hyperparameter searches across a process pool and
+keep every (model, parameters, fold, training-year cutoff) score in an on-disk cache, so that
+re-running a notebook or one of its per-year variants only computes cells it has not seen.
+
+"""
+
+import hashlib
+import json
+import math
+import os
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import BaseEstimator, ClassifierMixin, clone
+from sklearn.metrics import get_scorer
+from sklearn.model_selection import ParameterGrid, StratifiedKFold
+from helpers.profiling import profiled
+
+CACHE_DIR = '../data/tuning_cache'
+
+class CachedGridSearchCV(BaseEstimator):
+    """
+    Exhaustive search over a parameter grid with the interface of GridSearchCV (cv_results_,
+    best_params_, best_score_, best_estimator_), whose cells are evaluated in parallel and cached
+    on disk.
+
+    INPUT:
+    - estimator: estimator to tune
+    - param_grid: dict or list of dicts as for GridSearchCV
+    - scoring: scorer name or callable, as for GridSearchCV
+    - cv: number of stratified folds, or a cross-validation splitter
+    - name: name of the model in the cache (defaults to the estimator's class name)
+    - cutoff: training-year cutoff, e.g. 2012 for models trained on pre-2012 data
+    - cache_dir: directory of the score cache and of the shared training matrices
+    - n_jobs: number of worker processes
+    - halving_factor: if given, candidates are first scored on 1 / halving_factor**k of each
+      training fold and only the best 1 / halving_factor of them advance to the next rung;
+      candidates eliminated early have a mean_test_score of NaN
+    - refit: whether to fit best_estimator_ on the whole training set
+    - incremental: whether to score every n_estimators value of an ensemble supporting staged
+      predictions from one fit, and to walk the C values of an estimator supporting warm_start
+      (other than liblinear logistic regression) from the smallest to the largest,
+      warm-starting each fit from the previous solution. Incremental and scratch scores are
+      cached separately.
+    """
+
+    def __init__(self, estimator, param_grid, scoring = 'f1', cv = 5, name = None, cutoff = None,
+                 cache_dir = CACHE_DIR, n_jobs = -1, halving_factor = None, refit = True,
+                 incremental = True):
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.scoring = scoring
+        self.cv = cv
+        self.name = name
+        self.cutoff = cutoff
+        self.cache_dir = cache_dir
+        self.n_jobs = n_jobs
+        self.halving_factor = halving_factor
+        self.refit = refit
+        self.incremental = incremental
+
+    @profiled
+    def fit(self, X, y):
+        fit_searches([(self, X, y)], n_jobs = self.n_jobs)
+        return self
+
+    def _search(self, X, y):
+        """
+        Generator driving the search: yields lists of tasks for _score_task and receives their
+        results, one rung at a time.
+        """
+        X = shared_array(X, self.cache_dir)
+        y = np.asarray(y)
+        cv = StratifiedKFold(self.cv) if isinstance(self.cv, int) else self.cv
+        folds = list(cv.split(X, y))
+        candidates = list(ParameterGrid(self.param_grid))
+        name = self.name or type(self.estimator).__name__
+        cache = ScoreCache(self.cache_dir, name, self.cutoff,
+                           _fingerprint(X, y, folds, self.estimator, self.scoring,
+                                        self.incremental))
+
+        scores = np.full([len(candidates), len(folds)], np.nan)
+        reached = np.zeros(len(candidates))
+        rung_scores = np.full(len(candidates), np.nan)
+        alive = list(range(len(candidates)))
+        path = _path_param(self.estimator, candidates) if self.incremental else None
+        for fraction in _rungs(len(candidates), self.halving_factor):
+            size = None if fraction == 1 else fraction
+            pending = dict()
+            for candidate in alive:
+                for fold, (train, test) in enumerate(folds):
+                    key = cache.key(candidates[candidate], fold, size)
+                    if key not in cache:
+                        pending.setdefault(fold, []).append(candidate)
+            tasks, owners = [], []
+            for fold, members in pending.items():
+                train, test = _subsample(folds[fold][0], fraction, y), folds[fold][1]
+                for group in _group(candidates, members, path):
+                    tasks.append((self.estimator, [candidates[c] for c in group], X, y, train,
+                                  test, self.scoring, path))
+                    owners.append((fold, group))
+            results = yield tasks
+            for (fold, group), task_scores in zip(owners, results):
+                for candidate, score in zip(group, task_scores):
+                    cache[cache.key(candidates[candidate], fold, size)] = score
+            cache.save()
+
+            rung = np.array([[cache[cache.key(candidates[c], fold, size)]
+                              for fold in range(len(folds))] for c in alive])
+            reached[alive] = fraction
+            rung_scores[alive] = rung.mean(axis = 1)
+            if fraction == 1:
+                scores[alive] = rung
+            else:
+                keep = int(math.ceil(len(alive) / float(self.halving_factor)))
+                order = np.argsort(-rung_scores[alive], kind = 'mergesort')
+                alive = sorted(alive[i] for i in order[:keep])
+
+        self._set_results(candidates, scores, reached, rung_scores, X, y)
+
+    def _set_results(self, candidates, scores, reached, rung_scores, X, y):
+        mean = scores.mean(axis = 1)
+        order = np.argsort(-np.where(np.isnan(mean), -np.inf, mean), kind = 'mergesort')
+        rank = np.empty(len(candidates), dtype = int)
+        rank[order] = np.arange(1, len(candidates) + 1)
+        for i in range(1, len(order)):
+            if mean[order[i]] == mean[order[i - 1]]:
+                rank[order[i]] = rank[order[i - 1]]
+
+        results = {'params': candidates}
+        for key in sorted(set(key for candidate in candidates for key in candidate)):
+            results['param_' + key] = np.array([candidate.get(key) for candidate in candidates],
+                                               dtype = object)
+        for fold in range(scores.shape[1]):
+            results['split{}_test_score'.format(fold)] = scores[:, fold]
+        results['mean_test_score'] = mean
+        results['std_test_score'] = scores.std(axis = 1)
+        results['rank_test_score'] = rank
+        if self.halving_factor is not None:
+            results['resource_fraction'] = reached
+            results['halving_score'] = rung_scores
+        self.cv_results_ = results
+
+        self.best_index_ = int(order[0])
+        self.best_params_ = candidates[self.best_index_]
+        self.best_score_ = mean[self.best_index_]
+        if self.refit:
+            self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_)
+            self.best_estimator_.fit(X, y)
+
+@profiled
+def fit_searches(searches, n_jobs = -1):
+    """
+    Fits several searches at once so that all of their cells share one process pool, e.g.
+    fit_searches([(grid_lr, X_lr, y), (grid_ada, X_ada, y), ...]). Scores are written to the
+    cache after every round (every successive halving rung).
+
+    INPUT:
+    - searches: list of (CachedGridSearchCV, X, y) tuples
+    - n_jobs: number of worker processes
+    """
+    drivers = [search._search(X, y) for search, X, y in searches]
+    requests = [next(driver) for driver in drivers]
+    with Parallel(n_jobs = n_jobs) as parallel:
+        while drivers:
+            tasks = [task for request in requests for task in request]
+            results = parallel(delayed(_score_task)(*task) for task in tasks)
+            next_drivers, next_requests = [], []
+            for driver, request in zip(drivers, requests):
+                try:
+                    next_requests.append(driver.send(results[:len(request)]))
+                    next_drivers.append(driver)
+                except StopIteration:
+                    pass
+                results = results[len(request):]
+            drivers, requests = next_drivers, next_requests
+
+def shared_array(X, cache_dir = CACHE_DIR):
+    """
+    Returns a read-only memory-mapped copy of X stored under cache_dir, named by the hash of its
+    contents. Worker processes receive the path of the file instead of a copy of the data.
+    """
+    if isinstance(X, np.memmap):
+        return X
+    X = np.ascontiguousarray(X, dtype = float)
+    folder = os.path.join(cache_dir, 'arrays')
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    path = os.path.join(folder, '{}.npy'.format(_array_hash(X)))
+    if not os.path.exists(path):
+        np.save(path, X)
+    return np.load(path, mmap_mode = 'r')
+
+class ScoreCache(dict):
+    """
+    Scores of one model and training-year cutoff, stored as a JSON file. The cache is emptied
+    when the training data, folds, estimator or scoring it was built with change.
+    """
+
+    def __init__(self, cache_dir, name, cutoff, fingerprint):
+        super(ScoreCache, self).__init__()
+        self.path = os.path.join(cache_dir, '{}_{}.json'.format(name, cutoff))
+        self.fingerprint = fingerprint
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+            if stored['fingerprint'] == fingerprint:
+                self.update(stored['scores'])
+        except (IOError, ValueError, KeyError):
+            pass
+
+    @staticmethod
+    def key(params, fold, size = None):
+        return json.dumps([sorted(params.items()), fold, size], default = _json_default)
+
+    def save(self):
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump({'fingerprint': self.fingerprint, 'scores': self}, f)
+        os.replace(self.path + '.tmp', self.path)
+
+@profiled
+def _score_task(estimator, params_list, X, y, train, test, scoring, path = None):
+    """
+    Fits a clone of estimator with each set of parameters on the training rows and returns the
+    scores on the test rows. The parameter sets of a task differ only in path, if given:
+    - 'n_estimators': one ensemble of the largest size is fitted and every smaller ensemble is
+      scored from its staged predictions
+    - 'C': the models are fitted in order of increasing C, each warm-started from the last
+    """
+    scorer = get_scorer(scoring) if isinstance(scoring, str) else scoring
+    X_train, y_train, X_test, y_test = X[train], y[train], X[test], y[test]
+    if path == 'n_estimators':
+        sizes = [params['n_estimators'] for params in params_list]
+        model = clone(estimator).set_params(**dict(params_list[0], n_estimators = max(sizes)))
+        model.fit(X_train, y_train)
+        stages = _Stages(model, X_test)
+        return [float(scorer(stages.at(size), X_test, y_test)) for size in sizes]
+
+    scores = [None] * len(params_list)
+    order = range(len(params_list))
+    model = clone(estimator)
+    if path == 'C':
+        order = sorted(order, key = lambda i: params_list[i]['C'])
+        model.set_params(warm_start = True)
+    for i in order:
+        if path != 'C':
+            model = clone(estimator)
+        model.set_params(**params_list[i])
+        model.fit(X_train, y_train)
+        scores[i] = float(scorer(model, X_test, y_test))
+    return scores
+
+def _path_param(estimator, candidates):
+    """
+    Returns the parameter along which candidates can be evaluated incrementally, if any.
+    """
+    names = set(key for candidate in candidates for key in candidate)
+    params = estimator.get_params(deep = False)
+    if 'n_estimators' in names and hasattr(estimator, 'staged_predict'):
+        return 'n_estimators'
+    # liblinear ignores warm_start, so its C values are fitted from scratch
+    if 'C' in names and 'warm_start' in params and params.get('solver') != 'liblinear':
+        return 'C'
+    return None
+
+def _group(candidates, members, path):
+    """
+    Splits the candidates to be scored on one fold into groups evaluated by a single task: all
+    candidates that differ only in the path parameter form one group.
+    """
+    if path is None:
+        return [[candidate] for candidate in members]
+    groups = dict()
+    for candidate in members:
+        others = dict((key, value) for key, value in candidates[candidate].items() if key != path)
+        groups.setdefault(ScoreCache.key(others, None), []).append(candidate)
+    return list(groups.values())
+
+class _Stages(object):
+    """
+    Computes the staged predictions of a fitted ensemble on X once and exposes each stage as a
+    classifier that a scorer can call.
+    """
+
+    def __init__(self, model, X):
+        self.model = model
+        self.X = X
+        self.outputs = dict()
+
+    def at(self, size):
+        return _Stage(self, size)
+
+    def output(self, method, size):
+        if method not in self.outputs:
+            self.outputs[method] = list(getattr(self.model, 'staged_' + method)(self.X))
+        outputs = self.outputs[method]
+        # Boosting may stop early, in which case larger ensembles equal the last stage
+        return outputs[min(size, len(outputs)) - 1]
+
+class _Stage(ClassifierMixin, BaseEstimator):
+    """
+    Predictions of the first size estimators of an ensemble on the test rows of a task.
+    """
+
+    def __init__(self, stages = None, size = None):
+        self.stages = stages
+        self.size = size
+        self.classes_ = stages.model.classes_
+
+    def predict(self, X):
+        return self.stages.output('predict', self.size)
+
+    def predict_proba(self, X):
+        return self.stages.output('predict_proba', self.size)
+
+    def decision_function(self, X):
+        return self.stages.output('decision_function', self.size)
+
+def _rungs(num_candidates, halving_factor):
+    """
+    Returns the fractions of each training fold used at every successive halving rung.
+    """
+    if halving_factor is None or num_candidates <= halving_factor:
+        return [1.0]
+    num_rungs = int(math.ceil(math.log(num_candidates) / math.log(halving_factor)))
+    return [float(halving_factor) ** (k - num_rungs + 1) for k in range(num_rungs)]
+
+def _subsample(train, fraction, y):
+    """
+    Returns a stratified subsample of the training rows of a fold.
+    """
+    if fraction == 1:
+        return train
+    _, subsample = next(StratifiedKFold(int(round(1 / fraction))).split(train, y[train]))
+    return train[subsample]
+
+def _fingerprint(X, y, folds, estimator, scoring, incremental = False):
+    digest = hashlib.sha1()
+    digest.update(_array_hash(X).encode())
+    digest.update(np.ascontiguousarray(y).tobytes())
+    for _, test in folds:
+        digest.update(np.asarray(test).tobytes())
+    digest.update(json.dumps(estimator.get_params(deep = False), sort_keys = True,
+                             default = _json_default).encode())
+    digest.update(repr(scoring).encode())
+    # Warm-started and staged scores may differ slightly from those of fits from scratch
+    digest.update(repr(bool(incremental)).encode())
+    return digest.hexdigest()
+
+def _array_hash(X):
+    digest = hashlib.sha1(str(X.shape).encode())
+    digest.update(memoryview(np.ascontiguousarray(X)).cast('B'))
+    return digest.hexdigest()
+
+def _json_default(x):
+    return x.item() if isinstance(x, np.generic) else repr(x)
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+These helper functions verify the output of helpers.cleaning.encode without printing or
+plotting anything per column. The value counts of every raw and encoded column, the number of
+'Don't know' responses and the change in missing values are computed in one pass over the
+whole frame, collected in a report that is written once as JSON or HTML, and response codes
+that no rule (or the codebook) expects raise an error before the encoded data is used.
+
+"""
+
+import json
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import helpers.cleaning as cln
+from helpers.profiling import profiled
+
+@profiled
+def verify_encoding(in_df, out_df, rules, codebook = None, codes = None, max_values = 30):
+    """
+    Compares every encoded feature of out_df with the raw column of in_df it was built from.
+
+    INPUT:
+    - in_df: DataFrame passed to helpers.cleaning.encode
+    - out_df: DataFrame returned by helpers.cleaning.encode
+    - rules: list of EncodingRule or a DataFrame produced by rule_table
+    - codebook: optional helpers.codebook.Codebook; raw response codes of a variable that are
+      not among the codes listed by the codebook are reported as unexpected. Variables without
+      listed valid codes are not checked, and numerical features may take any value between
+      their lowest and highest valid code (e.g. 2 to 99 for 'VCF0291', whose codebook labels
+      only the end points and the middle of the scale).
+    - codes: optional dict from raw column name to its allowed response codes, taking
+      precedence over the codebook
+    - max_values: number of most frequent values kept in the value counts of a column
+
+    OUTPUT:
+    - OrderedDict keyed by encoded feature name, holding for each feature a dict with:
+      - kind, column: kind of the rule and the raw column
+      - counts_in, counts_out: lists of [value, count] pairs of the raw response codes and of
+        the encoded values, in value order
+      - num_values_in, num_values_out: number of distinct values
+      - nan_in, nan_out, nan_delta: missing values before and after encoding, and the number
+        of missing values added by the encoding
+      - dk: number of respondents flagged in the '_dk' column (None if there is none)
+      - unexpected: list of [value, count] pairs of unexpected raw codes or, for one-hot
+        features, of respondents in no category
+      - unmapped: list of [value, count] pairs of encoded values other than 0 and 1 left by a
+        binary rule that substitutes codes (e.g. codes 3 and 4 of 'VCF0350', which the codebook
+        lists but the rule does not replace); these are reported but not unexpected
+    """
+    rules = cln.expand_rules(in_df, rules)
+    raw_columns = list(OrderedDict.fromkeys(rule.column for rule in rules))
+    raw = raw_codes(in_df, rules)
+    raw_index = {column: index for index, column in enumerate(raw_columns)}
+
+    features = [_feature_name(rule) for rule in rules]
+    out = out_df.loc[:, features].to_numpy(dtype = np.float64)
+    raw_counts = value_counts(raw)
+    out_counts = value_counts(out)
+    nan_in = in_df.loc[:, raw_columns].isnull().to_numpy().sum(axis = 0)
+    nan_out = np.isnan(out).sum(axis = 0)
+
+    report = OrderedDict()
+    for index, (rule, name) in enumerate(zip(rules, features)):
+        column_index = raw_index[rule.column]
+        counts_in = raw_counts[column_index]
+        counts_out = out_counts[index]
+        entry = OrderedDict()
+        entry['kind'] = rule.kind
+        entry['column'] = rule.column
+        entry['counts_in'] = _top(counts_in, max_values)
+        entry['counts_out'] = _top(counts_out, max_values)
+        entry['num_values_in'] = len(counts_in[0])
+        entry['num_values_out'] = len(counts_out[0])
+        entry['nan_in'] = int(nan_in[column_index])
+        entry['nan_out'] = int(nan_out[index])
+        entry['nan_delta'] = entry['nan_out'] - entry['nan_in']
+        entry['dk'] = int(out_df[name + '_dk'].sum()) if name + '_dk' in out_df else None
+        entry['unexpected'] = _unexpected(rule, name, counts_in, out_df, raw[:, column_index],
+                                          codebook, codes)
+        entry['unmapped'] = _unmapped(rule, counts_out)
+        report[name] = entry
+    return report
+
+def raw_codes(in_df, rules):
+    """
+    Returns the raw values the rules operate on as a float matrix with one column per distinct
+    raw column (in rule order): the leading response code of string coded columns, the number
+    matched by the rule's pattern, or the value itself for numerical columns. Missing values
+    stay missing; columns that are none of these (e.g. ranges) are all missing.
+    """
+    rules = cln.expand_rules(in_df, rules)
+    first_rules = OrderedDict()
+    for rule in rules:
+        first_rules.setdefault(rule.column, rule)
+    columns = list(first_rules)
+    raw = np.full((len(in_df), len(columns)), np.nan)
+
+    parsed = [index for index, rule in enumerate(first_rules.values())
+              if rule.parse_string and rule.pattern is None]
+    if parsed:
+        parsed_columns = [columns[index] for index in parsed]
+        missing = in_df.loc[:, parsed_columns].isnull().to_numpy()
+        codes = cln.parse_codes(in_df, parsed_columns, ['0'] * len(parsed)).astype(np.float64)
+        raw[:, parsed] = np.where(missing, np.nan, codes)
+    for index, rule in enumerate(first_rules.values()):
+        if index in parsed:
+            continue
+        column = in_df[rule.column]
+        if rule.pattern is not None:
+            raw[:, index] = column.str.extract(rule.pattern, expand = False).astype(np.float64)
+        elif pd.api.types.is_numeric_dtype(column):
+            raw[:, index] = column.to_numpy(dtype = np.float64)
+    return raw
+
+def value_counts(X):
+    """
+    Returns the value counts of every column of the float matrix X, ignoring missing values, as
+    a list of (values, counts) array pairs in value order. All columns are counted by a single
+    sort of the matrix.
+    """
+    n, k = X.shape
+    valid = (~np.isnan(X)).sum(axis = 0)
+    # Sorting moves the missing values of every column to its end
+    S = np.sort(X, axis = 0).T.ravel()
+    positions = np.arange(n * k)
+    column = positions // n
+    row = positions % n
+    starts = (row < valid[column]) & ((row == 0) | (S != np.roll(S, 1)))
+    starts = np.flatnonzero(starts)
+    ends = np.minimum(np.append(starts[1:], n * k), column[starts] * n + valid[column[starts]])
+    boundaries = np.searchsorted(column[starts], np.arange(k + 1))
+    values, counts = S[starts], ends - starts
+    return [(values[boundaries[j]:boundaries[j + 1]], counts[boundaries[j]:boundaries[j + 1]])
+            for j in range(k)]
+
+def summary(report):
+    """
+    Returns the report as a DataFrame with one row per encoded feature and the value counts,
+    unexpected and unmapped codes written as text.
+    """
+    rows = OrderedDict()
+    for name, entry in report.items():
+        row = OrderedDict((key, value) for key, value in entry.items()
+                          if key not in ('counts_in', 'counts_out', 'unexpected', 'unmapped'))
+        row['counts_in'] = _format_counts(entry['counts_in'])
+        row['counts_out'] = _format_counts(entry['counts_out'])
+        row['unexpected'] = _format_counts(entry['unexpected'])
+        row['unmapped'] = _format_counts(entry['unmapped'])
+        rows[name] = row
+    return pd.DataFrame.from_dict(rows, orient = 'index')
+
+def unexpected(report):
+    """
+    Returns the part of the report holding features with unexpected codes.
+    """
+    return OrderedDict((name, entry) for name, entry in report.items() if entry['unexpected'])
+
+def check_report(report):
+    """
+    Raises a ValueError naming every feature with unexpected codes.
+    """
+    bad = unexpected(report)
+    if bad:
+        details = ['{} ({}): {}'.format(name, entry['column'],
+                                        _format_counts(entry['unexpected']))
+                   for name, entry in bad.items()]
+        raise ValueError('Unexpected codes in {} features:\n'.format(len(bad)) +
+                         '\n'.join(details))
+
+def write_report(report, path):
+    """
+    Writes the report to path, as HTML if path ends with '.html' and as JSON otherwise.
+    """
+    if path.endswith('.html'):
+        table = summary(report)
+        bad = unexpected(report)
+        with open(path, 'w') as f:
+            f.write('<html><head><meta charset="utf-8"><title>Encoding report</title></head>'
+                    '<body>\n<h1>Encoding report</h1>\n')
+            f.write('<p>{} features, {} with unexpected codes, {} with unmapped binary codes.'
+                    '</p>\n'.format(len(table), len(bad),
+                                    sum(1 for entry in report.values() if entry['unmapped'])))
+            if bad:
+                f.write('<h2>Unexpected codes</h2>\n')
+                f.write(table.loc[list(bad)].to_html() + '\n')
+            f.write('<h2>All features</h2>\n')
+            f.write(table.to_html() + '\n</body></html>\n')
+    else:
+        with open(path, 'w') as f:
+            json.dump(report, f, indent = 1)
+
+def _feature_name(rule):
+    """
+    Returns the encoded column compared with the raw column of a rule: the column itself, the
+    lower bound of a range, or the first one-hot column.
+    """
+    name = cln._output_name(rule)
+    if rule.kind == 'range':
+        return name + '_r1'
+    if rule.kind == 'onehot':
+        return name + '_oh0'
+    return name
+
+def _unmapped(rule, counts_out):
+    if rule.kind != 'binary' or cln._is_missing(rule.replace_value):
+        return []
+    # A binary rule that substitutes codes is meant to leave only 0 and 1
+    values, counts = counts_out
+    bad = (values != 0) & (values != 1)
+    return _pairs(values[bad], counts[bad])
+
+def _unexpected(rule, name, counts_in, out_df, raw, codebook, codes):
+    if rule.kind == 'onehot':
+        onehot = out_df.loc[:, out_df.columns.str.startswith(name[:-1])].to_numpy()
+        # Respondents with a response code in none of the categories of the schema
+        count = int(((onehot.sum(axis = 1) == 0) & ~np.isnan(raw)).sum())
+        found = [['none', count]] if count else []
+    else:
+        found = []
+    if rule.kind in ('copy', 'range'):
+        return found
+    allowed = _allowed_codes(rule, codebook, codes)
+    if allowed is not None:
+        values, counts = counts_in
+        bad = ~allowed(values)
+        found = found + _pairs(values[bad], counts[bad])
+    return found
+
+def _allowed_codes(rule, codebook, codes):
+    """
+    Returns a function telling which raw values of a rule's column are expected, or None if
+    there is nothing to check against.
+    """
+    if codes is not None and rule.column in codes:
+        listed = np.asarray(list(codes[rule.column]), dtype = np.float64)
+        return lambda values: np.isin(values, listed)
+    if codebook is None or rule.column not in codebook:
+        return None
+    entry = codebook[rule.column]
+    if not entry['valid_codes']:
+        return None
+    numbers, ranges = [], []
+    for code in list(entry['valid_codes']) + list(entry['missing_codes']):
+        bounds = code.split('-')
+        try:
+            bounds = [int(bound) for bound in bounds]
+        except ValueError:
+            continue
+        if len(bounds) == 1:
+            numbers.append(bounds[0])
+        elif len(bounds) == 2:
+            ranges.append(bounds)
+    if rule.kind == 'numerical':
+        valid = [int(code) for code in entry['valid_codes'] if code.isdigit()]
+        if valid:
+            ranges.append([min(valid), max(valid)])
+    if rule.parse_string and rule.pattern is None:
+        # Only the leading digit of string coded responses is parsed
+        numbers = [int(str(number)[0]) for number in numbers] + \
+            [int(str(number)[0]) for low, high in ranges for number in range(low, high + 1)]
+        ranges = []
+    numbers = np.asarray(numbers, dtype = np.float64)
+
+    def allowed(values):
+        ok = np.isin(values, numbers)
+        for low, high in ranges:
+            ok |= (values >= low) & (values <= high)
+        return ok
+    return allowed
+
+def _pairs(values, counts):
+    return [[_json_number(value), int(count)] for value, count in zip(values, counts)]
+
+def _top(counts, max_values):
+    values, counts = counts
+    if len(values) > max_values:
+        keep = np.sort(np.argsort(-counts, kind = 'stable')[:max_values])
+        values, counts = values[keep], counts[keep]
+    return _pairs(values, counts)
+
+def _json_number(value):
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+def _format_counts(pairs):
+    return ', '.join('{}: {}'.format(value, count) for value, count in pairs)
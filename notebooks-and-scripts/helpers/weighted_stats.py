@@ -7,21 +7,27 @@ Created on Fri Mar 17 13:10:35 2017
 """
 
 import numpy as np
+import pandas as pd
+from scipy import sparse
+from helpers.profiling import profiled
 
 def weighted_mean(x, w):
     if len(x) != len(w):
         raise AssertionError('Dimensions do not match.')
+    x, w = _complete(x, w)
     return np.dot(x,w) / sum(w)
 
 def weighted_variance(x, w):
     if len(x) != len(w):
         raise AssertionError('Dimensions do not match.')
+    x, w = _complete(x, w)
     mean = weighted_mean(x,w)
     return np.dot(w, (x - mean)**2) / sum(w)
 
 def weighted_covariance(x, y, w):
     if len(x) != len(w) or len(x) != len(y) or len(y) != len(w):
         raise AssertionError('Dimensions do not match.')
+    x, y, w = _complete(x, y, w)
     x_mean = weighted_mean(x,w)
     y_mean = weighted_mean(y,w)
     return sum(w * (x - x_mean) * (y - y_mean)) / sum(w)
@@ -29,16 +35,277 @@ def weighted_covariance(x, y, w):
 def weighted_correlation(x, y, w):
     if len(x) != len(w) or len(x) != len(y) or len(y) != len(w):
         raise AssertionError('Dimensions do not match.')
+    x, y, w = _complete(x, y, w)
     return weighted_covariance(x, y, w) / np.sqrt(weighted_variance(x, w) * weighted_variance(y,w))
     
-def weighted_correlation_matrix(data, w):
-    data = np.array(data)
+@profiled
+def weighted_correlation_matrix(data, w, pairwise = False, chunk_size = None):
+    """
+    Returns the matrix of weighted correlations between the columns of data. The columns are
+    centred once with the weights and the matrix is computed as a single weighted Gram product.
+
+    INPUT:
+    - data: 2D array-like of shape (num_rows, num_cols)
+    - w: weights of the rows
+    - pairwise: if True, each correlation is computed over the rows where both columns are
+      non-missing; otherwise any missing value in a column makes its correlations NaN
+    - chunk_size: if given, the matrix is computed this many rows at a time, which bounds the
+      size of the temporary products of the pairwise statistics (chunk_size x num_cols each)
+      for very wide data. The centred data and the full num_cols x num_cols matrix are still
+      held in memory.
+    """
+    data = np.asarray(data, dtype = float)
+    w = np.asarray(w, dtype = float)
+    if data.shape[0] != len(w):
+        raise AssertionError('Dimensions do not match.')
     num_cols = data.shape[1]
-    corr = np.zeros([num_cols, num_cols])
-    for i in range(0, num_cols):
-        for j in range(0, num_cols):
-            x = data[:,i]
-            y = data[:,j]
-            corr[i][j] = weighted_correlation(x, y, w)
-            
+    if chunk_size is None:
+        chunk_size = max(num_cols, 1)
+    corr = np.empty([num_cols, num_cols])
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        if pairwise:
+            mask = ~np.isnan(data)
+            # Shifting each column by its mean leaves the correlations unchanged and limits
+            # cancellation in the sums of squares below
+            shift = np.nansum(data * w[:, None], axis = 0) / np.dot(w, mask)
+            x = np.where(mask, data - shift, 0)
+            mask = mask.astype(float)
+            wx, wxx, wm = x * w[:, None], x**2 * w[:, None], mask * w[:, None]
+            for start in range(0, num_cols, chunk_size):
+                block = slice(start, start + chunk_size)
+                s_w = np.dot(wm[:, block].T, mask)
+                mean_x = np.dot(wx[:, block].T, mask) / s_w
+                mean_y = np.dot(wm[:, block].T, x) / s_w
+                var_x = np.dot(wxx[:, block].T, mask) / s_w - mean_x**2
+                var_y = np.dot(wm[:, block].T, x**2) / s_w - mean_y**2
+                cov = np.dot(wx[:, block].T, x) / s_w - mean_x * mean_y
+                corr[block] = cov / np.sqrt(var_x * var_y)
+        else:
+            mean = np.dot(w, data) / w.sum()
+            z = (data - mean) * np.sqrt(w / w.sum())[:, None]
+            z /= np.sqrt((z**2).sum(axis = 0))
+            for start in range(0, num_cols, chunk_size):
+                block = slice(start, start + chunk_size)
+                corr[block] = np.dot(z[:, block].T, z)
+
     return corr
+
+### BATCHED STATISTICS ###
+
+def bootstrap_weights(w, num_replicates = 200, strata = None, random_state = None):
+    """
+    Returns a matrix of bootstrap replicate weights. Each replicate resamples respondents with
+    replacement (within each stratum, if given) and multiplies their weights by the number of
+    times they were drawn.
+
+    INPUT:
+    - w: weights of the rows
+    - num_replicates: number of replicates
+    - strata: optional array-like (or list of array-likes) of stratum keys, e.g. year
+    - random_state: seed or np.random.RandomState
+
+    OUTPUT:
+    - replicates: array of shape (len(w), num_replicates)
+    """
+    w = np.asarray(w, dtype = float)
+    rng = random_state if isinstance(random_state, np.random.RandomState) \
+        else np.random.RandomState(random_state)
+    counts = np.zeros([len(w), num_replicates])
+    if strata is None:
+        codes, num_strata = np.zeros(len(w), dtype = int), 1
+    else:
+        codes, labels = group_codes(strata)
+        num_strata = len(labels)
+    for stratum in range(num_strata):
+        rows = np.flatnonzero(codes == stratum)
+        draws = rng.randint(0, len(rows), size = [num_replicates, len(rows)])
+        offsets = np.arange(num_replicates)[:, None] * len(rows)
+        hits = np.bincount((draws + offsets).ravel(), minlength = num_replicates * len(rows))
+        counts[rows] = hits.reshape(num_replicates, len(rows)).T
+    return counts * w[:, None]
+
+def group_codes(groups):
+    """
+    Returns integer group codes for the rows and the labels of the groups.
+
+    INPUT:
+    - groups: array-like of keys, a list of array-likes (e.g. [year, state]) or a DataFrame
+
+    OUTPUT:
+    - codes: array of group codes, one per row (-1 where a key is missing)
+    - labels: Index (or MultiIndex) of group labels, in sorted order
+    """
+    if isinstance(groups, pd.DataFrame):
+        groups = [groups[column] for column in groups.columns]
+    elif not isinstance(groups, list):
+        groups = [groups]
+    if len(groups) == 1:
+        codes, labels = pd.factorize(np.asarray(groups[0]), sort = True)
+        return codes, pd.Index(labels, name = getattr(groups[0], 'name', None))
+    labels = pd.MultiIndex.from_arrays(groups)
+    codes, labels = pd.factorize(labels, sort = True)
+    labels.names = [getattr(group, 'name', None) for group in groups]
+    return codes, labels
+
+def weighted_sums(data, w, codes, num_groups):
+    """
+    Returns the weighted counts, sums and sums of squares of every column of data in every group
+    and for every weight vector, computed with one sparse product over the data. Missing values
+    are excluded.
+
+    INPUT:
+    - data: 2D array of shape (num_rows, num_cols)
+    - w: weights of shape (num_rows,) or (num_rows, num_replicates)
+    - codes: group code of every row, or -1 for rows to leave out
+    - num_groups: number of groups
+
+    OUTPUT:
+    - sum_w, sum_wx, sum_wxx: arrays of shape (num_groups, num_replicates, num_cols)
+    """
+    data = np.asarray(data, dtype = float)
+    if data.ndim == 1:
+        data = data[:, None]
+    w = np.asarray(w, dtype = float)
+    if w.ndim == 1:
+        w = w[:, None]
+    num_rows, num_replicates = w.shape
+    if data.shape[0] != num_rows or len(codes) != num_rows:
+        raise AssertionError('Dimensions do not match.')
+
+    codes = np.asarray(codes)
+    # Rows with missing group keys (code -1) belong to no group
+    if (codes < 0).any():
+        keep = codes >= 0
+        data, w, codes = data[keep], w[keep], codes[keep]
+        num_rows = len(codes)
+    mask = ~np.isnan(data)
+    x = np.where(mask, data, 0)
+    # Row (group, replicate) of the indicator holds the replicate weights of the group's rows
+    rows = (codes[:, None] * num_replicates + np.arange(num_replicates)).ravel()
+    columns = np.repeat(np.arange(num_rows), num_replicates)
+    indicator = sparse.csr_matrix((w.ravel(), (rows, columns)),
+                                  shape = [num_groups * num_replicates, num_rows])
+    shape = [num_groups, num_replicates, data.shape[1]]
+    sum_w = (indicator @ mask.astype(float)).reshape(shape)
+    sum_wx = (indicator @ x).reshape(shape)
+    sum_wxx = (indicator @ x**2).reshape(shape)
+    return sum_w, sum_wx, sum_wxx
+
+def weighted_stats(data, w, groups = None, replicates = None, scale = None):
+    """
+    Returns the weighted mean and variance of every column of data within every group, in a
+    single pass. The mean of a 0/1 column is the weighted proportion. Missing values are
+    excluded column by column.
+
+    INPUT:
+    - data: DataFrame (or 2D array) of columns to summarize
+    - w: weights of the rows
+    - groups: optional group keys, see group_codes
+    - replicates: optional replicate weight matrix of shape (num_rows, num_replicates), e.g.
+      from bootstrap_weights, used to compute standard errors
+    - scale: see replicate_se
+
+    OUTPUT:
+    - DataFrame indexed by (group, column) with columns 'weight', 'mean' and 'variance', plus
+      'mean_se' and 'variance_se' if replicates are given
+    """
+    if not isinstance(data, pd.DataFrame):
+        data = pd.DataFrame(np.asarray(data))
+    weights = np.asarray(w, dtype = float)[:, None]
+    if replicates is not None:
+        weights = np.hstack([weights, np.asarray(replicates, dtype = float)])
+    if groups is None:
+        codes, labels = np.zeros(len(data), dtype = int), pd.Index(['all'])
+    else:
+        codes, labels = group_codes(groups)
+
+    sum_w, sum_wx, sum_wxx = weighted_sums(data.to_numpy(dtype = float), weights, codes,
+                                           len(labels))
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        mean = sum_wx / sum_w
+        variance = sum_wxx / sum_w - mean**2
+
+    if isinstance(labels, pd.MultiIndex):
+        index = pd.MultiIndex.from_tuples([label + (column,) for label in labels
+                                           for column in data.columns],
+                                          names = list(labels.names) + [None])
+    else:
+        index = pd.MultiIndex.from_product([labels, data.columns], names = [labels.name, None])
+    stats = pd.DataFrame({'weight': sum_w[:, 0].ravel(), 'mean': mean[:, 0].ravel(),
+                          'variance': variance[:, 0].ravel()}, index = index)
+    if replicates is not None:
+        stats['mean_se'] = replicate_se(np.moveaxis(mean[:, 1:], 1, -1), mean[:, 0],
+                                        scale).ravel()
+        stats['variance_se'] = replicate_se(np.moveaxis(variance[:, 1:], 1, -1),
+                                            variance[:, 0], scale).ravel()
+    return stats
+
+def weighted_crosstab(index, columns, w, normalize = False, replicates = None, scale = None):
+    """
+    Returns a weighted cross-tabulation of two (sets of) keys, e.g. vote intention by year.
+
+    INPUT:
+    - index: keys of the table rows, see group_codes
+    - columns: keys of the table columns, see group_codes
+    - w: weights of the rows
+    - normalize: False for weighted totals, or 'all', 'index' or 'columns' for proportions of
+      the grand total, of each row or of each column
+    - replicates: optional replicate weight matrix, see weighted_stats
+    - scale: see replicate_se
+
+    OUTPUT:
+    - table: DataFrame of weighted totals or proportions
+    - se: DataFrame of standard errors (only returned if replicates are given)
+    """
+    row_codes, row_labels = group_codes(index)
+    column_codes, column_labels = group_codes(columns)
+    weights = np.asarray(w, dtype = float)[:, None]
+    if replicates is not None:
+        weights = np.hstack([weights, np.asarray(replicates, dtype = float)])
+
+    codes = row_codes * len(column_labels) + column_codes
+    sum_w = weighted_sums(np.ones([len(codes), 1]), weights, codes,
+                          len(row_labels) * len(column_labels))[0]
+    totals = sum_w[:, :, 0].reshape(len(row_labels), len(column_labels), -1)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        if normalize == 'all':
+            totals = totals / totals.sum(axis = (0, 1), keepdims = True)
+        elif normalize == 'index':
+            totals = totals / totals.sum(axis = 1, keepdims = True)
+        elif normalize == 'columns':
+            totals = totals / totals.sum(axis = 0, keepdims = True)
+        elif normalize:
+            raise ValueError('Unknown normalize option: {}'.format(normalize))
+
+    table = pd.DataFrame(totals[:, :, 0], index = row_labels, columns = column_labels)
+    if replicates is None:
+        return table
+    se = replicate_se(totals[:, :, 1:], totals[:, :, 0], scale)
+    return table, pd.DataFrame(se, index = row_labels, columns = column_labels)
+
+def replicate_se(estimates, estimate, scale = None):
+    """
+    Returns replicate standard errors, sqrt(scale * sum((estimates - estimate)**2)).
+
+    INPUT:
+    - estimates: replicate estimates, with replicates along the last axis
+    - estimate: full-sample estimate
+    - scale: variance multiplier of the replicate method; defaults to 1 / (num_replicates - 1)
+      as for the bootstrap (e.g. use (num_replicates - 1) / num_replicates for the jackknife)
+    """
+    estimates = np.asarray(estimates)
+    if scale is None:
+        scale = 1 / (estimates.shape[-1] - 1)
+    estimate = np.asarray(estimate)[..., None] if np.ndim(estimate) else estimate
+    return np.sqrt(scale * np.nansum((estimates - estimate)**2, axis = -1))
+
+def _complete(*arrays):
+    """
+    Returns the arrays restricted to the rows where none of them are missing.
+    """
+    arrays = [np.asarray(array, dtype = float) for array in arrays]
+    keep = np.all([~np.isnan(array) for array in arrays], axis = 0)
+    if keep.all():
+        return arrays
+    return [array[keep] for array in arrays]
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Fixtures shared by the tests: synthetic survey data from helpers.synthetic, filtered by the
+arguments of '01 Data Filtering.py' and encoded by the rules of '02 Data Cleaning.py'. The
+data is generated once per test session.
+
+"""
+
+import os
+import sys
+import warnings
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPT_DIR)
+
+import helpers.benchmarks as bm
+import helpers.cleaning as cln
+import helpers.synthetic as syn
+from helpers.codebook import Codebook
+
+NUM_ROWS = 800
+
+@pytest.fixture(scope = 'session')
+def rules():
+    return bm.script_rules(os.path.join(SCRIPT_DIR, '02 Data Cleaning.py'))
+
+@pytest.fixture(scope = 'session')
+def abridged(rules):
+    """
+    Synthetic abridged survey data, as '02 Data Cleaning.py' reads it.
+    """
+    filtering = bm.script_filter(os.path.join(SCRIPT_DIR, '01 Data Filtering.py'))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        df = syn.abridged_frame(NUM_ROWS, rules, filtering, Codebook(), random_state = 0)
+    return df.drop('Unnamed: 0', axis = 1)
+
+@pytest.fixture(scope = 'session')
+def encoded(abridged, rules):
+    return cln.encode(abridged, rules)
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Tests of helpers.backtest on synthetic survey data.
+
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+import helpers.backtest as bt
+from helpers.project import FeatureGenerator
+from helpers.scoring import LABEL, LEAKAGE
+
+def test_year_blocks_learn_the_features_before_the_earliest_cutoff(encoded):
+    blocks = bt.year_blocks(encoded, [2008, 2012])
+    assert list(blocks) == [2000, 2004, 2008, 2012]
+    X = encoded.drop(['congressional_district', 'state', LABEL, 'year', 'weight', 'respondent'],
+                     axis = 1)
+    X = X.loc[:, ~X.columns.str.contains('|'.join(LEAKAGE))]
+    expected = FeatureGenerator().fit(X.loc[encoded.year < 2008]).transform(X)
+    pd.testing.assert_frame_equal(pd.concat([block['X'] for block in blocks.values()]),
+                                  expected.loc[encoded.sort_values('year', kind = 'stable')
+                                               .index])
+    for year, block in blocks.items():
+        np.testing.assert_array_equal(block['y'], encoded.loc[encoded.year == year, LABEL] == 0)
+
+def test_year_blocks_do_not_depend_on_the_test_years(encoded):
+    blocks = bt.year_blocks(encoded, [2008])
+    # Thermometers and intensities learned from the test years would change the training blocks
+    changed = encoded.copy()
+    numeric = changed.columns[changed.dtypes == np.float64].drop(['year', 'weight', LABEL],
+                                                                 errors = 'ignore')
+    changed.loc[changed.year >= 2008, numeric] = 100.
+    changed_blocks = bt.year_blocks(changed, [2008])
+    for year in [2000, 2004]:
+        pd.testing.assert_frame_equal(changed_blocks[year]['X'], blocks[year]['X'])
+
+def test_year_blocks_need_a_training_year(encoded):
+    with pytest.raises(ValueError):
+        bt.year_blocks(encoded, [2000])
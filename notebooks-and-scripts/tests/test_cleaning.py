@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Tests of helpers.cleaning on synthetic survey data.
+
+"""
+
+import pandas as pd
+import helpers.cleaning as cln
+
+def test_parallel_encoding_matches_serial(abridged, rules, encoded):
+    parallel = cln.encode(abridged, rules, n_jobs = 2, parallel_min_rows = 0)
+    pd.testing.assert_frame_equal(parallel, encoded)
+
+def test_small_data_is_encoded_serially(abridged, rules, encoded, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError('encode ran in worker processes')
+    monkeypatch.setattr(cln, '_encode_parallel', fail)
+    assert len(abridged) < cln.PARALLEL_MIN_ROWS
+    pd.testing.assert_frame_equal(cln.encode(abridged, rules, n_jobs = 4), encoded)
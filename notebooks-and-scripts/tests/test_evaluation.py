@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Tests of helpers.evaluation on synthetic survey data.
+
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.metrics import f1_score
+import helpers.evaluation as ev
+from helpers.scoring import LABEL
+
+@pytest.fixture(scope = 'module')
+def predictions(encoded):
+    y = (encoded[LABEL] == 0).to_numpy()
+    y_pred = np.random.RandomState(0).uniform(size = len(y))
+    return y, y_pred, encoded.weight.to_numpy()
+
+def test_threshold_metrics_match_sklearn(predictions):
+    y, y_pred, _ = predictions
+    metrics = ev.threshold_metrics(y, y_pred)
+    for threshold in [0.1, 0.25, 0.5, 0.8]:
+        assert metrics.f1[threshold] == pytest.approx(f1_score(y, y_pred > threshold))
+
+def test_threshold_metrics_of_no_predictions():
+    metrics = ev.threshold_metrics([], [])
+    assert len(metrics) == len(ev.THRESHOLDS)
+    assert (metrics.loc[:, ev.COUNTS] == 0).all().all()
+
+    metrics = ev.threshold_metrics([], [], [], thresholds = [0.5])
+    assert metrics.loc[0.5, ['tp_w', 'fp_w', 'fn_w', 'tn_w']].tolist() == [0, 0, 0, 0]
+
+def test_empty_vector_leaves_the_others_unchanged(predictions):
+    y, y_pred, weights = predictions
+    metrics = ev.batch_threshold_metrics({'empty': ([], [], []), 'all': (y, y_pred, weights)})
+    pd.testing.assert_frame_equal(metrics.loc['all'], ev.threshold_metrics(y, y_pred, weights))
+    assert (metrics.loc['empty', 'tp'] == 0).all()
+
+def test_missing_predictions_are_left_out(predictions):
+    y, y_pred, weights = predictions
+    y_pred = y_pred.copy()
+    y_pred[::7] = np.nan
+    kept = ~np.isnan(y_pred)
+    pd.testing.assert_frame_equal(ev.threshold_metrics(y, y_pred, weights),
+                                  ev.threshold_metrics(y[kept], y_pred[kept], weights[kept]))
+    assert ev.evaluate(y, y_pred, 0.5).tp == ((y_pred > 0.5) & y).sum()
+
+def test_grouped_sums_rejects_missing_predictions():
+    with pytest.raises(ValueError):
+        ev._grouped_sums(np.zeros(2, dtype = int), 1, np.array([0.2, np.nan]), ev.THRESHOLDS,
+                         np.ones((2, 1)))
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Tests of helpers.incremental on synthetic survey data.
+
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+import helpers.backtest as bt
+import helpers.incremental as ic
+
+CUTOFFS = [2004, 2008, 2012]
+
+@pytest.fixture(scope = 'module')
+def blocks(encoded):
+    """
+    Year blocks of 40 columns, some with missing values, whose labels depend on 10 complete
+    columns, so that the models have a signal to learn.
+    """
+    blocks = bt.year_blocks(encoded, CUTOFFS)
+    X = pd.concat([block['X'] for block in blocks.values()])
+    columns = X.columns[X.nunique() > 1][:40]
+    signal = columns[X.loc[:, columns].notnull().all().to_numpy()][:10]
+    rng = np.random.RandomState(0)
+    weights = rng.normal(size = len(signal))
+    means, stds = X.loc[:, signal].mean(), X.loc[:, signal].std()
+    for block in blocks.values():
+        z = np.dot(((block['X'].loc[:, signal] - means) / stds).to_numpy(), weights) - 1
+        block['y'] = rng.uniform(size = len(z)) < 1 / (1 + np.exp(-z))
+        block['X'] = block['X'].loc[:, columns]
+    return blocks
+
+@pytest.fixture(scope = 'module')
+def results(blocks):
+    models = [model for model in ic.MODELS if model[0] in ('lr', 'bnb')]
+    return ic.incremental_backtest(blocks, CUTOFFS, models)
+
+def test_blocks_have_missing_values(blocks):
+    X = pd.concat([block['X'] for block in blocks.values()])
+    assert X.isnull().any().sum() > 10
+
+def test_updated_models_match_a_retraining(results):
+    assert results.matches.all()
+    assert (results.loc[:, ['median_diff', 'mean_diff', 'scale_diff']] < 1e-8).all().all()
+    assert (results.roc_auc > 0.6).all()
+
+def test_bernoulli_counts_are_exact(results):
+    bnb = results.loc[results.model == 'bnb']
+    assert (bnb.probability_diff_max < 1e-8).all()
+
+def test_logistic_regression_matches_lbfgs(blocks):
+    X = pd.concat([block['X'] for block in blocks.values()]).fillna(0).to_numpy()
+    y = np.concatenate([block['y'] for block in blocks.values()])
+    X = (X - X.mean(axis = 0)) / np.where(X.std(axis = 0) > 0, X.std(axis = 0), 1)
+    model = ic.IncrementalLogisticRegression().fit(X, y)
+    reference = LogisticRegression(tol = 1e-10, max_iter = 10000).fit(X, y)
+    np.testing.assert_allclose(model.predict_proba(X), reference.predict_proba(X), atol = 1e-5)
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Tests of helpers.machine_learning on synthetic survey data.
+
+"""
+
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.naive_bayes import BernoulliNB
+from helpers.backtest import preprocessing
+from helpers.machine_learning import SubsetStackingClassifier
+from helpers.scoring import LABEL
+
+@pytest.fixture(scope = 'module')
+def data(encoded):
+    X = encoded.drop([LABEL, 'year', 'weight', 'congressional_district', 'state'], axis = 1)
+    X = X.loc[:, X.notnull().any().to_numpy()]
+    return X, (encoded[LABEL] == 0).to_numpy()
+
+def test_stack_uses_the_columns_of_every_model(data):
+    X, y = data
+    columns = {'lr': X.columns[:40], 'bnb': X.columns[30:90]}
+    stack = SubsetStackingClassifier([('lr', LogisticRegression(solver = 'liblinear'),
+                                       columns['lr']),
+                                      ('bnb', BernoulliNB(), columns['bnb'])],
+                                     preprocessing = preprocessing(), cv = 3, n_jobs = 1)
+    stack.fit(X, y)
+    assert stack.oof_probabilities_.shape == (len(y), 2)
+    for name, model in stack.named_estimators_.items():
+        assert model.n_features_in_ == len(columns[name])
+
+    # Columns are selected by name, so their order and any extra column do not matter
+    shuffled = X.iloc[:, ::-1].assign(extra = 1.)
+    probabilities = stack.predict_proba(X)
+    np.testing.assert_allclose(stack.predict_proba(shuffled), probabilities)
+    np.testing.assert_allclose(probabilities,
+                               stack.blender_.predict_proba(stack.base_probabilities(X)))
+    base = stack.named_estimators_['lr'].predict_proba(X.loc[:, columns['lr']].to_numpy())
+    np.testing.assert_allclose(stack.base_probabilities(X)[:, 0], base[:, 1])
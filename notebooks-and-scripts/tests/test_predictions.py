@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Tests of helpers.predictions on synthetic survey data.
+
+"""
+
+import numpy as np
+import pytest
+from helpers.predictions import PredictionStore
+
+@pytest.fixture
+def store(tmp_path):
+    return PredictionStore(str(tmp_path / 'predictions.store'))
+
+def test_respondent_numbers_are_unique_per_year(encoded):
+    assert not encoded.duplicated(['respondent', 'year']).any()
+
+def test_join_matches_by_respondent_and_year(encoded, store):
+    probabilities = np.random.RandomState(0).uniform(size = len(encoded))
+    store.append(encoded.respondent, encoded.year, probabilities, model = 'lr', cutoff = 2012)
+
+    # Shuffled and reindexed rows still get their own probabilities
+    frame = encoded.loc[:, ['respondent', 'year']].sample(frac = 1, random_state = 1)
+    expected = probabilities[encoded.index.get_indexer(frame.index)]
+    frame = frame.reset_index(drop = True)
+    joined = store.join(frame, [('lr', 2012)])
+    np.testing.assert_array_equal(joined.lr_2012.to_numpy(), expected)
+
+def test_join_leaves_other_years_missing(encoded, store):
+    first = encoded.year == encoded.year.min()
+    store.append(encoded.respondent[first], encoded.year[first], np.full(first.sum(), 0.5),
+                 model = 'lr', cutoff = 2012)
+
+    # The same respondent number in a later year is another respondent
+    frame = encoded.loc[:, ['respondent', 'year']].copy()
+    frame.loc[~first, 'respondent'] = encoded.respondent[first].iloc[0]
+    joined = store.join(frame, [('lr', 2012)], names = ['prediction'])
+    assert (joined.prediction[first] == 0.5).all()
+    assert joined.prediction[~first].isnull().all()
+
+def test_same_respondent_in_two_years(store):
+    store.append([7, 7], [2008, 2012], [0.2, 0.8], model = 'lr', cutoff = 2008)
+    predictions = store.read(['respondent', 'year', 'probability'])
+    assert predictions.probability.tolist() == [0.2, 0.8]
+
+def test_duplicate_respondents_are_rejected(encoded, store):
+    respondents = encoded.respondent.to_numpy().copy()
+    respondents[1] = respondents[0]
+    years = np.full(len(respondents), 2012)
+    with pytest.raises(ValueError):
+        store.append(respondents, years, np.zeros(len(respondents)), model = 'lr',
+                     cutoff = 2012)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 2026
+
+Tests of helpers.scoring on synthetic survey data.
+
+"""
+
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+import helpers.cleaning as cln
+from sklearn.naive_bayes import BernoulliNB
+from helpers.backtest import preprocessing
+from helpers.machine_learning import SubsetStackingClassifier
+from helpers.project import FeatureGenerator
+from helpers.scoring import LABEL, LEAKAGE, MicroBatcher, ScoringModel
+
+@pytest.fixture(scope = 'module')
+def training(abridged, rules, encoded):
+    """
+    Returns the encoding, the fitted FeatureGenerator, the features and the labels.
+    """
+    encoding = {'rules': cln.expand_rules(abridged, rules),
+                'schema': cln.encoding_schema(abridged, rules),
+                'age_mean': encoded.age.mean()}
+    # As '02 Data Cleaning.py' saves the encoded data
+    encoded = encoded.assign(age = encoded.age.replace(0, encoding['age_mean']))
+    X = encoded.loc[:, ~encoded.columns.str.contains('|'.join(LEAKAGE))]
+    X = X.drop([LABEL, 'year', 'weight', 'congressional_district', 'state'], axis = 1)
+    features = FeatureGenerator().fit(X)
+    return encoding, features, features.transform(X), encoded[LABEL] == 0
+
+@pytest.fixture(scope = 'module')
+def model(training):
+    encoding, features, X, y = training
+    estimator = preprocessing()
+    estimator.steps.append(('lr', LogisticRegression(solver = 'liblinear')))
+    estimator.fit(X, y)
+    return ScoringModel(encoding, X.columns, estimator, features = features)
+
+def pre_election(abridged, num_rows = 50):
+    """
+    Returns the first rows of the raw data without the label and the post-election columns.
+    """
+    batch = abridged.head(num_rows)
+    return batch.loc[:, ~batch.columns.str.contains('|'.join(LEAKAGE + [LABEL]))]
+
+def test_encoding_has_no_post_election_rules(model):
+    for rule in model.encoding['rules']:
+        assert rule.column != LABEL
+        assert not any(column in cln._output_name(rule) for column in LEAKAGE)
+    assert 'VCF0104' in model.required_columns
+
+def test_score_without_post_election_columns(model, abridged):
+    batch = pre_election(abridged)
+    result = model.score(batch)
+    assert len(result['probabilities']) == len(batch)
+    assert np.isfinite(result['probabilities']).all()
+    np.testing.assert_allclose(result['probabilities'],
+                               model.predict_proba(abridged.head(len(batch))))
+
+def test_missing_required_column_is_rejected(model, abridged):
+    batch = pre_election(abridged).drop('VCF0104', axis = 1)
+    with pytest.raises(ValueError, match = 'missing in VCF0104'):
+        model.score(batch)
+    batch = pre_election(abridged)
+    batch.iloc[0, batch.columns.get_loc('VCF0104')] = np.nan
+    with pytest.raises(ValueError, match = 'missing in VCF0104'):
+        model.score(batch)
+
+def test_micro_batcher_rejects_only_the_invalid_batch(model, abridged):
+    batcher = MicroBatcher(model, max_delay = 0.05)
+    try:
+        invalid = batcher.submit(pre_election(abridged).drop('VCF0104', axis = 1))
+        valid = batcher.submit(pre_election(abridged))
+        with pytest.raises(ValueError):
+            invalid.result()
+        assert len(valid.result()['probabilities']) == 50
+    finally:
+        batcher.close()
+
+def test_score_with_stacked_models(training, abridged, tmp_path):
+    encoding, features, X, y = training
+    columns = [X.columns[:60], X.columns[40:120]]
+    stack = SubsetStackingClassifier([('lr', LogisticRegression(solver = 'liblinear'),
+                                       columns[0]),
+                                      ('bnb', BernoulliNB(), columns[1])],
+                                     preprocessing = preprocessing(), cv = 3, n_jobs = 1)
+    stack.fit(X, y)
+    model = ScoringModel(encoding, columns[0].union(columns[1], sort = False), stack,
+                         features = features)
+    model.save(str(tmp_path / 'scoring_model.pkl'))
+    model = ScoringModel.load(str(tmp_path / 'scoring_model.pkl'))
+    batch = pre_election(abridged)
+    np.testing.assert_allclose(model.predict_proba(batch),
+                               stack.predict_proba(X.head(len(batch)))[:, 1])